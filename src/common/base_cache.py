@@ -66,6 +66,15 @@ class ABCCache(ABC):
         """
         pass
 
+    @abstractmethod
+    def trim(self, name: str, key: str, start: int, stop: int):
+        """Метод оставляет в массиве только элементы с индексами
+        от start до stop включительно (отрицательные индексы
+        отсчитываются от конца массива).
+        Должен возвращать self.
+        """
+        pass
+
     @abstractmethod
     async def exec(self):
         """Метод выполняет цепочку команд. Должен возвращать результат выполнения этой цепочки.
@@ -3,8 +3,10 @@
 """
 import json
 import asyncio
+import contextvars
 import uvloop
 from functools import cached_property
+from typing import AsyncIterator
 from uuid import uuid4
 from collections.abc import MutableMapping
 from fastapi import FastAPI
@@ -20,6 +22,20 @@ from src.common.base_svc_settings import BaseSvcSettings
 #from src.common.local_cache import LocalCache
 from src.common.redis_cache import RedisCache
 
+# адрес ответа (reply_to, correlation_id, окно) на обрабатываемое сообщение;
+# используется для отправки ответа частями (см. BaseSvc._post_chunk)
+_reply_context = contextvars.ContextVar("reply_context", default=None)
+
+# заголовок промежуточной части ответа
+CN_CHUNK_HEADER = "prs-chunk"
+# заголовок запроса с ответом частями: количество частей, которые
+# обработчик может отправить без подтверждения получателя
+CN_WINDOW_HEADER = "prs-window"
+# заголовок части ответа: адрес для подтверждений получения частей
+CN_CREDIT_TO_HEADER = "prs-credit-to"
+# заголовок подтверждения: количество обработанных получателем частей
+CN_CREDIT_HEADER = "prs-credit"
+
 class BaseSvc(FastAPI):
     
     def __init__(self, settings: BaseSvcSettings, *args, **kwargs):
@@ -56,6 +72,12 @@ class BaseSvc(FastAPI):
         self._amqp_consume_queue: aio_pika.abc.AbstractRobustQueue = None
         self._amqp_callback_queue: aio_pika.abc.AbstractRobustQueue = None
         self._callback_futures: MutableMapping[str, asyncio.Future] = {}
+        # очереди частей ответов на запросы, отправленные
+        # методом _post_message_stream
+        self._callback_streams: MutableMapping[str, asyncio.Queue] = {}
+        # количество частей ответа, которые обработчик ещё может отправить
+        # без подтверждения получателя: {"<correlation_id>": Semaphore}
+        self._stream_credits: MutableMapping[str, asyncio.Semaphore] = {}
 
         # Словарь {
         #   "re-pattern": function
@@ -157,7 +179,15 @@ class BaseSvc(FastAPI):
             for key in self._handlers.keys():
                 if re.fullmatch(key, message.routing_key):
                     passed = True
-                    res = await self._handlers[key](mes=mes, routing_key=message.routing_key)
+                    reply_token = _reply_context.set((
+                        message.reply_to, message.correlation_id,
+                        (message.headers or {}).get(CN_WINDOW_HEADER)
+                    ))
+                    try:
+                        res = await self._handlers[key](mes=mes, routing_key=message.routing_key)
+                    finally:
+                        _reply_context.reset(reply_token)
+                        self._stream_credits.pop(message.correlation_id, None)
 
                     if message.reply_to:
                         # здесь нельзя использовать self._post_message
@@ -176,7 +206,8 @@ class BaseSvc(FastAPI):
             await message.ack()
 
     async def _post_message(
-            self, mes: dict, reply: bool = False, routing_key: str = None
+            self, mes: dict, reply: bool = False, routing_key: str = None,
+            timeout: float = None
     ) -> dict | bool | None:
         """Метод отсылает сообщение в брокер.
 
@@ -184,10 +215,12 @@ class BaseSvc(FastAPI):
             mes (dict): Тело сообщения
             reply (bool, optional): Флаг необходимости получения ответа на сообщение. Defaults to False.
             routing_key (str, optional): Ключ маршрутизации. Defaults to None.
+            timeout (float, optional): Максимальное время ожидания ответа, секунды. Defaults to None - без ограничения.
 
         Returns:
             dict | bool | None: Возвращает ответ в виде словаря, если флаг reply = True, 
-              None - если нет подписчика на посланное сообщение
+              None - если нет подписчика на посланное сообщение или ответ
+              не получен за время ``timeout``
               True - если reply = False и сообщение успешно отправлено.
         """
 
@@ -217,16 +250,161 @@ class BaseSvc(FastAPI):
         future = asyncio.get_running_loop().create_future()
         self._callback_futures[correlation_id] = future
 
-        return await future
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._logger.error(f"{self._config.svc_name} :: Нет ответа на сообщение с ключом {routing_key}.")
+            return None
+        finally:
+            self._callback_futures.pop(correlation_id, None)
+
+    async def _post_message_stream(
+            self, mes: dict, routing_key: str
+    ) -> AsyncIterator[dict]:
+        """Отправка запроса, ответ на который приходит частями.
+        Обработчик запроса отправляет промежуточные части методом
+        :meth:`_post_chunk`\, последней частью ответа является результат
+        обработчика.
+
+        Обработчик отправляет не более ``stream_window`` частей сверх
+        обработанных получателем: после обработки каждой половины окна
+        получатель отправляет обработчику подтверждение. Поэтому в памяти
+        получателя находится не больше ``stream_window`` частей ответа,
+        даже если части обрабатываются медленнее, чем читаются из базы.
+
+        Args:
+            mes (dict): тело сообщения
+            routing_key (str): ключ маршрутизации
+
+        Yields:
+            dict: части ответа в порядке отправки; если подписчика на
+            сообщение нет, ничего не возвращается; если очередная часть
+            не получена за время ``stream_chunk_timeout``\, ответ завершается
+        """
+        correlation_id = str(uuid4())
+        window = self._config.stream_window
+        # части окна и результат обработчика
+        queue = asyncio.Queue(maxsize=window + 1 if window else 0)
+        self._callback_streams[correlation_id] = queue
+        # количество частей, обработанных после последнего подтверждения
+        processed = 0
+        try:
+            res = await self._exchange.publish(
+                message=aio_pika.Message(
+                    body=json.dumps(mes, ensure_ascii=False).encode(),
+                    correlation_id=correlation_id,
+                    reply_to=self._amqp_callback_queue.name,
+                    headers={CN_WINDOW_HEADER: window} if window else None
+                ), routing_key=routing_key
+            )
+            if isinstance(res, DeliveredMessage):
+                if isinstance(res.delivery, Basic.Return):
+                    if res.delivery.reply_code == 312:
+                        return
+
+            while True:
+                try:
+                    last, body, credit_to = await asyncio.wait_for(
+                        queue.get(), self._config.stream_chunk_timeout or None
+                    )
+                except asyncio.TimeoutError:
+                    self._logger.error(f"{self._config.svc_name} :: Нет очередной части ответа на сообщение с ключом {routing_key}.")
+                    return
+                yield body
+                if last:
+                    return
+                processed += 1
+                if window and credit_to and processed >= max(1, window // 2):
+                    await self._exchange.publish(
+                        aio_pika.Message(
+                            body=b"{}",
+                            correlation_id=correlation_id,
+                            headers={CN_CREDIT_HEADER: processed}
+                        ),
+                        routing_key=credit_to,
+                    )
+                    processed = 0
+        finally:
+            # части ответа, пришедшие после завершения, отбрасываются
+            # (см. :meth:`_on_rpc_response`)
+            self._callback_streams.pop(correlation_id, None)
+
+    async def _post_chunk(self, mes: dict) -> bool:
+        """Отправка промежуточной части ответа на обрабатываемое сообщение.
+        Вызывается из обработчика сообщения.
+        Если отправитель запроса задал окно (см. :meth:`_post_message_stream`),
+        метод ждёт подтверждения получения предыдущих частей.
+
+        Args:
+            mes (dict): часть ответа
+
+        Returns:
+            bool: False - у сообщения нет адреса ответа или получатель
+            не подтвердил получение частей за время ``stream_chunk_timeout``;
+            обработчик должен прекратить отправку частей
+        """
+        reply = _reply_context.get()
+        if reply is None or not reply[0]:
+            return False
+        reply_to, correlation_id, window = reply
+        if window:
+            credits = self._stream_credits.setdefault(
+                correlation_id, asyncio.Semaphore(window)
+            )
+            try:
+                await asyncio.wait_for(
+                    credits.acquire(), self._config.stream_chunk_timeout or None
+                )
+            except asyncio.TimeoutError:
+                self._logger.error(f"{self._config.svc_name} :: Получатель ответа {reply_to} не подтвердил получение частей.")
+                return False
+        await self._exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(mes, ensure_ascii=False).encode(),
+                correlation_id=correlation_id,
+                headers={
+                    CN_CHUNK_HEADER: True,
+                    CN_CREDIT_TO_HEADER: self._amqp_callback_queue.name
+                }
+            ),
+            routing_key=reply_to,
+        )
+        return True
 
     async def _on_rpc_response(
             self, message: aio_pika.abc.AbstractIncomingMessage
     ) -> None:
+        headers = message.headers or {}
+        if CN_CREDIT_HEADER in headers:
+            # подтверждение получения частей ответа, отправляемого обработчиком
+            credits = self._stream_credits.get(message.correlation_id)
+            if credits is not None:
+                for _ in range(int(headers[CN_CREDIT_HEADER])):
+                    credits.release()
+            return
+
+        if message.correlation_id in self._callback_streams:
+            try:
+                self._callback_streams[message.correlation_id].put_nowait((
+                    not headers.get(CN_CHUNK_HEADER),
+                    json.loads(message.body.decode()),
+                    headers.get(CN_CREDIT_TO_HEADER)
+                ))
+            except asyncio.QueueFull:
+                self._logger.error(f"{self._config.svc_name} :: Обработчик отправил больше частей ответа, чем допускает окно.")
+            except:
+                self._logger.error(f"{self._config.svc_name} :: Ошибка работы с ответом.")
+            return
+
         if message.correlation_id is None:
             self._logger.error(f"{self._config.svc_name} :: У сообщения не выставлен параметр `correlation_id`")
         else:
+            future: asyncio.Future = self._callback_futures.pop(message.correlation_id, None)
+            if future is None or future.done():
+                # ответ пришёл после истечения времени ожидания
+                self._logger.warning(f"{self._config.svc_name} :: Ответ с correlation_id = {message.correlation_id} получен после окончания ожидания.")
+                return
             try:
-                future: asyncio.Future = self._callback_futures.pop(message.correlation_id, None)
                 future.set_result(json.loads(message.body.decode()))
             except:
                 self._logger.error(f"{self._config.svc_name} :: Ошибка работы с ответом.")
@@ -101,3 +101,11 @@ class BaseSvcSettings(BaseSettings, BaseModel):
         )
     
     cache_url: str = "redis://redis:6379?decode_responses=True&protocol=3"
+
+    #: максимальное время ожидания очередной части ответа на запрос,
+    #: ответ на который приходит частями, секунды; 0 - без ограничения
+    stream_chunk_timeout: float = 60
+    #: количество частей ответа, которые обработчик может отправить
+    #: без подтверждения получателя (см. BaseSvc._post_message_stream);
+    #: ограничивает память получателя; 0 - без ограничения
+    stream_window: int = 16
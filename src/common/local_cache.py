@@ -150,6 +150,21 @@ class LocalCache(ABCCache):
         self.data[name][key].pop(index)
         return True
 
+    def trim(self, name: str, key: str, start: int, stop: int):
+        args = {**locals()}
+        args.pop("self")
+        self.command_chain.append({"func": self._trim, "kwargs": args, "args": None})
+        return self
+
+    def _trim(self, name: str, key: str, start: int, stop: int):
+        """Метод оставляет в массиве только элементы с индексами
+        от start до stop включительно.
+        """
+        arr = self.data[name][key]
+        stop = (stop, len(arr) + stop)[stop < 0]
+        self.data[name][key] = arr[start:stop + 1]
+        return len(self.data[name][key])
+
     async def exec(self):
         """Метод выполняет цепочку команд. Должен возвращать результат выполнения этой цепочки.
         """
@@ -55,6 +55,14 @@ class RedisCache(ABCCache):
         self._pipe.json().arrpop(name, key, index)
         return self
 
+    def trim(self, name: str, key: str, start: int, stop: int):
+        """Метод оставляет в массиве только элементы с индексами
+        от start до stop включительно.
+        Должен возвращать self.
+        """
+        self._pipe.json().arrtrim(name, key, start, stop)
+        return self
+
     async def exec(self):
         """Метод выполняет цепочку команд. Должен возвращать результат выполнения этой цепочки.
         """
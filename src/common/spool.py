@@ -0,0 +1,239 @@
+"""Модуль содержит класс журнала (spool) - локального хранилища записей
+на диске, работающего по принципу "только добавление".
+
+Журнал используется для временного хранения данных, которые ещё не
+записаны в базу: записи добавляются в конец журнала до того, как данные
+будут удалены из кэша, и удаляются из начала журнала (подтверждаются)
+после успешной записи в базу. Если база недоступна, записи накапливаются
+в журнале и после восстановления связи записываются в базу в том же
+порядке, в котором добавлялись. Журнал сохраняется между перезапусками
+сервиса.
+
+Журнал состоит из сегментов - файлов фиксированного размера,
+отображаемых в память (mmap). Формат записи в сегменте:
+``<длина данных: uint32><crc32 данных: uint32><данные>``\. Запись с нулевой
+длиной означает конец данных в сегменте. Позиция первой неподтверждённой
+записи хранится в файле ``commit``\.
+"""
+import os
+import json
+import mmap
+import struct
+import zlib
+from collections import deque
+from typing import Any, List
+
+# заголовок записи: длина и контрольная сумма данных
+_HEADER = struct.Struct("<II")
+_SEGMENT_EXT = ".seg"
+_COMMIT_FILE = "commit"
+
+class Spool:
+    """Журнал записей на локальном диске.
+
+    Args:
+        path (str): каталог журнала
+        segment_size (int): размер сегмента, байты
+        sync (bool): сбрасывать ли на диск каждую добавленную запись
+        cache_records (int): количество неподтверждённых записей, объекты
+            которых хранятся в памяти; объекты остальных записей читаются
+            из сегментов
+    """
+
+    def __init__(self, path: str, segment_size: int = 64 * 1024 * 1024,
+                 sync: bool = True, cache_records: int = 1000):
+        self._path = path
+        self._segment_size = segment_size
+        self._sync = sync
+        self._cache_records = cache_records
+
+        # открытые сегменты: {<номер>: (<файл>, <mmap>)}
+        self._segments = {}
+        # неподтверждённые записи в порядке добавления:
+        # [<номер сегмента>, <смещение>, <размер записи>, <объект или None>]
+        # объект хранится для записей, добавленных в текущем процессе
+        # (не более cache_records), чтобы не читать их повторно из сегмента
+        self._records = deque()
+        # суммарный размер неподтверждённых записей, байты
+        self._bytes = 0
+        # сегмент и смещение для добавления следующей записи
+        self._write_segment = None
+        self._write_offset = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._open()
+
+    @property
+    def depth(self) -> int:
+        """Количество неподтверждённых записей.
+        """
+        return len(self._records)
+
+    @property
+    def size(self) -> int:
+        """Размер неподтверждённых записей, байты.
+        """
+        return self._bytes
+
+    def append(self, obj: Any) -> None:
+        """Добавление записи в конец журнала.
+
+        Args:
+            obj (Any): json-сериализуемый объект
+        """
+        payload = json.dumps(obj, ensure_ascii=False).encode()
+        size = _HEADER.size + len(payload)
+
+        _, mm = self._segments[self._write_segment]
+        # в конце сегмента должно остаться место под нулевой заголовок
+        if self._write_offset + size + _HEADER.size > len(mm):
+            self._new_segment(size + _HEADER.size)
+            _, mm = self._segments[self._write_segment]
+
+        offset = self._write_offset
+        mm[offset:offset + size] = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if self._sync:
+            page_start = offset - offset % mmap.PAGESIZE
+            mm.flush(page_start, offset + size - page_start)
+
+        if len(self._records) >= self._cache_records:
+            obj = None
+        self._records.append([self._write_segment, offset, size, obj])
+        self._bytes += size
+        self._write_offset += size
+
+    def pending(self, limit: int = None) -> List[Any]:
+        """Неподтверждённые записи в порядке добавления.
+
+        Args:
+            limit (int): максимальное количество записей
+
+        Returns:
+            List[Any]: список объектов
+        """
+        res = []
+        for record in self._records:
+            if limit is not None and len(res) >= limit:
+                break
+            obj = record[3]
+            if obj is None:
+                obj = self._read_record(record[0], record[1])
+            res.append(obj)
+        return res
+
+    def commit(self, count: int = 1) -> None:
+        """Подтверждение первых ``count`` записей журнала: записи
+        удаляются из журнала, полностью подтверждённые сегменты удаляются
+        с диска.
+
+        Args:
+            count (int): количество подтверждаемых записей
+        """
+        for _ in range(min(count, len(self._records))):
+            record = self._records.popleft()
+            self._bytes -= record[2]
+
+        if self._records:
+            segment, offset = self._records[0][0], self._records[0][1]
+        else:
+            segment, offset = self._write_segment, self._write_offset
+
+        self._write_commit(segment, offset)
+
+        for number in sorted(self._segments.keys()):
+            if number >= segment:
+                break
+            self._remove_segment(number)
+
+    def close(self) -> None:
+        """Закрытие файлов журнала.
+        """
+        for f, mm in self._segments.values():
+            mm.close()
+            f.close()
+        self._segments = {}
+
+    def _open(self) -> None:
+        """Открытие существующего журнала: чтение позиции первой
+        неподтверждённой записи и поиск записей до конца данных.
+        """
+        numbers = sorted(
+            int(name[:-len(_SEGMENT_EXT)])
+            for name in os.listdir(self._path)
+            if name.endswith(_SEGMENT_EXT)
+        )
+
+        commit_segment, commit_offset = None, 0
+        try:
+            with open(os.path.join(self._path, _COMMIT_FILE), "r") as f:
+                commit_segment, commit_offset = map(int, f.read().split())
+        except (FileNotFoundError, ValueError):
+            pass
+
+        for number in numbers:
+            if commit_segment is not None and number < commit_segment:
+                os.remove(self._segment_path(number))
+                continue
+
+            f = open(self._segment_path(number), "r+b")
+            mm = mmap.mmap(f.fileno(), 0)
+            self._segments[number] = (f, mm)
+
+            offset = (0, commit_offset)[number == commit_segment]
+            while offset + _HEADER.size <= len(mm):
+                length, crc = _HEADER.unpack_from(mm, offset)
+                end = offset + _HEADER.size + length
+                # нулевая длина - конец данных; неполная или повреждённая
+                # запись (сбой во время добавления) также считается концом
+                if not length or end > len(mm) or \
+                    zlib.crc32(mm[offset + _HEADER.size:end]) != crc:
+                    break
+                self._records.append([number, offset, end - offset, None])
+                self._bytes += end - offset
+                offset = end
+
+            self._write_segment = number
+            self._write_offset = offset
+
+        if self._write_segment is None:
+            self._new_segment(0)
+
+    def _read_record(self, segment: int, offset: int) -> Any:
+        _, mm = self._segments[segment]
+        length, _ = _HEADER.unpack_from(mm, offset)
+        start = offset + _HEADER.size
+        return json.loads(mm[start:start + length])
+
+    def _new_segment(self, min_size: int) -> None:
+        number = (self._write_segment or 0) + 1
+        size = max(self._segment_size, min_size)
+        f = open(self._segment_path(number), "w+b")
+        f.truncate(size)
+        mm = mmap.mmap(f.fileno(), size)
+        self._segments[number] = (f, mm)
+        self._write_segment = number
+        self._write_offset = 0
+
+        if not self._records:
+            self._write_commit(number, 0)
+
+    def _remove_segment(self, number: int) -> None:
+        f, mm = self._segments.pop(number)
+        mm.close()
+        f.close()
+        os.remove(self._segment_path(number))
+
+    def _write_commit(self, segment: int, offset: int) -> None:
+        """Атомарная запись позиции первой неподтверждённой записи.
+        """
+        path = os.path.join(self._path, _COMMIT_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{segment} {offset}")
+            if self._sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self._path, f"{number:010d}{_SEGMENT_EXT}")
@@ -0,0 +1,218 @@
+"""Модуль содержит класс расчёта агрегатов данных тега по интервалам
+времени (запрос ``data_aggregate``\).
+
+Период ``[start, finish]`` делится на интервалы длиной ``interval``
+(последний интервал может быть короче). Для каждого интервала
+рассчитываются:
+
+* ``count`` - количество точек тега в интервале со значением не null;
+* ``sum`` - сумма значений этих точек;
+* ``min``\, ``max`` - минимальное и максимальное значения тега на
+  интервале, с учётом значений на границах интервала;
+* ``avg`` - среднее по времени значение тега;
+* ``integral`` - интеграл значения тега по времени, значение * секунда.
+
+Значения тега между точками рассчитываются так же, как при интерполяции
+(см. :mod:`src.services.dataStorages.app.interpolation`\): для числовых
+нешаговых тегов - линейно, для ступенчатых - по предыдущей точке; после
+точки со значением null и до первой точки тега значение не определено
+и в агрегаты по времени не входит. После последней точки тега её значение
+сохраняется до ``finish``\.
+
+Данные передаются частями по мере чтения из базы, поэтому в памяти
+находятся только текущая часть данных и агрегаты интервалов.
+"""
+from typing import List
+
+import numpy as np
+
+CN_AGGREGATES = ("min", "max", "avg", "sum", "count", "integral")
+
+class Aggregator:
+    """Расчёт агрегатов данных тега по интервалам.
+
+    Args:
+        start (int): начало периода, микросекунды
+        finish (int): окончание периода, микросекунды
+        interval (int): длина интервала, микросекунды
+        functions (List[str]): рассчитываемые агрегаты (см. CN_AGGREGATES)
+        numeric (bool): тег с числовыми значениями; для нечисловых тегов
+            рассчитывается только ``count``
+        step (bool): ступенчатый тег (prsStep)
+        max_intervals (int): максимальное количество интервалов;
+            0 - без ограничения
+
+    Raises:
+        ValueError: окончание периода раньше его начала или количество
+            интервалов больше ``max_intervals``
+    """
+
+    def __init__(self, start: int, finish: int, interval: int,
+                 functions: List[str], numeric: bool, step: bool,
+                 max_intervals: int = 0):
+        if finish < start:
+            raise ValueError("Окончание периода раньше его начала.")
+        if interval <= 0:
+            raise ValueError("Длина интервала должна быть больше нуля.")
+        size = max(1, -(-(finish - start) // interval))
+        if max_intervals and size > max_intervals:
+            raise ValueError(
+                f"Количество интервалов ({size}) больше допустимого ({max_intervals})."
+            )
+
+        self._start = start
+        self._finish = finish
+        self._interval = interval
+        self._functions = functions
+        self._numeric = numeric
+        self._linear = numeric and not step
+
+        self._count = np.zeros(size, dtype=np.int64)
+        self._sum = np.zeros(size)
+        self._min = np.full(size, np.inf)
+        self._max = np.full(size, -np.inf)
+        self._integral = np.zeros(size)
+        self._duration = np.zeros(size, dtype=np.int64)
+
+        # последняя точка предыдущей части данных
+        self._last = None
+        # прочитана точка после finish
+        self._closed = False
+
+    def _bucket(self, xs: np.ndarray) -> np.ndarray:
+        return np.minimum((xs - self._start) // self._interval, len(self._count) - 1)
+
+    def add(self, data: List[tuple]) -> None:
+        """Добавление очередной части данных тега.
+
+        Args:
+            data (List[tuple]): точки ``(y, x, q)``\, упорядоченные по x;
+                каждая следующая часть - точки после точек предыдущей части
+                (первая часть может начинаться с точки перед ``start``\,
+                последняя - заканчиваться точкой после ``finish``\)
+        """
+        if not data:
+            return
+        self._add_points(data)
+        if self._last is not None:
+            data = [self._last] + data
+        self._last = data[-1]
+        if data[-1][1] > self._finish:
+            self._closed = True
+        self._add_segments(data)
+
+    def _add_points(self, data: List[tuple]) -> None:
+        """Учёт точек периода в ``count``\, ``sum``\, ``min``\, ``max``\.
+        """
+        points = [
+            (y, x) for y, x, _ in data
+            if y is not None and self._start <= x <= self._finish
+        ]
+        if not points:
+            return
+        xs = np.fromiter((x for _, x in points), dtype=np.int64, count=len(points))
+        buckets = self._bucket(xs)
+        self._count += np.bincount(buckets, minlength=len(self._count))
+        if self._numeric:
+            ys = np.fromiter((y for y, _ in points), dtype=np.float64, count=len(points))
+            self._sum += np.bincount(buckets, weights=ys, minlength=len(self._sum))
+            np.minimum.at(self._min, buckets, ys)
+            np.maximum.at(self._max, buckets, ys)
+
+    def _add_segments(self, data: List[tuple]) -> None:
+        """Учёт значений тега между соседними точками в ``min``\, ``max``\,
+        ``avg``\, ``integral``\.
+        """
+        if not self._numeric or len(data) < 2:
+            return
+        size = len(data)
+        xs = np.fromiter((r[1] for r in data), dtype=np.int64, count=size)
+        ys = np.fromiter(
+            (np.nan if r[0] is None else r[0] for r in data),
+            dtype=np.float64, count=size
+        )
+
+        lo = max(int(xs[0]), self._start)
+        hi = min(int(xs[-1]), self._finish)
+        if lo >= hi:
+            return
+
+        # границы участков: метки точек и границы интервалов внутри [lo, hi]
+        first = -(-(lo - self._start) // self._interval)
+        bounds = self._start + self._interval * np.arange(
+            first, (hi - self._start) // self._interval + 1, dtype=np.int64
+        )
+        inner = xs[(xs > lo) & (xs < hi)]
+        breaks = np.unique(np.concatenate(([lo, hi], inner, bounds)))
+        breaks = breaks[(breaks >= lo) & (breaks <= hi)]
+        a = breaks[:-1]
+        b = breaks[1:]
+
+        # участок [a, b) лежит между последней точкой с меткой не больше a
+        # и следующей за ней точкой
+        idx = np.searchsorted(xs, a, side="right") - 1
+        x1, y1 = xs[idx], ys[idx]
+        x2, y2 = xs[idx + 1], ys[idx + 1]
+        va = y1.copy()
+        vb = y1.copy()
+        if self._linear:
+            lin = ~np.isnan(y2)
+            k = (y2[lin] - y1[lin]) / (x2[lin] - x1[lin])
+            va[lin] = y1[lin] + k * (a[lin] - x1[lin])
+            vb[lin] = y1[lin] + k * (b[lin] - x1[lin])
+
+        defined = ~np.isnan(va)
+        buckets = self._bucket(a[defined])
+        va = va[defined]
+        vb = vb[defined]
+        length = (b - a)[defined]
+        size = len(self._count)
+        self._integral += np.bincount(
+            buckets, weights=(va + vb) / 2 * length / 1e6, minlength=size
+        )
+        self._duration += np.bincount(buckets, weights=length, minlength=size).astype(np.int64)
+        np.minimum.at(self._min, buckets, np.minimum(va, vb))
+        np.maximum.at(self._max, buckets, np.maximum(va, vb))
+
+    def result(self) -> List[tuple]:
+        """Агрегаты интервалов.
+
+        Returns:
+            List[tuple]: точки ``({"<агрегат>": значение}, начало интервала, None)``;
+            значение None - агрегат не определён
+        """
+        if not self._closed and self._last is not None and \
+            self._last[1] < self._finish:
+            # значение последней точки сохраняется до finish
+            self._add_segments([self._last, (self._last[0], self._finish, None)])
+            self._closed = True
+
+        has_time = self._duration > 0
+        columns = {
+            "count": self._count.tolist(),
+            "sum": np.where(self._count > 0, self._sum, np.nan),
+            "min": self._min,
+            "max": self._max,
+            "avg": np.divide(
+                self._integral * 1e6, self._duration,
+                out=np.full(len(self._count), np.nan), where=has_time
+            ),
+            "integral": np.where(has_time, self._integral, np.nan),
+        }
+        values = {}
+        for func in self._functions:
+            if func == "count":
+                values[func] = columns[func]
+            elif not self._numeric:
+                values[func] = [None] * len(self._count)
+            else:
+                values[func] = [
+                    None if np.isnan(val) or np.isinf(val) else val
+                    for val in columns[func].tolist()
+                ]
+
+        xs = (self._start + self._interval * np.arange(len(self._count))).tolist()
+        return [
+            ({func: values[func][i] for func in self._functions}, x, None)
+            for i, x in enumerate(xs)
+        ]
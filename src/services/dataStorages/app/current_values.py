@@ -0,0 +1,71 @@
+"""Модуль содержит класс таблицы текущих (последних) значений тегов.
+
+Таблица ведётся в памяти сервиса хранилища: значение тега заполняется
+при первом чтении, по которому известно, что после прочитанной точки
+в тег ничего не записано, и обновляется при каждой записи данных в тег.
+Запрос значения тега на текущий момент обслуживается по таблице без
+обращения к базе.
+
+Таблица учитывает только записи данных через свой экземпляр сервиса,
+поэтому включается (параметр ``current_values`` сервиса хранилища), только
+если данные тегов хранилища записывает и читает один экземпляр сервиса.
+"""
+from typing import Any, Tuple
+
+class CurrentValues:
+    """Последние точки тегов ``(y, x, q)``.
+
+    Args:
+        enabled (bool): таблица ведётся; если False, последние точки
+            не сохраняются и :meth:`get` всегда возвращает None
+    """
+
+    def __init__(self, enabled: bool = True):
+        self._enabled = enabled
+        # {"<tag_id>": (y, x, q)}
+        self._values = {}
+        # номер изменения данных тега, см. version/put
+        self._versions = {}
+
+    def get(self, tag_id: str) -> Tuple[Any, int, Any] | None:
+        """Последняя точка тега или None, если она неизвестна.
+        """
+        return self._values.get(tag_id)
+
+    def version(self, tag_id: str) -> int:
+        """Номер изменения данных тега; запрашивается перед чтением данных
+        из базы и передаётся в :meth:`put`.
+        """
+        return self._versions.get(tag_id, 0)
+
+    def put(self, tag_id: str, point: Tuple[Any, int, Any], version: int) -> None:
+        """Заполнение последней точки тега по данным, прочитанным из базы.
+        Точка не сохраняется, если во время чтения в тег были записаны данные.
+        """
+        if self._enabled and version == self.version(tag_id):
+            self._values[tag_id] = point
+
+    def written(self, tag_id: str, data: list) -> None:
+        """Учёт записи данных в тег.
+        Из точек с одной меткой времени последней считается записанная
+        последней.
+        """
+        self._versions[tag_id] = self.version(tag_id) + 1
+        current = self._values.get(tag_id)
+        if current is None:
+            return
+        for point in data:
+            if point[1] >= current[1]:
+                current = tuple(point)
+        self._values[tag_id] = current
+
+    def invalidate(self, tag_id: str = None) -> None:
+        """Удаление последней точки тега (``tag_id`` = None - всех тегов).
+        """
+        if tag_id is None:
+            for tag in list(self._versions.keys() | self._values.keys()):
+                self.invalidate(tag)
+            return
+
+        self._versions[tag_id] = self.version(tag_id) + 1
+        self._values.pop(tag_id, None)
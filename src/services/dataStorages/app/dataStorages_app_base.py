@@ -4,17 +4,23 @@ import json
 import asyncio
 import numbers
 import copy
+import time
 from abc import ABC, abstractmethod
-from typing import Any, List, Tuple
+from typing import Any, AsyncIterator, List, Tuple
 
 import redis.asyncio as redis
-import pandas as pd
-from pandas.api.types import is_numeric_dtype
-import numpy as np
 
 sys.path.append(".")
 
 from src.common import app_svc
+from src.common.spool import Spool
+from src.services.dataStorages.app.interpolation import interpolate, values_at
+from src.services.dataStorages.app.filtering import filter_data
+from src.services.dataStorages.app.downsampling import downsample
+from src.services.dataStorages.app.aggregation import Aggregator
+from src.services.dataStorages.app.formats import to_columns, to_grid
+from src.services.dataStorages.app.result_cache import ResultCache
+from src.services.dataStorages.app.current_values import CurrentValues
 from src.services.dataStorages.app.dataStorages_app_base_settings import DataStoragesAppBaseSettings
 
 from src.common.hierarchy import (
@@ -116,6 +122,11 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         settings (DataStoragesAppBaseSettings): Параметры конфигурации
     """
 
+    # количество попыток чтения тега, данные которого записываются в базу
+    # во время чтения (см. :meth:`_read_tags_data`); после последней попытки
+    # используется её результат
+    _READ_ATTEMPTS = 3
+
     def __init__(
             self, settings: DataStoragesAppBaseSettings, *args, **kwargs
         ):
@@ -126,9 +137,110 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         #    "<ds_id>": <connection_pool>
         # }
         self._connection_pools = {}
-        
+
+        # теги, данные которых накоплены в кэше и ещё не записаны в базу:
+        # {
+        #    "<tag_id>": {
+        #        "count": <количество точек в кэше>,
+        #        "since": <момент (time.monotonic) появления первой точки>,
+        #        "dss": ["<ds_id>", ...]
+        #    }
+        # }
+        self._dirty_tags = {}
+        # суммарное количество точек в кэше по хранилищам: {"<ds_id>": int}
+        self._dirty_dss = {}
+        # событие немедленного запуска проверки условий сброса кэша
+        self._flush_event = asyncio.Event()
+        self._flush_semaphore = asyncio.Semaphore(settings.cache_data_workers)
+        # ограничение количества одновременных чтений данных тегов
+        self._read_semaphore = asyncio.Semaphore(
+            settings.read_concurrency or settings.db_pool_size
+        )
+        self._flush_task = None
+        # кэш результатов чтения данных тегов за периоды в прошлом
+        self._result_cache = ResultCache(settings.result_cache_points)
+        # последние значения тегов для чтения значений на текущий момент
+        self._current_values = CurrentValues(settings.current_values)
+        # данные, извлечённые из кэша и ещё не записанные во все хранилища
+        # тега, в порядке извлечения:
+        # {
+        #    "<tag_id>": [
+        #        {
+        #            "data": [(y, x, q), ...],
+        #            # активные в момент извлечения хранилища тега
+        #            "dss": ["<ds_id>", ...],
+        #            # хранилища, в которые данные ещё не записаны
+        #            "pending": {"<ds_id>", ...},
+        #            # хранилища, запись в которые закончилась ошибкой;
+        #            # данные будут записаны в них при следующем сбросе
+        #            "failed": {"<ds_id>", ...}
+        #        }, ...
+        #    ]
+        # }
+        self._flushing_data = {}
+        # количество записей извлечённых данных тегов в хранилища:
+        # {"<tag_id>": int}; изменение счётчика во время чтения из базы
+        # означает, что выборка могла уже содержать точки из кэша
+        self._written_seq = {}
+        # извлечение данных из кэша выполняется строго последовательно:
+        # данные удаляются из кэша только после записи в журнал
+        self._drain_lock = asyncio.Lock()
+
+        # журналы данных, не записанных в базу: {"<ds_id>": Spool}
+        self._spools = {}
+        # блокировки записи журналов в базу: {"<ds_id>": asyncio.Lock}
+        self._spool_locks = {}
+        # хранилища, запись в которые закончилась ошибкой; данные
+        # из их журналов записываются повторно
+        self._spool_failed = set()
+        self._spool_task = None
+
+        # метрики работы сервиса
+        self._metrics = {
+            "flush": {
+                # количество выполненных сбросов кэша в хранилища
+                "count": 0,
+                # общее количество записанных точек
+                "points": 0,
+                # длительность последнего сброса, секунды
+                "lastLatency": 0.,
+                # максимальная длительность сброса, секунды
+                "maxLatency": 0.,
+                # суммарная длительность всех сбросов, секунды
+                "totalLatency": 0.,
+                # количество точек в последнем сбросе
+                "lastBatchSize": 0,
+                # максимальное количество точек в одном сбросе
+                "maxBatchSize": 0
+            },
+            "spool": {
+                # количество записей в журналах, ещё не записанных в базу
+                "depth": 0,
+                # размер записей в журналах, ещё не записанных в базу, байты
+                "bytes": 0,
+                # количество точек, повторно записанных в базу из журналов
+                "replayedPoints": 0,
+                # скорость последней повторной записи, точек в секунду
+                "replayRate": 0.
+            },
+            "resultCache": {
+                # количество запросов данных тегов, найденных в кэше результатов
+                "hits": 0,
+                # количество запросов, прочитанных из базы
+                "misses": 0,
+                # доля запросов, найденных в кэше
+                "hitRatio": 0.,
+                # количество результатов в кэше
+                "entries": 0,
+                # суммарное количество точек в кэше
+                "points": 0
+            }
+        }
+
     def _add_app_handlers(self):
         self._handlers["prsTag.app.data_get.*"] = self._tag_get
+        self._handlers["prsTag.app.data_aggregate.*"] = self._tag_aggregate
+        self._handlers["prsTag.app.data_snapshot.*"] = self._tag_snapshot
         self._handlers["prsTag.app.data_set.*"] = self._tag_set
         self._handlers["prsTag.model.updated.*"] = self._tag_updated
         self._handlers["prsTag.model.deleted.*"] = self._tag_deleted
@@ -149,12 +261,16 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
 
         if bind:
             await self._amqp_consume_queue.bind(exchange=self._exchange, routing_key=f"prsTag.app.data_get.{tag_id}")
+            await self._amqp_consume_queue.bind(exchange=self._exchange, routing_key=f"prsTag.app.data_aggregate.{tag_id}")
+            await self._amqp_consume_queue.bind(exchange=self._exchange, routing_key=f"prsTag.app.data_snapshot.{tag_id}")
             await self._amqp_consume_queue.bind(exchange=self._exchange, routing_key=f"prsTag.app.data_set.{tag_id}")
             await self._amqp_consume_queue.bind(exchange=self._exchange, routing_key=f"prsTag.model.updated.{tag_id}")
             await self._amqp_consume_queue.bind(exchange=self._exchange, routing_key=f"prsTag.model.deleted.{tag_id}")
             
         else:
             await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key=f"prsTag.app.data_get.{tag_id}")
+            await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key=f"prsTag.app.data_aggregate.{tag_id}")
+            await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key=f"prsTag.app.data_snapshot.{tag_id}")
             await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key=f"prsTag.app.data_set.{tag_id}")
             await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key=f"prsTag.model.updated.{tag_id}")
             await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key=f"prsTag.model.deleted.{tag_id}")
@@ -271,6 +387,8 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         # сделаем перепривязку очереди, так как слушать будем только нужные сообщения
         # группа сообщений, где вместо * передается id тега или тревоги --------------------------
         await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key="prsTag.app.data_get.*")
+        await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key="prsTag.app.data_aggregate.*")
+        await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key="prsTag.app.data_snapshot.*")
         await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key="prsTag.app.data_set.*")
         await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key="prsTag.model.updating.*")
         await self._amqp_consume_queue.unbind(exchange=self._exchange, routing_key="prsTag.model.updated.*")
@@ -311,16 +429,41 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
                     }
                 }
 
-            loop = asyncio.get_event_loop()
             dss = await self._hierarchy.search(payload=payload)
             for ds in dss:
                 await self._add_supported_ds(ds[0])
 
-            loop.call_later(self._config.cache_data_period, lambda: asyncio.create_task(self._write_cache_data()))
+            # данные, оставшиеся в журналах с прошлого запуска сервиса,
+            # записываем в базу раньше данных из кэша
+            for ds_id in self._connection_pools.keys():
+                spool = self._get_spool(ds_id)
+                if spool is not None and spool.depth:
+                    self._spool_failed.add(ds_id)
+            await self._replay_spools()
+
+            # данные, оставшиеся в кэше с прошлого запуска сервиса,
+            # сразу сбрасываем в базу
+            await self._write_cache_data()
 
         except Exception as ex:
             self._logger.error(f"{self._config.svc_name} :: Ошибка инициализации хранилища: {ex}")
 
+        self._flush_task = asyncio.create_task(self._flush_scheduler())
+        if self._config.spool_dir:
+            self._spool_task = asyncio.create_task(self._spool_scheduler())
+
+    async def on_shutdown(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        if self._spool_task is not None:
+            self._spool_task.cancel()
+        await self._flush_tags(list(self._dirty_tags.keys()))
+
+        for spool in self._spools.values():
+            spool.close()
+
+        await super().on_shutdown()
+
     async def _alert_deleted(self, mes: dict, routing_key: str = None):
         await self._bind_alert(mes['id'], False)
         await self._delete_alert_cache(mes['id'])
@@ -345,6 +488,9 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
     async def _tag_deleted(self, mes: dict, routing_key: str = None):
         await self._bind_tag(mes['id'], False)
         await self._delete_tag_cache(mes['id'])
+        # данные удалённого тега повторно не записываются
+        self._flushing_data.pop(mes['id'], None)
+        self._written_seq.pop(mes['id'], None)
 
         payload = {
             "base": None,
@@ -615,11 +761,19 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         pass
 
     @abstractmethod
-    async def _write_tag_data_to_db(
-            self, tag_id: str) -> None:
+    async def _write_ds_data_to_db(
+            self, ds_id: str, tags: dict) -> List[str]:
+        """Запись данных группы тегов в одно хранилище.
+        Метод переопределяется в классах-потомках.
+
+        Args:
+            ds_id (str): id хранилища
+            tags (dict): {"<tag_id>": <кэш тега вместе с данными>}
 
-        # метод, переопределяемый в классах-потомках
-        # записывает данные одного тега в хранилище
+        Returns:
+            List[str]: id тегов, данные которых не записаны; если не
+            записана вся группа, генерируется исключение
+        """
         pass
 
     async def _write_cache_data(self, tag_ids: list[str] = None) -> None:
@@ -631,17 +785,17 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         хранилищ: сам вызов этой функции может инициироваться переводом
         тега или хранилища в неактивное состояние.
 
+        Плановый сброс кэша выполняет планировщик :meth:`_flush_scheduler`,
+        эта функция используется для принудительного сброса.
+
         Args:
             tag_ids (str], optional): список тегов.
         """
 
         self._logger.debug(f"Запись кэша данных в хранилища для тегов {tag_ids}...")
-        scheduled = False
-        try:            
+        try:
             if not tag_ids:
-                # если пустой список тегов, это значит, что сбрасывается весь кэш,
-                # то есть происходит запуск процедуры по расписанию
-                scheduled = True
+                # если пустой список тегов, это значит, что сбрасывается весь кэш
                 tag_ids = set()
                 for ds_id in self._connection_pools.keys():
                     # определим, активна ли база
@@ -658,7 +812,10 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
                         continue
                     tag_ids = tag_ids.union(set(res[0]["tags"]))
 
+            to_write = []
             for tag_id in tag_ids:
+                self._pop_dirty_tag(tag_id)
+
                 res = await self._cache.get(
                     f"{tag_id}.{self._config.svc_name}",
                     f"prsActive"
@@ -675,15 +832,295 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
                                 f"{ds_id}.{self._config.svc_name}", "tags", index[0]
                             ).exec()
                 else:
-                    await self._write_tag_data_to_db(tag_id)
+                    to_write.append(tag_id)
+
+            await self._write_tags_data(to_write)
 
         except Exception as ex:
             self._logger.error(f"{self._config.svc_name} :: Ошибка записи данных в базу: {ex}")
-        
-        loop = asyncio.get_event_loop()
 
-        if scheduled:
-            loop.call_later(self._config.cache_data_period, lambda: asyncio.create_task(self._write_cache_data()))
+    async def _write_tags_data(self, tag_ids: List[str]) -> None:
+        """Запись накопленных в кэше данных тегов в базы.
+        Данные всех тегов извлекаются из кэша и группируются по хранилищам
+        (см. :meth:`_drain_tags_data`), каждое хранилище записывается
+        одним вызовом :meth:`_write_ds_data_to_db`\.
+        Хранилища записываются параллельно, количество одновременно
+        записываемых хранилищ ограничено параметром ``cache_data_workers``\.
+
+        Args:
+            tag_ids (List[str]): список id тегов
+        """
+        if not tag_ids:
+            return
+
+        async with self._drain_lock:
+            batches, groups, spooled = await self._drain_tags_data(tag_ids)
+        await asyncio.gather(*[
+            self._flush_ds_group(ds_id, group, ds_id in spooled, batches[ds_id])
+            for ds_id, group in groups.items()
+        ])
+
+    async def _flush_ds_group(self, ds_id: str, tags: dict, spooled: bool,
+        batches: dict) -> None:
+        """Запись группы тегов в хранилище и учёт результата записи
+        в извлечённых из кэша данных (см. :meth:`_release_tags_data`).
+
+        Args:
+            ds_id (str): id хранилища
+            tags (dict): {"<tag_id>": <кэш тега вместе с данными>}
+            spooled (bool): данные группы записаны в журнал хранилища
+            batches (dict): {"<tag_id>": [<извлечённые данные тега>, ...]}
+        """
+        failed = list(tags.keys())
+        try:
+            failed = await self._write_ds_group(ds_id, tags, spooled)
+        finally:
+            self._release_tags_data(ds_id, batches, failed)
+
+    async def _write_ds_group(self, ds_id: str, tags: dict, spooled: bool) -> List[str]:
+        """Запись группы тегов в хранилище.
+
+        Args:
+            ds_id (str): id хранилища
+            tags (dict): {"<tag_id>": <кэш тега вместе с данными>}
+            spooled (bool): данные группы записаны в журнал хранилища,
+                в этом случае в базу записываются все записи журнала
+                по порядку
+
+        Returns:
+            List[str]: id тегов группы без журнала, данные которых
+            не записаны; данные из журнала при ошибке остаются в журнале
+        """
+        async with self._flush_semaphore:
+            if spooled:
+                await self._write_spool(ds_id)
+                return []
+            return await self._write_ds_data(ds_id, tags)
+
+    async def _write_ds_data(self, ds_id: str, tags: dict) -> List[str]:
+        """Запись группы тегов в хранилище с учётом метрик сброса.
+
+        Returns:
+            List[str]: id тегов, данные которых не записаны
+        """
+        t1 = time.perf_counter()
+        try:
+            failed = await self._write_ds_data_to_db(ds_id, tags) or []
+        except Exception as ex:
+            self._logger.error(f"{self._config.svc_name} :: Ошибка записи данных в базу {ds_id}: {ex}")
+            return list(tags.keys())
+        count = sum(
+            len(tag_cache["data"]) for tag_id, tag_cache in tags.items()
+            if tag_id not in failed
+        )
+        self._update_flush_metrics(time.perf_counter() - t1, count)
+        return failed
+
+    def _get_spool(self, ds_id: str) -> Spool | None:
+        """Журнал данных хранилища; создаётся при первом обращении.
+        Если параметр ``spool_dir`` не задан, журналы не ведутся.
+        """
+        if not self._config.spool_dir:
+            return None
+        spool = self._spools.get(ds_id)
+        if spool is None:
+            spool = Spool(
+                os.path.join(self._config.spool_dir, self._config.svc_name, ds_id),
+                segment_size=self._config.spool_segment_size,
+                sync=self._config.spool_sync
+            )
+            self._spools[ds_id] = spool
+            self._spool_locks[ds_id] = asyncio.Lock()
+        return spool
+
+    async def _write_spool(self, ds_id: str) -> None:
+        """Запись в базу записей журнала хранилища в порядке их добавления.
+        При ошибке записи оставшиеся записи остаются в журнале и будут
+        записаны повторно (см. :meth:`_spool_scheduler`). Если не записаны
+        данные только части тегов записи, запись заменяется записью
+        с данными этих тегов в конце журнала: данные остальных тегов
+        повторно не записываются.
+
+        Args:
+            ds_id (str): id хранилища
+        """
+        spool = self._spools[ds_id]
+        async with self._spool_locks[ds_id]:
+            while spool.depth:
+                record = spool.pending(1)[0]
+                replay = ds_id in self._spool_failed
+                t1 = time.perf_counter()
+                failed = await self._write_ds_data(ds_id, record["tags"])
+                if failed:
+                    if len(failed) < len(record["tags"]):
+                        spool.append({
+                            "tags": {tag_id: record["tags"][tag_id] for tag_id in failed}
+                        })
+                        spool.commit(1)
+                    self._spool_failed.add(ds_id)
+                    return
+                spool.commit(1)
+                if replay:
+                    self._update_replay_metrics(
+                        time.perf_counter() - t1,
+                        sum(len(tag["data"]) for tag in record["tags"].values())
+                    )
+
+            self._spool_failed.discard(ds_id)
+
+    async def _replay_spools(self) -> None:
+        """Повторная запись в базу данных из журналов хранилищ,
+        запись в которые закончилась ошибкой.
+        """
+        for ds_id in list(self._spool_failed):
+            if ds_id not in self._spools or self._spool_locks[ds_id].locked():
+                continue
+            async with self._flush_semaphore:
+                await self._write_spool(ds_id)
+
+    async def _spool_scheduler(self) -> None:
+        """Планировщик повторной записи данных из журналов в базу.
+        """
+        while True:
+            await asyncio.sleep(self._config.spool_retry_period)
+            try:
+                await self._replay_spools()
+            except Exception as ex:
+                self._logger.error(f"{self._config.svc_name} :: Ошибка повторной записи данных из журнала: {ex}")
+
+    def _mark_dirty_tag(self, tag_id: str, dss: List[str], count: int) -> None:
+        """Учёт точек, добавленных в кэш тега.
+        Если количество точек в кэше тега или хранилища превысило порог,
+        планировщик сброса кэша запускается немедленно.
+
+        Args:
+            tag_id (str): id тега
+            dss (List[str]): хранилища, к которым привязан тег
+            count (int): количество добавленных точек
+        """
+        item = self._dirty_tags.get(tag_id)
+        if item is None:
+            item = {"count": 0, "since": time.monotonic(), "dss": list(dss)}
+            self._dirty_tags[tag_id] = item
+        item["count"] += count
+
+        if item["count"] >= self._config.cache_data_tag_size:
+            self._flush_event.set()
+
+        for ds_id in item["dss"]:
+            self._dirty_dss[ds_id] = self._dirty_dss.get(ds_id, 0) + count
+            if self._dirty_dss[ds_id] >= self._config.cache_data_ds_size:
+                self._flush_event.set()
+
+    def _pop_dirty_tag(self, tag_id: str) -> dict | None:
+        """Удаление тега из списка тегов, ожидающих сброса кэша.
+
+        Args:
+            tag_id (str): id тега
+
+        Returns:
+            dict | None: учётные данные тега, если он был в списке
+        """
+        item = self._dirty_tags.pop(tag_id, None)
+        if item is None:
+            return None
+        for ds_id in item["dss"]:
+            count = self._dirty_dss.get(ds_id, 0) - item["count"]
+            if count > 0:
+                self._dirty_dss[ds_id] = count
+            else:
+                self._dirty_dss.pop(ds_id, None)
+        return item
+
+    def _get_tags_to_flush(self) -> List[str]:
+        """Выбор тегов, кэш которых пора сбрасывать в базу:
+        по количеству точек в кэше тега, по возрасту самой старой точки
+        и по суммарному количеству точек в кэше хранилища.
+
+        Returns:
+            List[str]: список id тегов
+        """
+        now = time.monotonic()
+        full_dss = {
+            ds_id for ds_id, count in self._dirty_dss.items()
+            if count >= self._config.cache_data_ds_size
+        }
+        return [
+            tag_id for tag_id, item in self._dirty_tags.items()
+            if item["count"] >= self._config.cache_data_tag_size or \
+                now - item["since"] >= self._config.cache_data_period or \
+                full_dss.intersection(item["dss"])
+        ]
+
+    async def _flush_scheduler(self) -> None:
+        """Планировщик сброса кэша данных тегов в базу.
+        Периодически (и немедленно при превышении порогов по количеству
+        точек) проверяет условия сброса и сбрасывает кэш только тех тегов,
+        в которых есть новые данные.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._flush_event.wait(),
+                    self._config.cache_data_check_period
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+
+            try:
+                tag_ids = self._get_tags_to_flush()
+                if tag_ids:
+                    await self._flush_tags(tag_ids)
+            except Exception as ex:
+                self._logger.error(f"{self._config.svc_name} :: Ошибка сброса кэша в базу: {ex}")
+
+    async def _flush_tags(self, tag_ids: List[str]) -> None:
+        """Сброс кэша тегов в базу по расписанию.
+
+        Args:
+            tag_ids (List[str]): список id тегов
+        """
+        to_write = [
+            tag_id for tag_id in tag_ids
+            if self._pop_dirty_tag(tag_id) is not None
+        ]
+        await self._write_tags_data(to_write)
+
+    def _update_flush_metrics(self, latency: float, count: int) -> None:
+        metrics = self._metrics["flush"]
+        metrics["count"] += 1
+        metrics["points"] += count
+        metrics["lastLatency"] = latency
+        metrics["maxLatency"] = max(metrics["maxLatency"], latency)
+        metrics["totalLatency"] += latency
+        metrics["lastBatchSize"] = count
+        metrics["maxBatchSize"] = max(metrics["maxBatchSize"], count)
+
+    def _update_replay_metrics(self, latency: float, count: int) -> None:
+        metrics = self._metrics["spool"]
+        metrics["replayedPoints"] += count
+        if latency > 0:
+            metrics["replayRate"] = count / latency
+
+    def _metrics_get(self) -> dict:
+        """Метрики работы сервиса.
+        """
+        self._metrics["spool"]["depth"] = sum(
+            spool.depth for spool in self._spools.values()
+        )
+        self._metrics["spool"]["bytes"] = sum(
+            spool.size for spool in self._spools.values()
+        )
+        cache = self._result_cache
+        metrics = self._metrics["resultCache"]
+        metrics["hits"] = cache.hits
+        metrics["misses"] = cache.misses
+        if cache.hits + cache.misses:
+            metrics["hitRatio"] = cache.hits / (cache.hits + cache.misses)
+        metrics["entries"] = cache.entries
+        metrics["points"] = cache.points
+        return self._metrics
 
     async def _tag_set(self, mes: dict, routing_key: str = None) -> None:
         """
@@ -721,6 +1158,11 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
                         f"{tag_id}.{self._config.svc_name}",
                         "data", *tag_item["data"]
                     ).exec()
+                    self._mark_dirty_tag(tag_id, cache["dss"].keys(), len(tag_item["data"]))
+                    xs = [x for _, x, _ in tag_item["data"]]
+                    if xs:
+                        self._result_cache.written(tag_id, min(xs), max(xs))
+                    self._current_values.written(tag_id, tag_item["data"])
                     self._logger.info(f"{self._config.svc_name} :: Кэш тега {tag_id} обновлён.")
 
         except Exception as ex:
@@ -808,6 +1250,10 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         return tag_cache
     
     async def _delete_tag_cache(self, tag_id: str):
+        # кэш тега удаляется при изменении тега и его хранилища,
+        # вместе с ним - результаты чтения его данных
+        self._result_cache.invalidate(tag_id)
+        self._current_values.invalidate(tag_id)
         try:
             await self._cache.delete(name=f"{tag_id}.{self._config.svc_name}").exec()
         except Exception as ex:
@@ -897,7 +1343,10 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
                 "actual": bool,
                 "value": Any,
                 "count": int,
-                "timeStep": int                
+                "timeStep": int,
+                "downsample": str,
+                "columnar": bool,
+                "matrix": bool
             }
 
         Returns:
@@ -908,174 +1357,729 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
 
         self._logger.debug(f"Чтение данных: {mes}")
 
-        tasks = {}
+        result = {"data": []}
+
+        # Если ключ actual установлен в true, ключ timeStep не учитывается
+        if mes["actual"] or (mes["value"] is not None \
+        and len(mes["value"]) > 0):
+            mes["timeStep"] = None
+
+        # разрешение агрегатов, по которым можно получить
+        # интерполированные значения
+        resolution = self._plan_rollup(mes)
+
+        if mes.get("stream"):
+            return await self._tag_get_stream(mes, resolution)
+
+        # данные нескольких тегов читаются из базы одним обращением,
+        # дальше данные каждого тега обрабатываются отдельно
+        tag_ids = mes["tagId"]
+        rejected = []
+        raw = {}
+        cached = {}
+        key = self._result_key(mes)
+        if self._is_current_request(mes):
+            # значения на текущий момент берутся из таблицы последних значений
+            for tag_id in tag_ids:
+                tag_data = self._current_data(tag_id, mes["finish"])
+                if tag_data is not None:
+                    cached[tag_id] = tag_data
+        elif key is not None:
+            for tag_id in tag_ids:
+                tag_data = self._result_cache.get(tag_id, key)
+                if tag_data is not None:
+                    cached[tag_id] = tag_data
+        if len(tag_ids) > 1:
+            # теги, не привязанные к хранилищам сервиса, возвращаются
+            # отправителю в ключе "rejected" для отдельного запроса
+            tag_ids, rejected = await self._split_served_tags(tag_ids)
+            to_read = [tag_id for tag_id in tag_ids if tag_id not in cached]
+            try:
+                if len(to_read) > 1:
+                    async with self._read_semaphore:
+                        raw = await self._read_tags_data(
+                            to_read, **self._read_args(mes, resolution)
+                        )
+            except Exception as ex:
+                # данные будут прочитаны для каждого тега отдельно
+                self._logger.error(f"{self._config.svc_name} :: Ошибка чтения данных тегов {tag_ids}: {ex}")
+
+        async def get_tag(tag_id: str) -> List[tuple]:
+            if tag_id in cached:
+                return cached[tag_id]
+            # количество одновременных чтений ограничено, чтобы запрос
+            # многих тегов не занимал все соединения пула
+            async with self._read_semaphore:
+                return await self._get_tag_data_cached(
+                    tag_id, mes, resolution, key, raw.get(tag_id)
+                )
+
+        # все теги запускаются сразу, результат собирается один раз
+        tags_data = await asyncio.gather(
+            *[get_tag(tag_id) for tag_id in tag_ids], return_exceptions=True
+        )
+
+        for tag_id, tag_data in zip(tag_ids, tags_data):
+            # ошибка чтения одного тега не отменяет чтение остальных
+            if isinstance(tag_data, Exception):
+                self._logger.error(f"{self._config.svc_name} :: Ошибка чтения данных тега {tag_id}: {tag_data}")
+                result["data"].append({
+                    "tagId": tag_id,
+                    "data": [],
+                    "error": str(tag_data)
+                })
+                continue
+
+            tag_data, excess = self._limit_max_count(tag_data, mes)
+
+            '''
+            if mes["format"]:
+                svc.format_data(tag_data, data.format)
+            '''
+            new_item = {
+                "tagId": tag_id,
+                "data": tag_data
+            }
+            if mes["maxCount"]:
+                new_item["excess"] = excess
+            result["data"].append(new_item)
+
+        self._logger.debug(f"Получение данных: {result}")
+
+        if rejected:
+            result["rejected"] = rejected
+
+        if mes.get("matrix") and mes["timeStep"] is not None:
+            self._to_matrix(result, mes)
+        else:
+            self._format_items(result["data"], mes)
+
+        return result
+
+    async def _tag_aggregate(self, mes: dict, routing_key: str = None) -> dict:
+        """Расчёт агрегатов данных тегов по интервалам.
+        Агрегаты рассчитываются в сервисе хранилища, отправителю
+        возвращается одна точка на каждый интервал
+        (см. :class:`src.services.dataStorages.app.aggregation.Aggregator`).
+
+        Args:
+            mes (dict): {
+                "tagId": [str],
+                "start": int,
+                "finish": int,
+                "interval": int,
+                "functions": [str]
+            }
+
+        Returns:
+            dict: {"data": [{"tagId": str, "data": [({"<агрегат>": значение}, x, None)]}]}
+            и ключ ``rejected`` (см. :meth:`_tag_get`)
+        """
+        self._logger.debug(f"Расчёт агрегатов: {mes}")
+
+        tag_ids = mes["tagId"]
+        rejected = []
+        if len(tag_ids) > 1:
+            tag_ids, rejected = await self._split_served_tags(tag_ids)
+
+        async def get_tag(tag_id: str) -> List[tuple]:
+            async with self._read_semaphore:
+                return await self._aggregate_tag_data(tag_id, mes)
+
+        tags_data = await asyncio.gather(
+            *[get_tag(tag_id) for tag_id in tag_ids], return_exceptions=True
+        )
+
+        result = {"data": []}
+        for tag_id, tag_data in zip(tag_ids, tags_data):
+            if isinstance(tag_data, Exception):
+                self._logger.error(f"{self._config.svc_name} :: Ошибка расчёта агрегатов тега {tag_id}: {tag_data}")
+                result["data"].append({
+                    "tagId": tag_id,
+                    "data": [],
+                    "error": str(tag_data)
+                })
+                continue
+            result["data"].append({"tagId": tag_id, "data": tag_data})
+
+        if rejected:
+            result["rejected"] = rejected
+
+        return result
+
+    async def _aggregate_tag_data(self, tag_id: str, mes: dict) -> List[tuple]:
+        """Агрегаты данных одного тега. Данные периода читаются из базы
+        постранично (см. :meth:`_read_pages`), вместе с точками
+        "перед start" и "после finish".
+        """
+        tag_cache = await self._cache.get(
+            f"{tag_id}.{self._config.svc_name}", "prsStep", "prsValueTypeCode"
+        ).exec()
+        if tag_cache[0] is None:
+            self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} отсутствует в кэше.")
+            return []
+
+        start = mes["start"]
+        finish = mes["finish"]
+        aggregator = Aggregator(
+            start, finish, mes["interval"], mes["functions"],
+            tag_cache[0]["prsValueTypeCode"] in (TVT.CN_INT, TVT.CN_DOUBLE),
+            tag_cache[0]["prsStep"],
+            self._config.aggregate_max_intervals
+        )
+
+        aggregator.add(await self._read_tag_data(
+            tag_id, None, start - 1, Order.CN_DESC, 1, False, False
+        ))
+        async for page in self._read_pages(
+            tag_id, start, finish, self._config.stream_chunk_size
+        ):
+            aggregator.add(page)
+        aggregator.add(await self._read_tag_data(
+            tag_id, finish + 1, None, Order.CN_ASC, 1, False, False
+        ))
+
+        return aggregator.result()
+
+    async def _tag_snapshot(self, mes: dict, routing_key: str = None) -> dict:
+        """Значения тегов на одну метку времени (срез).
 
-        await self._write_cache_data(mes["tagId"])
+        Значения тегов, последние точки которых известны и не позже метки,
+        берутся из таблицы последних значений. Для остальных тегов точки
+        "не позже метки" и "после метки" читаются из базы одним обращением
+        (см. :meth:`_read_tags_data`), значения всех тегов рассчитываются
+        сразу (см. :func:`src.services.dataStorages.app.interpolation.values_at`).
 
-        for tag_id in mes["tagId"]:
-            # Если ключ actual установлен в true, ключ timeStep не учитывается
-            if mes["actual"] or (mes["value"] is not None \
-            and len(mes["value"]) > 0):
-                mes["timeStep"] = None
+        Args:
+            mes (dict): {
+                "tagId": [str],
+                "x": int
+            }
 
-            if mes["actual"]:
-                tasks[tag_id]= asyncio.create_task(
-                    self._data_get_actual(
-                        tag_id,
-                        mes["start"],
-                        mes["finish"],
-                        mes["count"],
-                        mes["value"]
+        Returns:
+            dict: {"data": [{"tagId": str, "data": [(y, x, q)]}]}
+            и ключ ``rejected`` (см. :meth:`_tag_get`)
+        """
+        self._logger.debug(f"Срез данных: {mes}")
+
+        x = mes["x"]
+        tag_ids = mes["tagId"]
+        rejected = []
+        if len(tag_ids) > 1:
+            tag_ids, rejected = await self._split_served_tags(tag_ids)
+
+        points = {}
+        for tag_id in tag_ids:
+            tag_data = self._current_data(tag_id, x)
+            if tag_data is not None:
+                points[tag_id] = tag_data[0]
+
+        errors = {}
+        to_read = [tag_id for tag_id in tag_ids if tag_id not in points]
+        if to_read:
+            try:
+                async with self._read_semaphore:
+                    raw = await self._read_tags_data(
+                        to_read, None, x, Order.CN_DESC, 1, False, True
                     )
+                pipe = self._cache
+                for tag_id in to_read:
+                    pipe = pipe.get(
+                        f"{tag_id}.{self._config.svc_name}", "prsStep", "prsValueTypeCode"
+                    )
+                tags_cache = await pipe.exec()
+
+                known = []
+                for tag_id, tag_cache in zip(to_read, tags_cache):
+                    if tag_cache is None:
+                        self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} отсутствует в кэше.")
+                        continue
+                    known.append((tag_id, tag_cache))
+                values = values_at(
+                    [raw.get(tag_id, []) for tag_id, _ in known], x,
+                    [tag_cache["prsStep"] for _, tag_cache in known],
+                    [tag_cache["prsValueTypeCode"] == TVT.CN_INT for _, tag_cache in known]
                 )
+                points.update(zip([tag_id for tag_id, _ in known], values))
+            except Exception as ex:
+                self._logger.error(f"{self._config.svc_name} :: Ошибка чтения среза тегов {to_read}: {ex}")
+                errors = {tag_id: str(ex) for tag_id in to_read}
+
+        result = {"data": []}
+        for tag_id in tag_ids:
+            item = {
+                "tagId": tag_id,
+                "data": [points[tag_id]] if tag_id in points else []
+            }
+            if tag_id in errors:
+                item["error"] = errors[tag_id]
+            result["data"].append(item)
 
-            elif mes["timeStep"] is not None:
-                tasks[tag_id]= asyncio.create_task(
-                        self._data_get_interpolated(
-                            tag_id,
-                            mes["start"], mes["finish"],
-                            mes["count"], mes["timeStep"]
-                        )
-                    )
+        if rejected:
+            result["rejected"] = rejected
 
-            elif mes["start"] is None and \
-                mes["count"] is None and \
-                (mes["value"] is None or len(mes["value"]) == 0):
-                tasks[tag_id] = asyncio.create_task(
-                        self._data_get_one(
-                            tag_id,
-                            mes["finish"]
-                        )
-                    )
+        return result
 
+    def _limit_max_count(self, tag_data: List[tuple], mes: dict) -> Tuple[List[tuple], bool]:
+        """Ограничение количества точек тега ключом ``maxCount`` запроса.
+
+        Returns:
+            Tuple[List[tuple], bool]: (данные тега, флаг превышения ``maxCount``\)
+        """
+        if mes["maxCount"] is None:
+            return tag_data, False
+
+        excess = len(tag_data) > mes["maxCount"]
+        if excess:
+            if mes["maxCount"] == 0:
+                tag_data = []
+            elif mes["maxCount"] == 1:
+                tag_data = tag_data[:1]
+            elif mes["maxCount"] == 2:
+                tag_data = [tag_data[0], tag_data[-1]]
+            elif mes.get("downsample"):
+                # прореживание с сохранением формы графика
+                tag_data = downsample(
+                    tag_data, mes["maxCount"], mes["downsample"]
+                )
             else:
-                # Множество значений
-                tasks[tag_id]= asyncio.create_task(
-                        self._data_get_many(
-                            tag_id,
-                            mes["start"],
-                            mes["finish"],
-                            mes["count"]
-                        )
-                    )
+                new_tag_data = tag_data[:mes["maxCount"] - 1]
+                new_tag_data.append(tag_data[-1])
+                tag_data = new_tag_data
+        return tag_data, excess
+
+    async def _tag_get_stream(self, mes: dict, resolution: int = None) -> dict:
+        """Чтение данных тегов с отправкой ответа частями (ключ ``stream``
+        запроса). Данные каждого тега отправляются частями не более
+        ``stream_chunk_size`` точек: ``{"data": [{"tagId": str, "data": [...]}]}``\,
+        части одного тега идут подряд. Теги читаются по очереди, поэтому
+        в памяти находится не больше одной части данных.
 
-            result = {"data": []}
+        Returns:
+            dict: последняя часть ответа - теги с ошибками чтения и теги
+            без данных, ключ ``rejected`` (см. :meth:`_tag_get`)
+        """
+        tag_ids = mes["tagId"]
+        rejected = []
+        if len(tag_ids) > 1:
+            tag_ids, rejected = await self._split_served_tags(tag_ids)
+
+        result = {"data": []}
+        for tag_id in tag_ids:
+            sent = False
+            try:
+                async with self._read_semaphore:
+                    if mes["maxCount"] is not None:
+                        # ответ на запрос с maxCount ограничен по размеру
+                        key = self._result_key(mes)
+                        tag_data = None if key is None else \
+                            self._result_cache.get(tag_id, key)
+                        if tag_data is None:
+                            tag_data = await self._get_tag_data_cached(
+                                tag_id, mes, resolution, key
+                            )
+                        tag_data, excess = self._limit_max_count(tag_data, mes)
+                        result["data"].append({
+                            "tagId": tag_id, "data": tag_data, "excess": excess
+                        })
+                        continue
 
-            if tasks:
-                await asyncio.wait(list(tasks.values()))
-            else:
-                self._logger.debug(f"Нет возвращаемых данных.")
-                return result
-
-            for tag_id, task in tasks.items():
-                tag_data = task.result()
-
-                if not mes["actual"] and \
-                    (
-                        mes["value"] is not None and \
-                        len(mes["value"]) > 0
-                    ):
-                    tag_data = self._filter_data(
-                        tag_data,
-                        mes["value"],
-                        self._tags[tag_id]['value_type'],
-                        self._tags[tag_id]['step']
-                    )
-                    if mes["from_"] is None:
-                        tag_data = [tag_data[-1]]
-
-                excess = False
-                if mes["maxCount"] is not None:
-                    excess = len(tag_data) > mes["maxCount"]
-
-                    if excess:
-                        if mes["maxCount"] == 0:
-                            tag_data = []
-                        elif mes["maxCount"] == 1:
-                            tag_data = tag_data[:1]
-                        elif mes["maxCount"] == 2:
-                            tag_data = [tag_data[0], tag_data[-1]]
-                        else:
-                            new_tag_data = tag_data[:mes["maxCount"] - 1]
-                            new_tag_data.append(tag_data[-1])
-                            tag_data = new_tag_data
-
-                '''
-                if mes["format"]:
-                    svc.format_data(tag_data, data.format)
-                '''
-                new_item = {
-                    "tagId": tag_id,
-                    "data": tag_data
-                }
-                if mes["maxCount"]:
-                    new_item["excess"] = excess
-                result["data"].append(new_item)
+                    async for chunk in self._stream_tag_data(tag_id, mes, resolution):
+                        items = [{"tagId": tag_id, "data": chunk}]
+                        self._format_items(items, mes)
+                        if not await self._post_chunk({"data": items}):
+                            # получатель не принимает части ответа
+                            result["error"] = "Получатель не принимает части ответа."
+                            return result
+                        sent = True
+            except Exception as ex:
+                self._logger.error(f"{self._config.svc_name} :: Ошибка чтения данных тега {tag_id}: {ex}")
+                result["data"].append({"tagId": tag_id, "data": [], "error": str(ex)})
+                continue
 
-            self._logger.debug(f"Получение данных: {result}")
+            if not sent:
+                result["data"].append({"tagId": tag_id, "data": []})
 
-        return result
+        if rejected:
+            result["rejected"] = rejected
 
-    def _filter_data(
-            self, tag_data: List[tuple], value: List[Any], tag_type_code: int,
-            tag_step: bool) -> List[tuple]:
-        def estimate(x1: int, y1: int | float, x2: int, y2: int | float, y: int | float) -> int:
-            '''
-            Функция принимает на вход две точки прямой и значение, координату X которого возвращает.
-            '''
-            k = (y2 - y1)/(x2 - x1)
-            b = y2 - k * x2
+        self._format_items(result["data"], mes)
 
-            x = round((y - b) / k)
+        return result
 
-            return x
+    def _format_items(self, items: List[dict], mes: dict) -> None:
+        """Преобразование данных тегов ответа в формат, заданный запросом.
+        При ключе ``columnar`` = true данные каждого тега передаются
+        столбцами: ``{"y": [...], "x": [...], "q": [...]}``\.
+        Элементы изменяются на месте.
+        """
+        if not mes.get("columnar"):
+            return
+        for item in items:
+            item["data"] = to_columns(item["data"])
+
+    def _to_matrix(self, result: dict, mes: dict) -> None:
+        """Преобразование ответа на запрос с ключом ``matrix`` = true:
+        ряд меток времени ``timeStep`` передаётся один раз, в ключе ``x``
+        ответа, данные каждого тега - столбцами значений и кодов качества
+        на этом ряде ``{"y": [...], "q": [...]}``\.
+        Ответ изменяется на месте.
+        """
+        time_row = self._timestep_row(
+            mes["timeStep"], mes["count"], mes["start"], mes["finish"]
+        )
+        result["x"] = time_row
+        for item in result["data"]:
+            item["data"] = to_grid(item["data"], time_row)
+
+    async def _stream_tag_data(self, tag_id: str, mes: dict,
+        resolution: int = None) -> AsyncIterator[List[tuple]]:
+        """Данные тега частями не более ``stream_chunk_size`` точек.
+
+        Данные за период (заданы ``start`` и ``finish``\, без ``timeStep``\,
+        ``count`` и фильтра значений) читаются из базы постранично, значения
+        на границах периода рассчитываются так же, как в :meth:`_data_get_many`\.
+        Остальные запросы обрабатываются целиком методом :meth:`_get_tag_data`
+        и делятся на части.
+
+        Yields:
+            List[tuple]: очередная часть данных тега [(y, x, q)]
+        """
+        chunk_size = self._config.stream_chunk_size
+        start = mes["start"]
+        finish = mes["finish"]
+        if start is None or finish is None or mes["timeStep"] is not None or \
+            mes["count"] is not None or \
+            (mes["value"] is not None and len(mes["value"]) > 0):
+            tag_data = await self._get_tag_data(tag_id, mes, resolution)
+            for i in range(0, len(tag_data), chunk_size):
+                yield tag_data[i:i + chunk_size]
+            return
 
+        if mes["actual"]:
+            async for page in self._read_pages(tag_id, start, finish, chunk_size):
+                yield page
+            return
 
-        res = []
-        if tag_step or tag_type_code not in [0, 1]:
-            for item in tag_data:
-                if tag_type_code == 4:
-                    y = json.loads(item[0])
-                else:
-                    y = item[0]
-                if y in value:
-                    res.append(item)
-        else:
-            for i in range(1, len(tag_data)):
-                y1 = tag_data[i - 1][0]
-                y2 = tag_data[i][0]
-                x1 = tag_data[i - 1][1]
-                x2 = tag_data[i][1]
-                if x1 == x2:
+        tag_cache = await self._cache.get(
+            f"{tag_id}.{self._config.svc_name}", "prsStep"
+        ).exec()
+        if tag_cache[0] is None:
+            self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} отсутствует в кэше.")
+            return
+        step = tag_cache[0]
+
+        # точка "перед start"
+        tag_data = await self._read_tag_data(
+            tag_id, None, start - 1, Order.CN_DESC, 1, False, False
+        )
+        started = False
+        async for page in self._read_pages(tag_id, start, finish, chunk_size):
+            tag_data += page
+            if not started:
+                # для значения на start нужны первая точка и все точки
+                # со следующей меткой времени
+                if len(tag_data) < 3 or tag_data[-1][1] == tag_data[1][1]:
                     continue
-                if y1 in value:
-                    res.append(tag_data[i - 1])
-                else:
-                    if y1 is None or y2 is None:
-                        continue
-                    for val in value:
-                        if val is None:
-                            continue
-                        if tag_type_code == 0 and isinstance(val, float):
-                            continue
-                        if ((y1 > val and y2 < val) or (y1 < val and y2 > val)):
-                            x = estimate(x1, y1, x2, y2, val)
-                            res.append((val, x, None))
-            if tag_data[-1][0] in value:
-                res.append(tag_data[-1])
-        return res
+                self._bound_start(tag_data, start, step, t.ts())
+                started = True
+            # две последние точки нужны для значения на finish
+            if len(tag_data) > 2:
+                yield tag_data[:-2]
+                tag_data = tag_data[-2:]
+
+        # точка "после finish"
+        tag_data += await self._read_tag_data(
+            tag_id, finish + 1, None, Order.CN_ASC, 1, False, False
+        )
+        if not started:
+            tag_data = await self._data_get_many(
+                tag_id, start, finish, raw_data=tag_data
+            )
+        elif tag_data:
+            self._bound_finish(tag_data, finish, step)
+        if tag_data:
+            yield tag_data
+
+    async def _read_pages(self, tag_id: str, start: int, finish: int,
+        page_size: int) -> AsyncIterator[List[tuple]]:
+        """Постраничное чтение точек тега с метками времени от ``start``
+        до ``finish`` включительно. Точки с последней меткой времени
+        страницы переносятся на следующую страницу, которая читается
+        от этой метки. Если вся страница состоит из точек с одной меткой,
+        следующая страница читается от неё же с пропуском прочитанных точек.
+
+        Yields:
+            List[tuple]: страница данных тега [(y, x, q)]
+        """
+        skip = 0
+        while True:
+            fetched = await self._read_tag_data(
+                tag_id, start, finish, Order.CN_ASC, page_size + skip, False, False
+            )
+            page = fetched[skip:]
+            if len(fetched) < page_size + skip:
+                if page:
+                    yield page
+                return
+
+            start = fetched[-1][1]
+            head = [item for item in page if item[1] != start]
+            if head:
+                yield head
+                skip = 0
+            else:
+                yield page
+                skip = sum(1 for item in fetched if item[1] == start)
+
+    def _result_key(self, mes: dict) -> tuple | None:
+        """Ключ запроса в кэше результатов.
+
+        Результат кэшируется только для периодов, закончившихся до момента
+        чтения. Ключи ``maxCount``, ``downsample``, ``columnar``, ``matrix``
+        к ключу не относятся: они применяются к результату после кэша.
+
+        Returns:
+            tuple | None: ключ или None, если результат не кэшируется
+        """
+        if not self._result_cache.enabled or mes["finish"] is None or \
+            mes["finish"] >= t.now_int():
+            return None
+        return (
+            mes["start"], mes["finish"], mes["timeStep"], mes["count"],
+            mes["actual"], json.dumps(mes["value"], sort_keys=True)
+        )
+
+    async def _get_tag_data_cached(self, tag_id: str, mes: dict,
+        resolution: int = None, key: tuple = None,
+        raw_data: List[tuple] = None) -> List[tuple]:
+        """Получение данных одного тега методом :meth:`_get_tag_data`
+        с сохранением результата в кэше результатов. Наличие результата
+        в кэше проверяется вызывающим методом.
+
+        Args:
+            tag_id (str): id тега
+            mes (dict): запрос данных
+            resolution (int): разрешение агрегатов (см. :meth:`_plan_rollup`)
+            key (tuple): ключ запроса в кэше (см. :meth:`_result_key`);
+                None - кэш не используется
+            raw_data (List[tuple]): данные тега, уже прочитанные из базы
+
+        Returns:
+            List[tuple]: данные тега [(y, x, q)]
+        """
+        if key is None:
+            return await self._get_tag_data(tag_id, mes, resolution, raw_data)
+
+        # запись в тег во время чтения отменяет сохранение результата
+        version = self._result_cache.version(tag_id)
+        tag_data = await self._get_tag_data(tag_id, mes, resolution, raw_data)
+        # точка с меткой позже окончания периода (например, текущее
+        # значение при отсутствии данных в периоде) зависит от момента чтения
+        if not tag_data or tag_data[-1][1] is None or \
+            tag_data[-1][1] <= mes["finish"]:
+            self._result_cache.put(
+                tag_id, key, tag_data, mes["finish"], version
+            )
+        return tag_data
+
+    async def _get_tag_data(self, tag_id: str, mes: dict, resolution: int = None,
+        raw_data: List[tuple] = None) -> List[tuple]:
+        """Получение данных одного тега по запросу :meth:`_tag_get`\.
+
+        Args:
+            tag_id (str): id тега
+            mes (dict): запрос данных
+            resolution (int): разрешение агрегатов (см. :meth:`_plan_rollup`)
+            raw_data (List[tuple]): данные тега, уже прочитанные из базы
+
+        Returns:
+            List[tuple]: данные тега [(y, x, q)]
+        """
+        if mes["actual"]:
+            return await self._data_get_actual(
+                tag_id,
+                mes["start"],
+                mes["finish"],
+                mes["count"],
+                mes["value"],
+                raw_data
+            )
+
+        if mes["timeStep"] is not None:
+            return await self._data_get_interpolated(
+                tag_id,
+                mes["start"], mes["finish"],
+                mes["count"], mes["timeStep"],
+                resolution, raw_data
+            )
+
+        if self._is_current_request(mes):
+            return await self._data_get_one(
+                tag_id,
+                mes["finish"],
+                raw_data
+            )
+
+        # Множество значений
+        tag_data = await self._data_get_many(
+            tag_id,
+            mes["start"],
+            mes["finish"],
+            mes["count"],
+            raw_data=raw_data
+        )
+
+        if mes["value"] is not None and len(mes["value"]) > 0:
+            tag_cache = await self._cache.get(
+                f"{tag_id}.{self._config.svc_name}", "prsValueTypeCode", "prsStep"
+            ).exec()
+            if tag_cache[0] is None:
+                return []
+            tag_data = self._filter_data(
+                tag_data,
+                mes["value"],
+                tag_cache[0]["prsValueTypeCode"],
+                tag_cache[0]["prsStep"]
+            )
+            if mes["start"] is None:
+                tag_data = tag_data[-1:]
+
+        return tag_data
+
+    async def _split_served_tags(self, tag_ids: List[str]) -> Tuple[List[str], List[str]]:
+        """Разделение тегов на привязанные к хранилищам, которые
+        обслуживает сервис, и остальные.
+
+        Args:
+            tag_ids (List[str]): id тегов
+
+        Returns:
+            Tuple[List[str], List[str]]: (обслуживаемые теги, остальные теги)
+        """
+        served = set()
+        ds_ids = list(self._connection_pools.keys())
+        if ds_ids:
+            pipe = self._cache
+            for ds_id in ds_ids:
+                pipe = pipe.get(f"{ds_id}.{self._config.svc_name}", "tags")
+            for ds_tags in await pipe.exec():
+                if isinstance(ds_tags, list):
+                    served.update(ds_tags)
+
+        return (
+            [tag_id for tag_id in tag_ids if tag_id in served],
+            [tag_id for tag_id in tag_ids if tag_id not in served]
+        )
+
+    def _read_args(self, mes: dict, resolution: int = None) -> dict:
+        """Параметры чтения данных из базы для запроса :meth:`_tag_get`\.
+        Соответствуют чтению в методах ``_data_get_*``\, которыми
+        обрабатывается запрос.
+
+        Args:
+            mes (dict): запрос данных
+            resolution (int): разрешение агрегатов (см. :meth:`_plan_rollup`)
+
+        Returns:
+            dict: параметры :meth:`_read_tags_data`
+        """
+        if mes["actual"]:
+            order = Order.CN_ASC
+            count = mes["count"]
+            if mes["start"] is None:
+                order = Order.CN_DESC
+                count = (1, count)[bool(count)]
+            return {
+                "start": mes["start"], "finish": mes["finish"], "order": order,
+                "count": count, "one_before": False, "one_after": False,
+                "value": mes["value"]
+            }
+
+        if mes["timeStep"] is not None:
+            return {
+                "start": mes["start"] or (mes["finish"] - mes["timeStep"] * (mes["count"] - 1)),
+                "finish": mes["finish"], "order": Order.CN_ASC, "count": None,
+                "one_before": True, "one_after": True, "resolution": resolution,
+                "time_step": mes["timeStep"]
+            }
+
+        if mes["start"] is None and mes["count"] is None and \
+            (mes["value"] is None or len(mes["value"]) == 0):
+            # точка "после finish" для шаговых тегов отбрасывается
+            # в _data_get_one, но её отсутствие позволяет заполнить
+            # последнее значение тега
+            return {
+                "start": None, "finish": mes["finish"], "order": Order.CN_DESC,
+                "count": 1, "one_before": False, "one_after": True
+            }
+
+        return {
+            "start": mes["start"], "finish": mes["finish"],
+            "order": (Order.CN_DESC if mes["count"] is not None and mes["start"] is None else Order.CN_ASC),
+            "count": mes["count"], "one_before": True, "one_after": True
+        }
+
+    def _plan_rollup(self, mes: dict) -> int | None:
+        """Выбор разрешения агрегатов для чтения интерполированных значений.
+
+        Значение, интерполированное в момент времени, кратный разрешению,
+        зависит только от последней точки до этого момента и первой точки
+        после него, то есть от последней точки одного интервала агрегата
+        и первой точки другого. Поэтому агрегаты дают тот же результат,
+        что и исходные данные, если начало временного ряда и ``timeStep``
+        кратны разрешению. Выбирается самое крупное такое разрешение.
+
+        Args:
+            mes (dict): запрос данных (см. :meth:`_tag_get`)
+
+        Returns:
+            int | None: разрешение, секунды; None - читаются исходные данные
+        """
+        time_step = mes["timeStep"]
+        if mes["actual"] or not time_step:
+            return None
+
+        first = mes["start"]
+        if first is None:
+            if mes["finish"] is None or not mes["count"]:
+                return None
+            first = mes["finish"] - time_step * (mes["count"] - 1)
+
+        for resolution in sorted(self._config.rollup_resolutions, reverse=True):
+            res_us = resolution * t.microsec
+            if not time_step % res_us and not first % res_us:
+                return resolution
+        return None
+
+    def _filter_data(
+            self, tag_data: List[tuple], value: List[Any], tag_type_code: int,
+            tag_step: bool) -> List[tuple]:
+        """Фильтрация данных тега по значениям ``value``\.
+        См. :func:`src.services.dataStorages.app.filtering.filter_data`.
+        """
+        return filter_data(
+            tag_data, value, tag_type_code, tag_step
+        )
 
     async def _data_get_interpolated(self,
                                      tag_id: str,
                                      start: int,
                                      finish: int,
                                      count: int,
-                                     time_step: int) -> List[tuple]:
-        """ Получение интерполированных значений с шагом time_step
+                                     time_step: int,
+                                     resolution: int = None,
+                                     raw_data: List[tuple] = None) -> List[tuple]:
+        """ Получение интерполированных значений с шагом time_step.
+        Если задано разрешение агрегатов ``resolution`` (см. :meth:`_plan_rollup`),
+        вместо исходных данных читаются первые и последние точки
+        интервалов агрегата.
+        ``raw_data`` - данные тега, уже прочитанные из базы
+        (см. :meth:`_read_args`).
         """
         tag_data = await self._data_get_many(tag_id,
             start or (finish - time_step * (count - 1)),
-            finish, None
+            finish, None, resolution, raw_data, time_step
         )
         # Создание ряда таймстэмпов с шагом `time_step`
         time_row = self._timestep_row(time_step, count, start, finish)
@@ -1083,75 +2087,27 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         if not tag_data:
             return [(None, x, None) for x in time_row]
 
-        return self._interpolate(tag_data, time_row)
+        tag_cache = await self._cache.get(
+            f"{tag_id}.{self._config.svc_name}", "prsStep"
+        ).exec()
 
-    def _interpolate(self, raw_data: List[tuple], time_row: List[int]) -> List[tuple]:
-        """ Получение линейно интерполированных значений для ряда ``time_row`` по
-        действительным значениям из БД (``raw_data``\)
+        return self._interpolate(tag_data, time_row, bool(tag_cache[0]))
 
-        :param raw_data: Реальные значения из БД
-        :type raw_data: List[Dict]
+    def _interpolate(self, raw_data: List[tuple], time_row: List[int],
+                     step: bool = False) -> List[tuple]:
+        """ Получение значений для ряда ``time_row`` по
+        действительным значениям из БД (``raw_data``\).
+        См. :func:`src.services.dataStorages.app.interpolation.interpolate`.
 
-        :param time_row: Временной ряд, для которого надо рассчитать значения
-        :type time_row: List[int]
+        Args:
+            raw_data (List[tuple]): реальные значения из БД
+            time_row (List[int]): временной ряд, для которого надо рассчитать значения
+            step (bool): ступенчатый тег
 
-        :return:
-        :rtype: List[Dict]
+        Returns:
+            List[tuple]: точки ``(y, x, q)``
         """
-
-        # Разбиение списка ``raw_data`` на подсписки по значению None
-        # Если ``raw_data`` не имеет None, получается список [raw_data]
-        none_indexes = [idx for idx, val in enumerate(raw_data) if val[0] is None]
-        size = len(raw_data)
-        if none_indexes:
-            splitted_by_none = [raw_data[i: j+1] for i, j in
-                zip([0] + none_indexes, none_indexes +
-                ([size] if none_indexes[-1] != size else []))]
-        else:
-            splitted_by_none = [raw_data]
-
-        data = []  # Результирующий список
-        for period in splitted_by_none:
-            if len(period) == 1:
-                continue
-
-            key_x = lambda d: d[1]
-            min_ts = min(period, key=key_x)[1]
-            max_ts = max(period, key=key_x)[1]
-            is_last_period = period == splitted_by_none[-1]
-
-            # В каждый подсписок добавляются значения из ряда ``time_row``
-            period = [(None , ts, None) \
-                      for ts in time_row if min_ts <= ts < max_ts] + period
-            period.sort(key=key_x)
-
-            if not is_last_period:
-                period.pop()
-
-            # Расширенный подсписок заворачивается в DataFrame и индексируется по 'x'
-            df = pd.DataFrame(
-                period,
-                index=[r[1] for r in period]
-            ).drop_duplicates(subset=1, keep='last')
-
-            # линейная интерполяция значений 'y' в датафрейме для числовых тэгов
-            # заполнение NaN полей ближайшими не-NaN для нечисловых тэгов
-            df[[1, 0]] = df[[1, 0]].interpolate(
-                method=('pad', 'index')[is_numeric_dtype(df[0])]
-            )
-
-            # None-значения 'q' заполняются ближайшим не-None значением сверху
-            df[2].fillna(method='ffill', inplace=True)
-
-            # Удаление из датафрейма всех элементов, чьи 'x' не принадлежат ``time_row``
-            df = df.loc[df[1].isin(time_row)]
-            df[[0, 2]] = df[[0, 2]].replace({np.nan: None})
-
-            # Преобразование получившегося датафрейма и добавление значений к
-            # результирующему списку
-            data += list(df.to_dict('index').values())
-
-        return data
+        return interpolate(raw_data, time_row, step)
 
     def _timestep_row(self,
                       time_step: int,
@@ -1200,11 +2156,39 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
     def _last_point(self, x: int, data: List[tuple]) -> Tuple[int, Any]:
         return (x, list(filter(lambda rec: rec[1] == x, data))[-1][0])
 
+    def _is_current_request(self, mes: dict) -> bool:
+        """Запрос значения тега на одну метку времени ``finish``
+        (по умолчанию - текущий момент).
+        """
+        return not mes["actual"] and mes["timeStep"] is None and \
+            mes["start"] is None and mes["count"] is None and \
+            (mes["value"] is None or len(mes["value"]) == 0)
+
+    def _current_data(self, tag_id: str, finish: int) -> List[tuple] | None:
+        """Значение тега на метку ``finish`` по таблице последних значений.
+
+        Returns:
+            List[tuple] | None: [(y, finish, q)] или None, если последняя
+            точка тега неизвестна либо позже ``finish``
+        """
+        point = self._current_values.get(tag_id)
+        if point is None or finish is None or point[1] > finish:
+            return None
+        return [(point[0], finish, point[2])]
+
     async def _data_get_one(self,
                             tag_id: str,
-                            finish: int) -> List[dict]:
-        """ Получение значения на текущую метку времени
+                            finish: int,
+                            raw_data: List[tuple] = None) -> List[dict]:
+        """ Получение значения на текущую метку времени.
+        ``raw_data`` - данные тега, уже прочитанные из базы
+        (см. :meth:`_read_args`).
         """
+        if raw_data is None:
+            tag_data = self._current_data(tag_id, finish)
+            if tag_data is not None:
+                return tag_data
+
         tag_cache = await self._cache.get(
             f"{tag_id}.{self._config.svc_name}", "prsStep", "prsValueTypeCode"
         ).exec()
@@ -1214,10 +2198,15 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         step = tag_cache[0]["prsStep"]
         value_type_code = tag_cache[0]["prsValueTypeCode"]
         
-        tag_data = await self._read_data(
-            tag_id=tag_id, start=None, finish=finish, count=1,
-            one_before=False, one_after=not step, order=Order.CN_DESC
-        )
+        if raw_data is not None:
+            tag_data = raw_data
+        else:
+            # точка "после finish" читается и для шаговых тегов: её
+            # отсутствие позволяет заполнить последнее значение тега
+            tag_data = await self._read_tag_data(
+                tag_id=tag_id, start=None, finish=finish, count=1,
+                one_before=False, one_after=True, order=Order.CN_DESC
+            )
 
         if not tag_data:
             if finish is not None:
@@ -1253,7 +2242,10 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
                              tag_id: str,
                              start: int,
                              finish: int,
-                             count: int = None) -> List[dict]:
+                             count: int = None,
+                             resolution: int = None,
+                             raw_data: List[tuple] = None,
+                             time_step: int = None) -> List[dict]:
 
         tag_cache = await self._cache.get(
             f"{tag_id}.{self._config.svc_name}", "prsStep"
@@ -1263,76 +2255,25 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
             return []
         step = tag_cache[0]
         
-        tag_data = await self._read_data(
-            tag_id, start, finish,
-            (Order.CN_DESC if count is not None and start is None else Order.CN_ASC),
-            count, True, True, None
-        )
+        if raw_data is not None:
+            tag_data = raw_data
+        else:
+            tag_data = await self._read_tag_data(
+                tag_id, start, finish,
+                (Order.CN_DESC if count is not None and start is None else Order.CN_ASC),
+                count, True, True, None, resolution, time_step
+            )
         if not tag_data:
             return []
 
         now_ms = t.ts()
-        x0 = tag_data[0][1]
-        y0 = tag_data[0][0]
 
         if start is not None:
-            if x0 > start:
-                # Если `from_` раньше времени первой записи в выборке
-                tag_data.insert(0, (None, start, None))
-
-            if len(tag_data) == 1:
-                if x0 < start:
-                    tag_data[0] = (tag_data[0][0], start, tag_data[0][2])
-                    tag_data.append((y0, now_ms, tag_data[0][2]))
+            if self._bound_start(tag_data, start, step, now_ms):
                 return tag_data
 
-            x1, y1 = self._last_point(tag_data[1][1], tag_data)
-            if x1 == start:
-                # Если время второй записи равно `from`,
-                # то запись "перед from" не нужна
-                tag_data.pop(0)
-
-            if x0 < start < x1:
-                tag_data[0] = (tag_data[0][0], start, tag_data[0][2])
-                if step:
-                    tag_data[0] = (y0, tag_data[0][1], tag_data[0][2])
-                else:
-                    tag_data[0] = (
-                        linear_interpolated(
-                            (x0, y0), (x1, y1), start
-                        ), tag_data[0][1], tag_data[0][2]
-                    )
-
         if finish is not None:
-            # (xn; yn) - запись "после to"
-            xn = tag_data[-1][1]
-            yn = tag_data[-1][0]
-
-            # (xn_1; yn_1) - запись перед значением `to`
-            try:
-                xn_1, yn_1 = self._last_point(tag_data[-2][1], tag_data)
-            except IndexError:
-                xn_1 = -1
-                yn_1 = None
-
-            if xn_1 == finish:
-                # Если время предпоследней записи равно `to`,
-                # то запись "после to" не нужна
-                tag_data.pop()
-
-            if xn_1 < finish < xn:
-                if step:
-                    y = yn_1
-                else:
-                    y = linear_interpolated(
-                        (xn_1, yn_1), (xn, yn), finish
-                    )
-                tag_data[-1] = (
-                    y, finish, tag_data[-2][2]
-                )
-
-            if finish > xn:
-                tag_data.append((yn, finish, tag_data[-1][2]))
+            self._bound_finish(tag_data, finish, step)
 
         if all((finish is None, now_ms > tag_data[-1][1])):
             tag_data.append((tag_data[-1][0], now_ms, tag_data[-1][2]))
@@ -1340,15 +2281,93 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
         tag_data = self._limit_data(tag_data, count, start, finish)
         return tag_data
 
+    def _bound_start(self, tag_data: List[tuple], start: int, step: bool,
+                     now_ms: int) -> bool:
+        """Значение на метку ``start`` в начале выборки ``tag_data``
+        (точка "перед start" и точки от ``start``\). Выборка изменяется
+        на месте.
+
+        Returns:
+            bool: True - в выборке была одна точка, обработка выборки закончена
+        """
+        x0 = tag_data[0][1]
+        y0 = tag_data[0][0]
+
+        if x0 > start:
+            # Если `from_` раньше времени первой записи в выборке
+            tag_data.insert(0, (None, start, None))
+
+        if len(tag_data) == 1:
+            if x0 < start:
+                tag_data[0] = (tag_data[0][0], start, tag_data[0][2])
+                tag_data.append((y0, now_ms, tag_data[0][2]))
+            return True
+
+        x1, y1 = self._last_point(tag_data[1][1], tag_data)
+        if x1 == start:
+            # Если время второй записи равно `from`,
+            # то запись "перед from" не нужна
+            tag_data.pop(0)
+
+        if x0 < start < x1:
+            tag_data[0] = (tag_data[0][0], start, tag_data[0][2])
+            if step:
+                tag_data[0] = (y0, tag_data[0][1], tag_data[0][2])
+            else:
+                tag_data[0] = (
+                    linear_interpolated(
+                        (x0, y0), (x1, y1), start
+                    ), tag_data[0][1], tag_data[0][2]
+                )
+        return False
+
+    def _bound_finish(self, tag_data: List[tuple], finish: int, step: bool) -> None:
+        """Значение на метку ``finish`` в конце выборки ``tag_data``
+        (точки до ``finish`` и точка "после finish"). Используются две
+        последние точки выборки. Выборка изменяется на месте.
+        """
+        # (xn; yn) - запись "после to"
+        xn = tag_data[-1][1]
+        yn = tag_data[-1][0]
+
+        # (xn_1; yn_1) - запись перед значением `to`
+        try:
+            xn_1, yn_1 = self._last_point(tag_data[-2][1], tag_data)
+        except IndexError:
+            xn_1 = -1
+            yn_1 = None
+
+        if xn_1 == finish:
+            # Если время предпоследней записи равно `to`,
+            # то запись "после to" не нужна
+            tag_data.pop()
+
+        if xn_1 < finish < xn:
+            if step:
+                y = yn_1
+            else:
+                y = linear_interpolated(
+                    (xn_1, yn_1), (xn, yn), finish
+                )
+            tag_data[-1] = (
+                y, finish, tag_data[-2][2]
+            )
+
+        if finish > xn:
+            tag_data.append((yn, finish, tag_data[-1][2]))
+
     async def _data_get_actual(self, tag_id: str, start: int, finish: int,
-            count: int, value: Any = None):
+            count: int, value: Any = None, raw_data: List[tuple] = None):
+
+        if raw_data is not None:
+            return raw_data
 
         order = Order.CN_ASC
         if start is None:
             order = Order.CN_DESC
             count = (1, count)[bool(count)]
 
-        raw_data = await self._read_data(
+        raw_data = await self._read_tag_data(
             tag_id, start, finish, order, count, False, False, value
         )
 
@@ -1360,6 +2379,475 @@ class DataStoragesAppBase(app_svc.AppSvc, ABC):
 
         pass
 
+    async def _read_data_many(self, tag_ids: List[str], start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool,
+        value: Any = None) -> dict:
+        """Чтение данных нескольких тегов с одинаковыми параметрами.
+        Хранилища, которые умеют читать данные нескольких тегов одним
+        запросом, переопределяют этот метод; по умолчанию данные каждого
+        тега читаются методом :meth:`_read_data`\.
+
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]}
+        """
+        res = await asyncio.gather(*[
+            self._read_data(
+                tag_id, start, finish, order, count, one_before, one_after, value
+            ) for tag_id in tag_ids
+        ])
+        return dict(zip(tag_ids, res))
+
+    async def _read_rollup_data(self, tag_id: str, start: int, finish: int,
+        one_before: bool, one_after: bool, resolution: int) -> List[tuple] | None:
+        """Чтение данных тега по агрегатам с разрешением ``resolution``\:
+        вместо всех точек интервала агрегата возвращаются его первая и
+        последняя точки. ``start`` кратен разрешению.
+        Результат упорядочен по возрастанию метки времени и формируется
+        по тем же правилам, что и в :meth:`_read_data`.
+
+        Хранилища, не поддерживающие агрегаты, возвращают None, и данные
+        читаются методом :meth:`_read_data`.
+
+        Returns:
+            List[tuple] | None: данные [(y, x, q)] или None, если агрегаты
+            для тега не ведутся или не могут заменить исходные данные
+        """
+        return None
+
+    async def _read_grid_data_many(self, tag_ids: List[str], start: int,
+        finish: int, time_step: int) -> dict:
+        """Чтение данных тегов для интерполяции на временном ряде
+        ``start``\, ``start + time_step``\, ... (не позже ``finish``\).
+
+        Значение, интерполированное в момент времени, зависит только от
+        последней точки не позже этого момента и первой точки после него.
+        Поэтому вместо всех точек диапазона достаточно прочитать для каждой
+        метки ряда, а также для ``finish``\, эти две точки: объём
+        прочитанных данных пропорционален длине ряда, а не количеству точек
+        в диапазоне. Результат упорядочен по возрастанию метки времени;
+        точка "перед start" и точка "после finish" входят в него.
+
+        Хранилища, не поддерживающие такое чтение, возвращают пустой
+        словарь, и данные читаются методом :meth:`_read_data_many`.
+
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]} - только для тегов, данные
+            которых прочитаны
+        """
+        return {}
+
+    async def _drain_tags_data(self, tag_ids: List[str]) -> Tuple[dict, dict, set]:
+        """Извлечение из кэша тегов накопленных данных для записи в базу.
+
+        Данные тегов читаются из кэша одним запросом и группируются по
+        активным хранилищам. Данные, которые не удалось записать в
+        хранилище при предыдущих сбросах, добавляются в группу этого
+        хранилища перед новыми данными; в остальные хранилища тега они
+        повторно не записываются. Группа каждого хранилища записывается
+        в журнал хранилища (см. :class:`Spool`), и только после этого
+        прочитанные точки удаляются из кэша. Точки, добавленные в кэш
+        после чтения, остаются в кэше.
+
+        Извлечённые данные до окончания записи во все хранилища
+        учитываются при чтении (см. :meth:`_read_tag_data`), после записи
+        в каждое хранилище необходимо вызвать :meth:`_release_tags_data`.
+
+        Args:
+            tag_ids (List[str]): список id тегов
+
+        Returns:
+            Tuple[dict, dict, set]:
+                {"<ds_id>": {"<tag_id>": [<извлечённые данные тега>, ...]}} -
+                извлечённые данные, записываемые в каждое хранилище;
+                {"<ds_id>": {"<tag_id>": <кэш тега>}} - группы тегов
+                активных хранилищ, данные тега в группе - все записываемые
+                в хранилище данные;
+                {"<ds_id>"} - хранилища, группы которых записаны в журнал
+        """
+        for tag_id in tag_ids:
+            self._cache.get(f"{tag_id}.{self._config.svc_name}", "$")
+        res = await self._cache.exec()
+
+        tags = {}
+        ds_ids = []
+        for tag_id, tag_cache in zip(tag_ids, res):
+            if not tag_cache:
+                continue
+            tag_cache = tag_cache[0]
+            if not tag_cache["data"] and not any(
+                batch["failed"] for batch in self._flushing_data.get(tag_id, [])
+            ):
+                continue
+            tags[tag_id] = tag_cache
+            ds_ids += [ds_id for ds_id in tag_cache["dss"].keys() if ds_id not in ds_ids]
+
+        if not tags:
+            return {}, {}, set()
+
+        # активность хранилищ определяем одним запросом
+        for ds_id in ds_ids:
+            self._cache.get(f"{ds_id}.{self._config.svc_name}", "prsActive")
+        active = await self._cache.exec()
+        active_dss = set()
+        for ds_id, ds_active in zip(ds_ids, active):
+            if ds_active is None:
+                self._logger.error(
+                    f"{self._config.svc_name} :: Нет кэша для хранилища {ds_id}")
+            # если хранилище неактивно, данные в него не записываем
+            elif not ds_active:
+                self._logger.error(
+                    f"{self._config.svc_name} :: Хранилище {ds_id} неактивно.")
+            else:
+                active_dss.add(ds_id)
+
+        batches = {}
+        groups = {}
+        for tag_id, tag_cache in tags.items():
+            tag_batches = self._flushing_data.setdefault(tag_id, [])
+            dss = [ds_id for ds_id in tag_cache["dss"].keys() if ds_id in active_dss]
+
+            # {"<ds_id>": [<данные тега, записываемые в хранилище>, ...]}
+            ds_batches = {}
+            for batch in tag_batches:
+                for ds_id in list(batch["failed"]):
+                    batch["failed"].discard(ds_id)
+                    if ds_id in dss:
+                        ds_batches.setdefault(ds_id, []).append(batch)
+                        continue
+                    # хранилище неактивно или отвязано от тега
+                    batch["pending"].discard(ds_id)
+                    self._logger.warning(
+                        f"{self._config.svc_name} :: Данные тега {tag_id} "
+                        f"не будут записаны в хранилище {ds_id}."
+                    )
+            if tag_cache["data"]:
+                batch = {
+                    "data": tag_cache["data"],
+                    "dss": dss,
+                    "pending": set(dss),
+                    "failed": set()
+                }
+                tag_batches.append(batch)
+                for ds_id in dss:
+                    ds_batches.setdefault(ds_id, []).append(batch)
+
+            tag_batches[:] = [batch for batch in tag_batches if batch["pending"]]
+            if not tag_batches:
+                self._flushing_data.pop(tag_id)
+
+            for ds_id, items in ds_batches.items():
+                batches.setdefault(ds_id, {})[tag_id] = items
+                if len(items) == 1 and items[0]["data"] is tag_cache["data"]:
+                    groups.setdefault(ds_id, {})[tag_id] = tag_cache
+                else:
+                    groups.setdefault(ds_id, {})[tag_id] = {
+                        **tag_cache,
+                        "data": [point for batch in items for point in batch["data"]]
+                    }
+
+        spooled = set()
+        for ds_id, group in groups.items():
+            try:
+                spool = self._get_spool(ds_id)
+                if spool is None:
+                    continue
+                spool.append({
+                    "tags": {
+                        tag_id: {
+                            "prsValueTypeCode": tag_cache["prsValueTypeCode"],
+                            "prsUpdate": tag_cache["prsUpdate"],
+                            "dss": {ds_id: tag_cache["dss"][ds_id]},
+                            "data": tag_cache["data"]
+                        } for tag_id, tag_cache in group.items()
+                    }
+                })
+                spooled.add(ds_id)
+            except Exception as ex:
+                # данные группы будут записаны в базу без журнала
+                self._logger.error(f"{self._config.svc_name} :: Ошибка записи в журнал хранилища {ds_id}: {ex}")
+
+        for tag_id, tag_cache in tags.items():
+            if tag_cache["data"]:
+                self._cache.trim(
+                    f"{tag_id}.{self._config.svc_name}", "$.data",
+                    len(tag_cache["data"]), -1
+                )
+        await self._cache.exec()
+
+        return batches, groups, spooled
+
+    def _release_tags_data(self, ds_id: str, batches: dict, failed: List[str]) -> None:
+        """Учёт результата записи в хранилище данных, извлечённых из кэша
+        методом :meth:`_drain_tags_data`\.
+        Данные, записанные во все хранилища тега, больше не учитываются
+        при чтении. Данные, которые не удалось записать, остаются
+        в буфере повторной записи этого хранилища и будут записаны в него
+        при следующем сбросе кэша тега.
+
+        Args:
+            ds_id (str): id хранилища
+            batches (dict): {"<tag_id>": [<извлечённые данные тега>, ...]}
+            failed (List[str]): id тегов, данные которых не записаны
+        """
+        for tag_id, tag_batches in batches.items():
+            if tag_id in failed:
+                for batch in tag_batches:
+                    batch["failed"].add(ds_id)
+                self._mark_dirty_tag(
+                    tag_id, [ds_id], sum(len(batch["data"]) for batch in tag_batches)
+                )
+                continue
+            for batch in tag_batches:
+                batch["pending"].discard(ds_id)
+            self._written_seq[tag_id] = self._written_seq.get(tag_id, 0) + 1
+            rest = [
+                batch for batch in self._flushing_data.get(tag_id, [])
+                if batch["pending"]
+            ]
+            if rest:
+                self._flushing_data[tag_id] = rest
+            else:
+                self._flushing_data.pop(tag_id, None)
+
+        failed = [tag_id for tag_id in failed if tag_id in batches]
+        if failed:
+            self._logger.warning(f"{self._config.svc_name} :: Данные тегов {failed} не записаны в хранилище {ds_id} и будут записаны повторно.")
+
+    async def _read_tag_data(self, tag_id: str, start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool, value: Any = None,
+        resolution: int = None, time_step: int = None):
+        """Чтение данных тега из базы с учётом данных, ещё не записанных
+        в базу (см. :meth:`_read_tags_data`).
+        """
+        res = await self._read_tags_data(
+            [tag_id], start, finish, order, count, one_before, one_after,
+            value, resolution, time_step
+        )
+        return res[tag_id]
+
+    async def _read_tags_data(self, tag_ids: List[str], start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool, value: Any = None,
+        resolution: int = None, time_step: int = None) -> dict:
+        """Чтение данных тегов из базы с учётом данных, ещё не записанных
+        в базу: находящихся в кэше тегов и записываемых в данный момент.
+        Параметры аналогичны :meth:`_read_data`; если задано разрешение
+        ``resolution``\, данные читаются по агрегатам
+        (см. :meth:`_read_rollup_data`). Если задан шаг интерполяции
+        ``time_step``\, читаются только точки, окружающие метки временного
+        ряда (см. :meth:`_read_grid_data_many`). Данные остальных тегов
+        читаются одним обращением к базе (см. :meth:`_read_data_many`).
+
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]}
+        """
+
+        # по выборке без точки "после finish" известна последняя точка тега;
+        # запись в тег во время чтения отменяет её сохранение
+        fill_current = one_after and finish is not None and value is None \
+            and not resolution and not time_step \
+            and (count is None or order == Order.CN_DESC)
+        versions = {
+            tag_id: self._current_values.version(tag_id) for tag_id in tag_ids
+        } if fill_current else {}
+
+        cache_data = {}
+        update = {}
+        records = {}
+        rest = list(tag_ids)
+        for _ in range(self._READ_ATTEMPTS):
+            written = {tag_id: self._written_seq.get(tag_id, 0) for tag_id in rest}
+            # данные кэша читаем до чтения из базы, под блокировкой
+            # извлечения: каждая точка попадает либо в извлечённые данные,
+            # либо в кэш тега
+            async with self._drain_lock:
+                cache_data.update(self._unwritten_data(rest))
+                try:
+                    pipe = self._cache
+                    for tag_id in rest:
+                        pipe = pipe.get(f"{tag_id}.{self._config.svc_name}", "data", "prsUpdate")
+                    res = await pipe.exec()
+                    for tag_id, tag_cache in zip(rest, res):
+                        if tag_cache:
+                            cache_data[tag_id] += tag_cache["data"] or []
+                            update[tag_id] = tag_cache["prsUpdate"]
+                except Exception as ex:
+                    self._logger.error(f"{self._config.svc_name} :: Ошибка чтения кэша тегов {rest}: {ex}")
+
+            records.update(await self._read_db_data(
+                rest, start, finish, order, count, one_before, one_after, value,
+                resolution, time_step
+            ))
+
+            # если во время чтения данные тега были записаны в базу,
+            # неизвестно, попали ли они в выборку: тег читается повторно
+            rest = [
+                tag_id for tag_id in rest
+                if self._written_seq.get(tag_id, 0) != written[tag_id]
+            ]
+            if not rest:
+                break
+
+        result = {}
+        for tag_id in tag_ids:
+            tag_records = records.get(tag_id) or []
+            if not cache_data[tag_id]:
+                result[tag_id] = tag_records
+                continue
+            result[tag_id] = self._merge_cache_data(
+                tag_records, cache_data[tag_id], start, finish, order, count,
+                one_before, one_after, value, update.get(tag_id, False)
+            )
+
+        for tag_id, version in versions.items():
+            tag_data = result[tag_id]
+            if tag_data and tag_data[-1][1] <= finish:
+                self._current_values.put(tag_id, tag_data[-1], version)
+
+        return result
+
+    async def _read_db_data(self, tag_ids: List[str], start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool, value: Any,
+        resolution: int, time_step: int) -> dict:
+        """Чтение данных тегов из базы без учёта кэша
+        (см. :meth:`_read_tags_data`).
+
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]}
+        """
+        records = {}
+        if resolution:
+            rollups = await asyncio.gather(*[
+                self._read_rollup_data(
+                    tag_id, start, finish, one_before, one_after, resolution
+                ) for tag_id in tag_ids
+            ])
+            records = {
+                tag_id: data for tag_id, data in zip(tag_ids, rollups)
+                if data is not None
+            }
+        rest = [tag_id for tag_id in tag_ids if tag_id not in records]
+        if rest and time_step and start is not None and finish is not None:
+            records.update(await self._read_grid_data_many(
+                rest, start, finish, time_step
+            ))
+            rest = [tag_id for tag_id in rest if tag_id not in records]
+        if rest:
+            records.update(await self._read_data_many(
+                rest, start, finish, order, count, one_before, one_after, value
+            ))
+        return records
+
+    def _unwritten_data(self, tag_ids: List[str]) -> dict:
+        """Извлечённые из кэша данные тегов, которых ещё нет в хранилище,
+        из которого читаются данные тега (первое активное хранилище тега).
+        Данные, уже записанные в это хранилище, будут прочитаны из базы.
+
+        Args:
+            tag_ids (List[str]): список id тегов
+
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]}
+        """
+        res = {}
+        for tag_id in tag_ids:
+            res[tag_id] = []
+            for batch in self._flushing_data.get(tag_id, []):
+                if batch["dss"] and batch["dss"][0] in batch["pending"]:
+                    res[tag_id] += batch["data"]
+        return res
+
+    def _merge_cache_data(self, records: List[tuple], cache_data: List[tuple],
+        start: int, finish: int, order: int, count: int, one_before: bool,
+        one_after: bool, value: Any, update: bool) -> List[tuple]:
+        """Слияние данных, прочитанных из базы, с данными из кэша.
+        Результат формируется по тем же правилам, что и выборка из базы
+        в :meth:`_read_data`: точка перед ``start``\, точки внутри периода
+        (с ограничением ``count`` с нужной стороны), точка после ``finish``\.
+        Для тегов с ``prsUpdate`` = true точка из кэша заменяет точку базы
+        с той же меткой времени. Данные кэша не пересекаются с данными
+        базы (см. :meth:`_unwritten_data`), поэтому совпадающие с точками
+        базы точки кэша - повторные записи и не отбрасываются.
+
+        Returns:
+            List[tuple]: данные, отсортированные по возрастанию метки времени
+        """
+        buffered = [
+            (y, x, q) for y, x, q in cache_data if self._match_value(y, value)
+        ]
+
+        if not buffered:
+            return records
+
+        # сортировка устойчивая: при совпадении меток времени данные кэша
+        # оказываются после данных из базы, как записанные позже
+        data = sorted(list(records) + buffered, key=lambda item: item[1])
+        if update:
+            unique = {}
+            for item in data:
+                unique[item[1]] = item
+            data = list(unique.values())
+
+        before = []
+        inside = []
+        after = []
+        for item in data:
+            if start is not None and item[1] < start:
+                before.append(item)
+            elif finish is not None and item[1] > finish:
+                after.append(item)
+            else:
+                inside.append(item)
+
+        if isinstance(count, int):
+            if order == Order.CN_DESC:
+                inside = inside[-count:] if count else []
+            else:
+                inside = inside[:count]
+
+        result = []
+        if one_before and start and before:
+            result.append(before[-1])
+        result += inside
+        if one_after and finish and after:
+            # из нескольких точек с одной меткой времени берётся
+            # записанная последней
+            x_after = after[0][1]
+            result.append([item for item in after if item[1] == x_after][-1])
+
+        return result
+
+    def _match_value(self, y: Any, value: Any) -> bool:
+        """Проверка значения на соответствие фильтру ``value``\.
+        Логика аналогична SQL-фильтру хранилища PostgreSQL:
+        для json-значений проверяется вхождение (``@>``\).
+        """
+        def contains(a: Any, b: Any) -> bool:
+            if isinstance(b, dict):
+                return isinstance(a, dict) and \
+                    all(k in a and contains(a[k], v) for k, v in b.items())
+            if isinstance(b, list):
+                return isinstance(a, list) and \
+                    all(any(contains(i, j) for i in a) for j in b)
+            return a == b
+
+        if value is None:
+            return True
+        if isinstance(value, dict):
+            return contains(y, value)
+        if not isinstance(value, (list, tuple)):
+            return y == value
+
+        for val in value:
+            if val is None:
+                if y is None:
+                    return True
+            elif isinstance(val, dict):
+                if contains(y, val):
+                    return True
+            elif y == val:
+                return True
+        return False
+
     def _limit_data(self,
                     tag_data: List[dict],
                     count: int,
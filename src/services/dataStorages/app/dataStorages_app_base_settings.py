@@ -8,8 +8,64 @@ class DataStoragesAppBaseSettings(AppSvcSettings):
     # код типа хранилища: 0 - Postgresql, 1 - victoriametrics
     datastorage_type: int = 0
     
-    # периодичность накопления кэша данных, секунды
+    # максимальное время нахождения данных тега в кэше, секунды:
+    # по истечении этого времени данные тега сбрасываются в базу
     cache_data_period: int = 30
+    # количество точек в кэше одного тега, при достижении которого
+    # данные тега сбрасываются в базу
+    cache_data_tag_size: int = 1000
+    # суммарное количество точек в кэше тегов одного хранилища,
+    # при достижении которого сбрасываются все теги хранилища
+    cache_data_ds_size: int = 50000
+    # периодичность проверки условий сброса кэша, секунды
+    cache_data_check_period: float = 1
+    # количество хранилищ, в которые одновременно сбрасывается кэш
+    cache_data_workers: int = 4
+
+    # каталог журналов (spool) данных, извлечённых из кэша, но ещё не
+    # записанных в базу; если база недоступна, данные накапливаются
+    # в журнале и записываются в базу после восстановления связи;
+    # пустая строка - журналы не ведутся
+    spool_dir: str = "spool"
+    # размер сегмента журнала, байты
+    spool_segment_size: int = 67108864
+    # сбрасывать на диск каждую запись журнала
+    spool_sync: bool = True
+    # периодичность повторных попыток записи данных из журналов в базу, секунды
+    spool_retry_period: float = 5
+
+    # максимальное количество соединений в пуле каждого хранилища
+    db_pool_size: int = 10
+    # количество одновременных чтений данных тегов при обработке
+    # запроса данных; 0 - по размеру пула соединений (db_pool_size)
+    read_concurrency: int = 0
+
+    # разрешения агрегатов (rollup) данных тегов, секунды;
+    # агрегаты обновляются при каждой записи данных в базу и используются
+    # для чтения с параметром timeStep, кратным разрешению;
+    # пустой список - агрегаты не ведутся
+    rollup_resolutions: List[int] = [60, 3600, 86400]
+
+    # максимальное количество точек тега в одной части ответа
+    # при чтении данных с ключом stream
+    stream_chunk_size: int = 10000
+
+    # максимальное количество интервалов в запросе агрегатов данных
+    # тега (data_aggregate); 0 - без ограничения
+    aggregate_max_intervals: int = 100000
+
+    # максимальное суммарное количество точек в кэше результатов чтения
+    # данных тегов за периоды в прошлом; 0 - кэш не используется;
+    # кэш сбрасывается только при записи данных через этот же экземпляр
+    # сервиса, поэтому включается, только если данные тегов хранилища
+    # записывает и читает один экземпляр сервиса
+    result_cache_points: int = 0
+    # вести таблицу последних значений тегов для чтения значений на
+    # текущий момент без обращения к базе; таблица обновляется только
+    # при записи данных через этот же экземпляр сервиса, поэтому
+    # включается, только если данные тегов хранилища записывает и читает
+    # один экземпляр сервиса
+    current_values: bool = False
 
     hierarchy: dict = {
         #: имя узла для хранения сущностей в иерархии
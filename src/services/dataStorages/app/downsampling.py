@@ -0,0 +1,118 @@
+"""Модуль содержит функции прореживания данных тега до заданного
+количества точек с сохранением формы графика.
+
+Используется при превышении количества точек ``maxCount`` в запросе
+данных, если задан метод прореживания (ключ ``downsample``\):
+
+* ``lttb`` - Largest-Triangle-Three-Buckets: из каждого интервала
+  выбирается точка, образующая наибольший треугольник с точкой,
+  выбранной в предыдущем интервале, и средней точкой следующего;
+* ``minmax`` - из каждого интервала выбираются точки с минимальным
+  и максимальным значениями.
+
+Первая и последняя точки сохраняются всегда. Для нечисловых тегов
+точки выбираются равномерно.
+"""
+import numbers
+from typing import Any, List
+
+import numpy as np
+
+CN_DOWNSAMPLE_LTTB = "lttb"
+CN_DOWNSAMPLE_MINMAX = "minmax"
+
+def _values(data: List[tuple]) -> np.ndarray | None:
+    """Значения тега в виде массива float (None - nan) или None,
+    если значения нечисловые.
+    """
+    values = []
+    for y, _, _ in data:
+        if y is None:
+            values.append(np.nan)
+        elif isinstance(y, bool) or not isinstance(y, numbers.Number):
+            return None
+        else:
+            values.append(y)
+    return np.array(values, dtype=np.float64)
+
+def _uniform(size: int, threshold: int) -> np.ndarray:
+    return np.unique(np.linspace(0, size - 1, threshold).round().astype(np.int64))
+
+def _lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    size = len(x)
+    every = (size - 2) / (threshold - 2)
+    nan = np.isnan(y)
+    res = np.empty(threshold, dtype=np.int64)
+    res[0] = 0
+    res[-1] = size - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, size)
+
+        # вершина треугольника в следующем интервале - его средняя точка
+        avg_x = x[end:next_end].mean()
+        next_y = y[end:next_end][~nan[end:next_end]]
+        avg_y = next_y.mean() if len(next_y) else y[a]
+
+        # если в предыдущем интервале выбран разрыв (None), площадь
+        # считается относительно средней точки следующего интервала
+        ay = avg_y if nan[a] else y[a]
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - ay) -
+            (x[a] - x[start:end]) * (avg_y - ay)
+        )
+        # разрыв в интервале сохраняется
+        area[nan[start:end]] = np.inf
+        if np.isnan(avg_y):
+            area[~nan[start:end]] = 0
+        a = start + int(np.argmax(area))
+        res[i + 1] = a
+    return res
+
+def _minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    size = len(y)
+    buckets = (threshold - 2) // 2
+    bounds = np.linspace(1, size - 1, buckets + 1).astype(np.int64)
+    sizes = np.diff(bounds)
+    bucket_ids = np.repeat(np.arange(buckets), sizes)
+    inner = y[1:size - 1]
+    nan = np.isnan(inner)
+
+    # первая точка каждого интервала после сортировки по (интервал, значение)
+    # - минимум (максимум) интервала; None считается больше (меньше) всех
+    firsts = bounds[:-1] - 1
+    by_min = np.lexsort((np.where(nan, np.inf, inner), bucket_ids))
+    by_max = np.lexsort((-np.where(nan, -np.inf, inner), bucket_ids))
+
+    return np.unique(np.concatenate((
+        [0], by_min[firsts] + 1, by_max[firsts] + 1, [size - 1]
+    )))
+
+def downsample(data: List[tuple], threshold: int, method: str) -> List[tuple]:
+    """Прореживание данных тега до ``threshold`` точек.
+
+    Args:
+        data (List[tuple]): точки ``(y, x, q)``, упорядоченные по x
+        threshold (int): максимальное количество точек результата, не меньше 3
+        method (str): метод прореживания: "lttb" или "minmax"
+
+    Returns:
+        List[tuple]: выбранные точки в исходном порядке
+    """
+    size = len(data)
+    if size <= threshold:
+        return data
+
+    y = _values(data)
+    if y is None:
+        indexes = _uniform(size, threshold)
+    elif method == CN_DOWNSAMPLE_MINMAX and threshold >= 4:
+        indexes = _minmax(y, threshold)
+    else:
+        x0 = data[0][1]
+        x = np.fromiter((r[1] - x0 for r in data), dtype=np.float64, count=size)
+        indexes = _lttb(x, y, threshold)
+
+    return [data[i] for i in indexes.tolist()]
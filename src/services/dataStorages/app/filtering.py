@@ -0,0 +1,148 @@
+"""Модуль содержит функцию фильтрации данных тега по значениям
+(ключ ``value`` запроса данных).
+
+Для числовых нешаговых тегов точки с искомыми значениями и моменты
+пересечения искомых значений отрезками между соседними точками
+находятся над массивами numpy сразу по всей выборке. Для остальных
+тегов точки отбираются проверкой вхождения значения в множество
+искомых значений.
+Используется всеми хранилищами данных.
+"""
+import json
+import numbers
+from typing import Any, Hashable, List
+
+import numpy as np
+
+from src.common.consts import CNTagValueTypes as TVT
+
+def _key(val: Any) -> Hashable:
+    """Ключ значения в множестве искомых значений: словари и списки
+    (значения json-тегов) заменяются их каноническим json-представлением.
+    """
+    if isinstance(val, (dict, list)):
+        return ("json", json.dumps(val, sort_keys=True, ensure_ascii=False))
+    return val
+
+def _filter_members(tag_data: List[tuple], value: List[Any],
+                    json_tag: bool, json_values: bool) -> List[tuple]:
+    keys = {_key(val) for val in value}
+    if not json_tag:
+        # значения тега хэшируемые, ключи не требуются
+        return [item for item in tag_data if item[0] in keys]
+
+    # значения json-тегов, переданные строками, разбираются один раз
+    # для каждой строки
+    parsed = {}
+    res = []
+    for item in tag_data:
+        y = item[0]
+        if json_values and isinstance(y, str):
+            if y not in parsed:
+                parsed[y] = _key(json.loads(y))
+            key = parsed[y]
+        else:
+            key = _key(y)
+        if key in keys:
+            res.append(item)
+    return res
+
+def filter_data(tag_data: List[tuple], value: List[Any], tag_type_code: int,
+                tag_step: bool, json_values: bool = False) -> List[tuple]:
+    """Фильтрация данных тега по значениям.
+
+    Для числовых нешаговых тегов результат - точки с искомыми значениями
+    и точки ``(значение, x, None)`` в моменты, когда линейно
+    интерполированное значение тега пересекает искомое значение;
+    отрезки между точками с одной меткой времени не рассматриваются.
+    Для целочисленных тегов дробные искомые значения не пересекаются.
+    Для остальных тегов результат - точки с искомыми значениями.
+
+    Args:
+        tag_data (List[tuple]): точки ``(y, x, q)``, упорядоченные по x
+        value (List[Any]): искомые значения
+        tag_type_code (int): код типа значений тега
+        tag_step (bool): ступенчатый тег (prsStep)
+        json_values (bool): значения json-тега в выборке - строки
+
+    Returns:
+        List[tuple]: отобранные точки, упорядоченные по x
+    """
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    if not tag_data:
+        return []
+    if tag_step or tag_type_code not in [TVT.CN_INT, TVT.CN_DOUBLE]:
+        return _filter_members(tag_data, value, tag_type_code == TVT.CN_JSON, json_values)
+
+    size = len(tag_data)
+    xs = np.fromiter((r[1] for r in tag_data), dtype=np.int64, count=size)
+    ys = np.fromiter(
+        (np.nan if r[0] is None else r[0] for r in tag_data),
+        dtype=np.float64, count=size
+    )
+    nan = np.isnan(ys)
+
+    # точки с искомыми значениями
+    wanted = [val for val in value if isinstance(val, numbers.Number)]
+    match = np.isin(ys, np.array(wanted, dtype=np.float64))
+    if None in value:
+        match |= nan
+
+    # отрезки между соседними точками с разными метками времени; если
+    # значение первой точки искомое, пересечения отрезка не ищутся
+    y1, y2 = ys[:-1], ys[1:]
+    x1, x2 = xs[:-1], xs[1:]
+    pairs = x1 != x2
+    pair_match = match[:-1] & pairs
+    cross = pairs & ~match[:-1] & ~nan[:-1] & ~nan[1:]
+
+    # искомые значения, пересекаемые отрезками: значения строго между
+    # концами отрезка, по возрастанию
+    targets = sorted({
+        val for val in wanted
+        if not (tag_type_code == TVT.CN_INT and isinstance(val, float))
+    })
+    vals = np.array(targets, dtype=np.float64)
+    lo = np.minimum(y1, y2)
+    hi = np.maximum(y1, y2)
+    first = np.searchsorted(vals, lo, side="right")
+    last = np.searchsorted(vals, hi, side="left")
+    counts = np.where(cross, np.maximum(last - first, 0), 0)
+
+    pair_idx = np.repeat(np.arange(size - 1), counts)
+    offset = np.arange(len(pair_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    # на убывающем отрезке значения пересекаются в обратном порядке
+    val_idx = np.where(
+        y2[pair_idx] < y1[pair_idx],
+        last[pair_idx] - 1 - offset,
+        first[pair_idx] + offset
+    )
+    cx = np.rint(
+        x1[pair_idx] + (vals[val_idx] - y1[pair_idx]) *
+        (x2[pair_idx] - x1[pair_idx]) / (y2[pair_idx] - y1[pair_idx])
+    ).astype(np.int64)
+
+    # точки и пересечения упорядочиваются по номеру отрезка: сначала
+    # точка начала отрезка, затем пересечения
+    matched = np.flatnonzero(pair_match)
+    order = np.lexsort((
+        np.concatenate((np.zeros(len(matched), dtype=np.int64), np.arange(1, len(pair_idx) + 1))),
+        np.concatenate((matched, pair_idx))
+    ))
+
+    res = []
+    n_matched = len(matched)
+    matched_list = matched.tolist()
+    val_list = val_idx.tolist()
+    cx_list = cx.tolist()
+    for k in order.tolist():
+        if k < n_matched:
+            res.append(tag_data[matched_list[k]])
+        else:
+            k -= n_matched
+            res.append((targets[val_list[k]], cx_list[k], None))
+
+    if match[-1]:
+        res.append(tag_data[-1])
+    return res
@@ -0,0 +1,39 @@
+"""Модуль содержит функции преобразования данных тегов в форматы
+передачи в ответе на запрос данных.
+"""
+from typing import List
+
+def to_columns(data: List[tuple]) -> dict:
+    """Преобразование точек ``[(y, x, q)]`` в столбцы
+    ``{"y": [...], "x": [...], "q": [...]}``\.
+
+    Args:
+        data (List[tuple]): точки тега
+
+    Returns:
+        dict: столбцы значений, меток времени и кодов качества
+    """
+    if not data:
+        return {"y": [], "x": [], "q": []}
+    y, x, q = zip(*data)
+    return {"y": list(y), "x": list(x), "q": list(q)}
+
+def to_grid(data: List[tuple], time_row: List[int]) -> dict:
+    """Преобразование точек ``[(y, x, q)]`` в столбцы значений и кодов
+    качества ``{"y": [...], "q": [...]}`` на ряде меток времени
+    ``time_row``; для меток без точки значение и код качества - None.
+
+    Args:
+        data (List[tuple]): точки тега с метками из ``time_row``
+        time_row (List[int]): общий ряд меток времени
+
+    Returns:
+        dict: столбцы значений и кодов качества длиной ``len(time_row)``
+    """
+    points = {x: (y, q) for y, x, q in data}
+    empty = (None, None)
+    values = [points.get(x, empty) for x in time_row]
+    if not values:
+        return {"y": [], "q": []}
+    y, q = zip(*values)
+    return {"y": list(y), "q": list(q)}
@@ -0,0 +1,165 @@
+"""Модуль содержит функцию расчёта значений тега на ряде меток времени
+по действительным значениям из базы.
+
+Расчёт выполняется над непрерывными массивами numpy (``np.interp``,
+``np.searchsorted``) без построения промежуточных датафреймов.
+Используется всеми хранилищами данных.
+"""
+import numbers
+from typing import Any, List, Tuple
+
+import numpy as np
+
+def _is_numeric(values: List[Any]) -> bool:
+    """Все значения, кроме None, - числа (bool числом не считается).
+    """
+    has_value = False
+    for val in values:
+        if val is None:
+            continue
+        if isinstance(val, bool) or not isinstance(val, numbers.Number):
+            return False
+        has_value = True
+    return has_value
+
+def interpolate(raw_data: List[tuple],
+                time_row: List[int],
+                step: bool = False) -> List[Tuple[Any, int, Any]]:
+    """Получение значений для ряда ``time_row`` по действительным значениям
+    из базы ``raw_data``.
+
+    Данные разбиваются на периоды по значениям None. Внутри периода
+    значения числовых тегов интерполируются линейно по времени, для
+    нечисловых и ступенчатых тегов берётся предыдущее значение;
+    после последней точки периода сохраняется её значение, до первого
+    не-None значения периода результат - None. Качество берётся
+    у последней точки с не-None качеством.
+    Из нескольких точек с одной меткой времени используется последняя.
+
+    Args:
+        raw_data (List[tuple]): точки ``(y, x, q)``, упорядоченные по x
+        time_row (List[int]): ряд меток времени, упорядоченный по возрастанию
+        step (bool): ступенчатый тег (prsStep)
+
+    Returns:
+        List[Tuple[Any, int, Any]]: точки ``(y, x, q)`` ряда ``time_row``,
+        упорядоченные по x
+    """
+    size = len(raw_data)
+    if not size or not time_row:
+        return []
+
+    xs = np.fromiter((r[1] for r in raw_data), dtype=np.int64, count=size)
+    ys = [r[0] for r in raw_data]
+    qs = [r[2] for r in raw_data]
+    row = np.asarray(time_row, dtype=np.int64)
+
+    # Разбиение на периоды по значению None: точка с None входит и в конец
+    # предыдущего периода, и в начало следующего
+    none_indexes = [idx for idx, val in enumerate(ys) if val is None]
+    bounds = list(zip([0] + none_indexes, none_indexes + [size - 1]))
+
+    data = []
+    for num, (i, j) in enumerate(bounds):
+        if j == i:
+            continue
+
+        seg_x = xs[i:j + 1]
+        min_ts = seg_x.min()
+        max_ts = seg_x.max()
+
+        # устойчивая сортировка: из точек с одинаковой меткой
+        # последней остаётся последняя записанная
+        order = np.argsort(seg_x, kind="stable")
+        # последняя точка непоследнего периода (None) относится
+        # к следующему периоду
+        if num < len(bounds) - 1:
+            order = order[:-1]
+        px = seg_x[order]
+        keep = np.empty(len(px), dtype=bool)
+        keep[:-1] = px[1:] != px[:-1]
+        keep[-1:] = True
+        order = order[keep] + i
+        px = px[keep]
+
+        # метки ряда из [min_ts, max_ts), а также max_ts, если точка
+        # с такой меткой осталась в периоде
+        lo = np.searchsorted(row, min_ts, side="left")
+        hi = np.searchsorted(row, max_ts, side="right" if px[-1] == max_ts else "left")
+        if lo >= hi:
+            continue
+        targets = row[lo:hi]
+
+        # индекс последней точки с меткой не больше требуемой
+        prev = np.searchsorted(px, targets, side="right") - 1
+        prev_list = prev.tolist()
+
+        py = [ys[k] for k in order.tolist()]
+        if not step and _is_numeric(py):
+            valid = np.fromiter(
+                (y is not None for y in py), dtype=bool, count=len(py)
+            )
+            first = int(np.argmax(valid))
+            vx = px[valid]
+            vy = np.fromiter(
+                (y for y in py if y is not None), dtype=np.float64, count=len(vx)
+            )
+            res_y = np.interp(targets, vx, vy).tolist()
+            first_x = int(px[first])
+            res_y = [
+                None if x < first_x else y
+                for x, y in zip(targets.tolist(), res_y)
+            ]
+        else:
+            res_y = [py[k] for k in prev_list]
+
+        # протягивание последнего не-None качества
+        pq = [qs[k] for k in order.tolist()]
+        q_idx = np.maximum.accumulate(np.fromiter(
+            (k if q is not None else -1 for k, q in enumerate(pq)),
+            dtype=np.int64, count=len(pq)
+        ))[prev].tolist()
+        res_q = [pq[k] if k >= 0 else None for k in q_idx]
+
+        data += list(zip(res_y, targets.tolist(), res_q))
+
+    return data
+
+def values_at(tags_data: List[List[tuple]], x: int, steps: List[bool],
+              rounded: List[bool]) -> List[Tuple[Any, int, Any]]:
+    """Значения нескольких тегов на метку времени ``x`` за один проход
+    по их данным.
+
+    Данные каждого тега - последняя точка не позже ``x`` и первая точка
+    после ``x`` (любая из них может отсутствовать). Значение - значение
+    точки не позже ``x``; для нешаговых тегов с числовыми значениями
+    обеих точек оно интерполируется линейно. Если точки не позже ``x``
+    нет, значение и качество - None.
+
+    Args:
+        tags_data (List[List[tuple]]): данные тегов ``[(y, x, q)]``\,
+            упорядоченные по x
+        x (int): метка времени
+        steps (List[bool]): признаки ступенчатых тегов (prsStep)
+        rounded (List[bool]): признаки тегов с целыми значениями
+
+    Returns:
+        List[Tuple[Any, int, Any]]: точка ``(y, x, q)`` каждого тега
+    """
+    res = []
+    for data, step, flag in zip(tags_data, steps, rounded):
+        if not data or data[0][1] > x:
+            res.append((None, x, None))
+            continue
+
+        y0, x0, q0 = data[0]
+        if not step and len(data) > 1:
+            y1, x1, _ = data[-1]
+            if x1 != x0 and y0 != y1 and \
+                isinstance(y0, numbers.Number) and isinstance(y1, numbers.Number):
+                y0 = (x - x0) / (x1 - x0) * (y1 - y0) + y0
+                if flag:
+                    y0 = round(y0)
+        res.append((y0, x, q0))
+
+    return res
@@ -22,6 +22,58 @@ class DataStoragesAppPostgreSQLSettings(DataStoragesAppBaseSettings):
         "parent_classes": ""
     }
 
-    # периодичность накопления кэша данных, секунды
+    # максимальное время нахождения данных тега в кэше, секунды
     cache_data_period: int = 100
 
+    # при старте сервиса перевести таблицы тегов с prsUpdate = true,
+    # созданные без уникального индекса по метке времени, на уникальный индекс
+    migrate_update_stores: bool = False
+
+    # схема хранения данных новых тегов:
+    # "table" - отдельная таблица для каждого тега,
+    # "narrow" - общие таблицы (tag_id, x, y, q) для каждого типа значений,
+    # секционированные по времени и по хэшу id тега
+    # схема хранения тега записывается в его prsStore, поэтому теги
+    # с разными схемами могут находиться в одном хранилище
+    tag_store_layout: str = "table"
+    # секционировать по времени таблицы новых тегов при схеме "table";
+    # каждая секция - отдельная таблица базы, поэтому при большом
+    # количестве тегов секционирование увеличивает каталог и время
+    # планирования запросов; общие таблицы (схема "narrow") секционируются
+    # всегда
+    partition_tag_tables: bool = False
+    # интервал секционирования таблиц по времени, секунды
+    partition_interval: int = 604800
+    # количество временных секций, создаваемых заранее
+    partition_ahead: int = 2
+    # периодичность создания секций заранее и удаления секций
+    # с данными старше срока хранения, секунды;
+    # срок хранения (ключ "retention", секунды) задаётся в prsJsonConfigString
+    # хранилища или в prsStore тега
+    partition_check_period: int = 3600
+    # количество секций по хэшу id тега в каждой временной секции общих таблиц
+    narrow_hash_partitions: int = 8
+
+    # при старте сервиса построить по уже записанным данным агрегаты
+    # с разрешениями из rollup_resolutions для тегов, у которых их нет
+    # (теги, привязанные к хранилищу до включения агрегатов)
+    rollup_backfill: bool = False
+
+    # чтение данных для интерполяции с шагом timeStep: если длина временного
+    # ряда не больше этого значения, для каждой метки ряда из базы читаются
+    # только окружающие её точки (generate_series + LATERAL), иначе -
+    # все точки диапазона; 0 - всегда читать все точки
+    resample_max_points: int = 10000
+
+    # максимальное количество таблиц в одном запросе чтения данных
+    # нескольких тегов: теги одного хранилища читаются одним запросом,
+    # если их таблиц не больше этого значения, иначе - несколькими
+    # запросами по упорядоченным по имени таблицам; текст каждого запроса
+    # зависит только от его таблиц, поэтому повторное чтение тех же тегов
+    # использует кэш подготовленных операторов; 0 - без ограничения
+    read_chunk_tables: int = 32
+
+    # размер кэша подготовленных операторов каждого соединения пула;
+    # запросы чтения данных параметризованы, поэтому их текст зависит
+    # только от таблиц и вида запроса; 0 - кэш не используется
+    statement_cache_size: int = 1024
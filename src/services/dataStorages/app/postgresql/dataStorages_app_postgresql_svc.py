@@ -1,10 +1,13 @@
 import sys
+import re
 import json
+import asyncio
 import numbers
 import copy
 from typing import Any, List, Tuple
 
 import redis.asyncio as redis
+from fastapi import APIRouter
 
 try:
     import uvicorn
@@ -24,6 +27,59 @@ from src.common.consts import (
 import asyncpg as apg
 from asyncpg.exceptions import PostgresError
 
+# для кодирования значений jsonb используется orjson, если он установлен
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    _json_loads = orjson.loads
+    _ORJSON = True
+except ModuleNotFoundError as _:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode()
+
+    _json_loads = json.loads
+    _ORJSON = False
+
+# версия бинарного формата jsonb
+_JSONB_VERSION = b'\x01'
+
+def _jsonb_encoder(obj: Any) -> bytes:
+    return _JSONB_VERSION + _json_dumps(obj)
+
+def _jsonb_decoder(data: bytes) -> Any:
+    return _json_loads(data[1:])
+
+# схемы хранения данных тегов
+# отдельная таблица для каждого тега
+CN_LAYOUT_TABLE = "table"
+# общие таблицы (tag_id, x, y, q) для каждого типа значений
+CN_LAYOUT_NARROW = "narrow"
+
+# префикс имён общих таблиц
+CN_NARROW_PREFIX = "prs_data_"
+# префикс имён таблиц агрегатов
+CN_ROLLUP_PREFIX = "prs_rollup_"
+
+# суффиксы имён общих таблиц и таблиц агрегатов по типам значений
+_TYPE_SUFFIXES = {
+    TVT.CN_INT: "int",
+    TVT.CN_DOUBLE: "double",
+    TVT.CN_STR: "str",
+    TVT.CN_JSON: "json"
+}
+
+# столбцы таблиц агрегатов
+_ROLLUP_COLUMNS = (
+    'tag_id', 'x', 'cnt', 'nulls', 'min_y', 'max_y', 'sum_y',
+    'first_x', 'first_y', 'first_q', 'last_x', 'last_y', 'last_q'
+)
+
+# границы временной секции в выражении pg_get_expr(relpartbound)
+RE_PARTITION_BOUND = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
 class DataStoragesAppPostgreSQL(DataStoragesAppBase):
 
     def __init__(
@@ -32,6 +88,13 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
 
         super().__init__(settings, *args, **kwargs)
 
+        # созданные секции таблиц:
+        # {(ds_id, table): {<начало секции>, ...}}
+        self._partitions = {}
+        self._partition_task = None
+        # теги, для которых строятся агрегаты по уже записанным данным
+        self._rollup_backfill = set()
+
     async def _create_store_name_for_new_tag(self,
             ds_id: str, tag_id: str) -> dict | None:
         """Метод, создающий имя для нового места хранения данных тега.
@@ -43,20 +106,32 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
         Returns:
             dict: json с описанием хранилища тега
         """
+        if self._config.tag_store_layout == CN_LAYOUT_NARROW:
+            # имя общей таблицы зависит от типа значений тега и
+            # определяется при создании хранилища
+            return {
+                "layout": CN_LAYOUT_NARROW
+            }
+
         return {
-            "table": f"t_{tag_id}"
+            "layout": CN_LAYOUT_TABLE,
+            "table": f"t_{tag_id}",
+            "partitioned": self._config.partition_tag_tables
         }
 
-    async def _check_store_name_for_new_tag(self, store: dict) -> bool:
+    async def _check_store_name_for_new_tag(self, ds_id: str, store: dict) -> bool:
         """Метод проверяет на корректность имя хранилища для нового тега,
         переданное клиентом.
 
         Args:
+            ds_id (str): id хранилища
             store (dict): новое хранилище для тега
 
         Returns:
             bool: флаг корректности нового имени
         """
+        if store.get("layout") == CN_LAYOUT_NARROW:
+            return True
         return bool(store.get("table"))
 
     async def _drop_store_for_tag(self, tag_id: str, ds_id: str) -> None:
@@ -71,11 +146,38 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
         tag_data = await self._hierarchy.search(payload=payload)
         if tag_data:
             async with self._connection_pools[ds_id].acquire() as conn:
-                tbl_name = json.loads(tag_data[0][2]["prsStore"][0])["table"]
+                store = json.loads(tag_data[0][2]["prsStore"][0])
+                await self._drop_tag_data(conn, ds_id, tag_id, store)
+                self._logger.info(f"{self._config.svc_name} :: Хранилище тега '{tag_id}' в '{ds_id}' удалено.")
+
+    async def _drop_tag_data(
+            self, conn: apg.Connection, ds_id: str, tag_id: str, store: dict) -> None:
+        """Удаление данных тега: таблицы тега либо строк тега в общей таблице.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            ds_id (str): id хранилища
+            tag_id (str): id тега
+            store (dict): prsStore тега
+        """
+        self._result_cache.invalidate(tag_id)
+        self._current_values.invalidate(tag_id)
+        for rollup_tbl in (store.get("rollups") or {}).values():
+            await conn.execute(
+                f'delete from "{rollup_tbl}" where tag_id = $1', tag_id
+            )
+
+        if store.get("layout") == CN_LAYOUT_NARROW:
+            if store.get("table"):
                 await conn.execute(
-                    f'drop table if exists "{tbl_name}"'
+                    f'delete from "{store["table"]}" where tag_id = $1', tag_id
                 )
-                self._logger.info(f"{self._config.svc_name} :: Хранилище тега '{tag_id}' в '{ds_id}' удалено.")
+            return
+
+        await conn.execute(
+            f'drop table if exists "{store["table"]}"'
+        )
+        self._partitions.pop((ds_id, store["table"]), None)
 
     async def _drop_store_for_alert(self, alert_id: str, ds_id: str) -> None:
         payload = {
@@ -98,14 +200,9 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
     async def _create_store_for_tag(self, tag_id: str, ds_id: str, store: dict) -> None:
         try:
             async with self._connection_pools[ds_id].acquire() as conn:
-                tbl_name = store["table"]
-                await conn.execute(
-                    f'drop table if exists "{tbl_name}"'
-                )
-
                 payload = {
                     "id": tag_id,
-                    "attributes": ["prsValueTypeCode"]
+                    "attributes": ["prsValueTypeCode", "prsUpdate"]
                 }
                 res = await self._hierarchy.search(payload=payload)
                 if not res:
@@ -113,29 +210,58 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
                     return
 
                 value_type = int(res[0][2]["prsValueTypeCode"][0])
+                update = res[0][2]["prsUpdate"][0] == "TRUE"
 
-                match value_type:
-                    case TVT.CN_INT:
-                        s_type = "bigint"
-                    case TVT.CN_DOUBLE:
-                        s_type = "double precision"
-                    case TVT.CN_STR:
-                        s_type = "text"
-                    case TVT.CN_JSON:
-                        s_type = "jsonb"
-                    case _:
-                        er_str = f"Тег: {tag_id}; неизвестный тип данных: {value_type}"
-                        self._logger.error(f"{self._config.svc_name} :: {er_str}")
-                        return
+                s_type = self._sql_value_type(value_type)
+                if s_type is None:
+                    er_str = f"Тег: {tag_id}; неизвестный тип данных: {value_type}"
+                    self._logger.error(f"{self._config.svc_name} :: {er_str}")
+                    return
 
-                query = (f'CREATE TABLE public."{tbl_name}" ('
-                        f'"id" serial primary key,'
-                        f'"x" bigint NOT NULL,'
-                        f'"y" {s_type},'
-                        f'"q" int);'
-                        # Создание индекса на поле "метка времени" ("ts")
-                        f'CREATE INDEX "{tbl_name}_idx" ON public."{tbl_name}" '
-                        f'USING btree ("x");')
+                # при пересоздании хранилища (смена типа значений тега)
+                # старые данные тега удаляются
+                if store.get("table"):
+                    await self._drop_tag_data(conn, ds_id, tag_id, store)
+
+                # агрегаты ведутся с момента создания хранилища тега
+                store["rollups"] = await self._create_rollup_tables(conn, value_type)
+
+                if store.get("layout") == CN_LAYOUT_NARROW:
+                    store["table"] = self._narrow_table_name(value_type, update)
+                    store["uniqueX"] = update
+                    await self._create_narrow_table(
+                        conn, ds_id, store["table"], value_type, update
+                    )
+                    return
+
+                tbl_name = store["table"]
+                partitioned = bool(store.get("partitioned"))
+                if partitioned:
+                    # первичный ключ секционированной таблицы должен
+                    # включать ключ секционирования, поэтому id - без
+                    # ограничения primary key
+                    query = (f'CREATE TABLE public."{tbl_name}" ('
+                            f'"id" bigserial NOT NULL,'
+                            f'"x" bigint NOT NULL,'
+                            f'"y" {s_type},'
+                            f'"q" int) PARTITION BY RANGE ("x");')
+                else:
+                    query = (f'CREATE TABLE public."{tbl_name}" ('
+                            f'"id" serial primary key,'
+                            f'"x" bigint NOT NULL,'
+                            f'"y" {s_type},'
+                            f'"q" int);')
+                # Создание индекса на поле "метка времени" ("x"):
+                # для тегов с prsUpdate = true индекс уникальный, запись
+                # данных таких тегов выполняется командой
+                # INSERT ... ON CONFLICT (x) DO UPDATE
+                if update:
+                    query += (f'CREATE UNIQUE INDEX "{tbl_name}_x_uidx" ON public."{tbl_name}" '
+                              f'USING btree ("x");')
+                else:
+                    query += (f'CREATE INDEX "{tbl_name}_idx" ON public."{tbl_name}" '
+                              f'USING btree ("x");')
+                store["uniqueX"] = update
 
                 if value_type == 4:
                     query += (f'CREATE INDEX "{tbl_name}_json__idx" ON public."{tbl_name}" '
@@ -143,9 +269,750 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
 
                 await conn.execute(query)
 
+                if partitioned:
+                    await self._ensure_partitions(
+                        conn, ds_id, tbl_name, self._ahead_partition_starts()
+                    )
+
         except Exception as ex:
             self._logger.error(f"{self._config.svc_name} :: Ошибка создания хранилища тега: {ex}")
 
+    def _narrow_table_name(self, value_type: int, unique: bool) -> str:
+        """Имя общей таблицы для тегов с заданным типом значений.
+        Теги с ``prsUpdate`` = true хранятся в отдельных таблицах
+        с уникальным индексом (tag_id, x).
+        """
+        return f"{CN_NARROW_PREFIX}{_TYPE_SUFFIXES[value_type]}{('', '_u')[unique]}"
+
+    async def _create_narrow_table(
+            self, conn: apg.Connection, ds_id: str, tbl_name: str,
+            value_type: int, unique: bool) -> None:
+        """Создание общей таблицы для данных тегов одного типа значений,
+        если её ещё нет.
+        Таблица секционируется по времени (``x``), каждая временная секция -
+        по хэшу id тега.
+        В таблице без уникального индекса столбец ``id`` задаёт порядок
+        записи точек: из точек тега с одной меткой времени при чтении
+        берётся записанная последней.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            ds_id (str): id хранилища
+            tbl_name (str): имя таблицы
+            value_type (int): код типа значений
+            unique (bool): уникальный индекс (tag_id, x)
+        """
+        id_column = ('"id" bigserial NOT NULL,', '')[unique]
+        query = (f'CREATE TABLE IF NOT EXISTS public."{tbl_name}" ('
+                 f'{id_column}'
+                 f'"tag_id" text NOT NULL,'
+                 f'"x" bigint NOT NULL,'
+                 f'"y" {self._sql_value_type(value_type)},'
+                 f'"q" int) PARTITION BY RANGE ("x");'
+                 f'CREATE {("", "UNIQUE ")[unique]}INDEX IF NOT EXISTS "{tbl_name}_idx" '
+                 f'ON public."{tbl_name}" USING btree ("tag_id", "x");')
+        if value_type == TVT.CN_JSON:
+            query += (f'CREATE INDEX IF NOT EXISTS "{tbl_name}_json__idx" '
+                      f'ON public."{tbl_name}" USING gin ("y" jsonb_path_ops);')
+        await conn.execute(query)
+
+        if not unique:
+            # таблица, созданная до появления столбца id
+            has_id = await conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+                "WHERE table_schema = 'public' AND table_name = $1 AND column_name = 'id')",
+                tbl_name
+            )
+            if not has_id:
+                await conn.execute(
+                    f'ALTER TABLE public."{tbl_name}" ADD COLUMN "id" bigserial NOT NULL'
+                )
+
+        await self._ensure_partitions(
+            conn, ds_id, tbl_name, self._ahead_partition_starts()
+        )
+
+    def _rollup_table_name(self, resolution: int, value_type: int) -> str:
+        """Имя таблицы агрегатов с заданным разрешением для тегов
+        с заданным типом значений.
+        """
+        return f"{CN_ROLLUP_PREFIX}{resolution}_{_TYPE_SUFFIXES[value_type]}"
+
+    async def _create_rollup_tables(
+            self, conn: apg.Connection, value_type: int,
+            resolutions: List[int] = None) -> dict:
+        """Создание таблиц агрегатов для тегов с заданным типом значений,
+        если их ещё нет.
+
+        Строка таблицы агрегатов - интервал времени длиной в разрешение
+        агрегата: количество точек, количество точек со значением null,
+        минимум, максимум и сумма значений (для числовых тегов), первая и
+        последняя точки интервала.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            value_type (int): код типа значений
+            resolutions (List[int]): разрешения, секунды; по умолчанию -
+                из параметра конфигурации ``rollup_resolutions``
+
+        Returns:
+            dict: {"<разрешение>": "<таблица агрегатов>"} - для prsStore тега
+        """
+        if resolutions is None:
+            resolutions = self._config.rollup_resolutions
+        s_type = self._sql_value_type(value_type)
+
+        rollups = {}
+        for resolution in resolutions:
+            tbl_name = self._rollup_table_name(resolution, value_type)
+            await conn.execute(
+                f'CREATE TABLE IF NOT EXISTS public."{tbl_name}" ('
+                f'"tag_id" text NOT NULL,'
+                f'"x" bigint NOT NULL,'
+                f'"cnt" bigint NOT NULL,'
+                f'"nulls" bigint NOT NULL,'
+                f'"min_y" double precision,'
+                f'"max_y" double precision,'
+                f'"sum_y" double precision,'
+                f'"first_x" bigint NOT NULL,'
+                f'"first_y" {s_type},'
+                f'"first_q" int,'
+                f'"last_x" bigint NOT NULL,'
+                f'"last_y" {s_type},'
+                f'"last_q" int,'
+                f'PRIMARY KEY ("tag_id", "x"));'
+            )
+            rollups[str(resolution)] = tbl_name
+        return rollups
+
+    def _rollup_rows(
+            self, tag_id: str, data: List[tuple], resolution: int,
+            numeric: bool) -> List[tuple]:
+        """Агрегаты пачки данных тега по интервалам разрешения.
+
+        Args:
+            tag_id (str): id тега
+            data (List[tuple]): данные тега [(y, x, q)] в порядке записи
+            resolution (int): разрешение, секунды
+            numeric (bool): тег с числовыми значениями
+
+        Returns:
+            List[tuple]: строки для таблицы агрегатов
+        """
+        res_us = resolution * t.microsec
+        buckets = {}
+        for y, x, q in data:
+            num = float(y) if numeric and y is not None else None
+            bucket = x - x % res_us
+            row = buckets.get(bucket)
+            if row is None:
+                buckets[bucket] = [
+                    tag_id, bucket, 1, int(y is None), num, num, num,
+                    x, y, q, x, y, q
+                ]
+                continue
+            row[2] += 1
+            if y is None:
+                row[3] += 1
+            elif num is not None:
+                if row[4] is None:
+                    row[4] = row[5] = row[6] = num
+                else:
+                    row[4] = min(row[4], num)
+                    row[5] = max(row[5], num)
+                    row[6] += num
+            # из точек с одной меткой времени берётся записанная позже,
+            # как при интерполяции исходных данных
+            if x <= row[7]:
+                row[7:10] = [x, y, q]
+            if x >= row[10]:
+                row[10:13] = [x, y, q]
+        return [tuple(row) for row in buckets.values()]
+
+    async def _update_rollups(
+            self, conn: apg.Connection, value_type: int, update: bool,
+            tags: dict) -> None:
+        """Обновление агрегатов тегов после записи их данных.
+        Выполняется в транзакции записи данных один раз для всех
+        записанных тегов с одним типом значений: строки агрегатов всех
+        тегов записываются в каждую таблицу агрегатов одной командой COPY.
+
+        Агрегаты тегов без ``prsUpdate`` обновляются слиянием с агрегатами
+        записанной пачки. Данные тегов с ``prsUpdate`` = true могут заменять
+        уже записанные значения, поэтому их агрегаты пересчитываются по
+        исходным данным для интервалов, затронутых пачкой.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            value_type (int): код типа значений тегов
+            update (bool): признак ``prsUpdate`` тегов
+            tags (dict): {"<tag_id>": (<prsStore тега>, [(y, x, q)])}
+        """
+        numeric = value_type in (TVT.CN_INT, TVT.CN_DOUBLE)
+
+        if update:
+            for tag_id, (store, data) in tags.items():
+                for resolution, rollup_tbl in (store.get("rollups") or {}).items():
+                    res_us = int(resolution) * t.microsec
+                    x_from = min(x for _, x, _ in data)
+                    x_to = max(x for _, x, _ in data)
+                    await self._recompute_rollup(
+                        conn, tag_id, store, value_type, int(resolution),
+                        rollup_tbl, x_from - x_from % res_us,
+                        x_to - x_to % res_us + res_us
+                    )
+            return
+
+        # строки агрегатов группируются по таблицам агрегатов
+        rows = {}
+        for tag_id, (store, data) in tags.items():
+            for resolution, rollup_tbl in (store.get("rollups") or {}).items():
+                rows.setdefault(rollup_tbl, []).extend(
+                    self._rollup_rows(tag_id, data, int(resolution), numeric)
+                )
+        if not rows:
+            return
+
+        # первая точка интервала - с наименьшей меткой времени,
+        # последняя - с наибольшей; из точек с одной меткой берётся
+        # записанная позже
+        merge_first = ', '.join(
+            f'first_{c} = CASE WHEN EXCLUDED.first_x <= r.first_x '
+            f'THEN EXCLUDED.first_{c} ELSE r.first_{c} END'
+            for c in ('x', 'y', 'q')
+        )
+        merge_last = ', '.join(
+            f'last_{c} = CASE WHEN EXCLUDED.last_x >= r.last_x '
+            f'THEN EXCLUDED.last_{c} ELSE r.last_{c} END'
+            for c in ('x', 'y', 'q')
+        )
+        tmp_tbl = f"_prs_rollup_{value_type}"
+        for rollup_tbl, records in rows.items():
+            await conn.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS "{tmp_tbl}" '
+                f'(LIKE public."{rollup_tbl}") ON COMMIT DELETE ROWS'
+            )
+            await conn.copy_records_to_table(
+                tmp_tbl, records=records, columns=_ROLLUP_COLUMNS
+            )
+            await conn.execute(
+                f'INSERT INTO public."{rollup_tbl}" AS r SELECT * FROM "{tmp_tbl}" '
+                f'ON CONFLICT (tag_id, x) DO UPDATE SET '
+                f'cnt = r.cnt + EXCLUDED.cnt, '
+                f'nulls = r.nulls + EXCLUDED.nulls, '
+                f'min_y = LEAST(r.min_y, EXCLUDED.min_y), '
+                f'max_y = GREATEST(r.max_y, EXCLUDED.max_y), '
+                f'sum_y = CASE WHEN r.sum_y IS NULL THEN EXCLUDED.sum_y '
+                f'WHEN EXCLUDED.sum_y IS NULL THEN r.sum_y '
+                f'ELSE r.sum_y + EXCLUDED.sum_y END, '
+                f'{merge_first}, {merge_last};'
+                f'TRUNCATE "{tmp_tbl}";'
+            )
+
+    async def _recompute_rollup(
+            self, conn: apg.Connection, tag_id: str, store: dict,
+            value_type: int, resolution: int, rollup_tbl: str,
+            x_from: int = None, x_to: int = None) -> None:
+        """Пересчёт агрегатов тега по исходным данным.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            tag_id (str): id тега
+            store (dict): prsStore тега
+            value_type (int): код типа значений тега
+            resolution (int): разрешение, секунды
+            rollup_tbl (str): таблица агрегатов
+            x_from (int): начало пересчитываемого диапазона
+                (кратно разрешению), None - без ограничения
+            x_to (int): конец пересчитываемого диапазона (не включая),
+                None - без ограничения
+        """
+        res_us = resolution * t.microsec
+        narrow = store.get("layout") == CN_LAYOUT_NARROW
+        if value_type in (TVT.CN_INT, TVT.CN_DOUBLE):
+            num_aggs = ('min(y)::double precision, max(y)::double precision, '
+                        'sum(y)::double precision')
+        else:
+            num_aggs = 'NULL::double precision, NULL::double precision, NULL::double precision'
+        # в таблицах без уникального индекса по метке времени
+        # из точек с одной меткой берётся записанная позже
+        with_id = not store.get("uniqueX")
+        order_first = ('x', 'x, id DESC')[with_id]
+        order_last = ('x DESC', 'x DESC, id DESC')[with_id]
+
+        conditions = [('TRUE', 'tag_id = $1')[narrow]]
+        if x_from is not None:
+            conditions.append(f'x >= {x_from}')
+        if x_to is not None:
+            conditions.append(f'x < {x_to}')
+
+        await conn.execute(
+            f'INSERT INTO public."{rollup_tbl}" ({", ".join(_ROLLUP_COLUMNS)}) '
+            f'SELECT $1::text, x - x % {res_us} AS bucket, count(*), count(*) - count(y), '
+            f'{num_aggs}, '
+            f'min(x), (array_agg(y ORDER BY {order_first}))[1], '
+            f'(array_agg(q ORDER BY {order_first}))[1], '
+            f'max(x), (array_agg(y ORDER BY {order_last}))[1], '
+            f'(array_agg(q ORDER BY {order_last}))[1] '
+            f'FROM public."{store["table"]}" WHERE {" AND ".join(conditions)} '
+            f'GROUP BY bucket '
+            f'ON CONFLICT (tag_id, x) DO UPDATE SET '
+            f'cnt = EXCLUDED.cnt, nulls = EXCLUDED.nulls, '
+            f'min_y = EXCLUDED.min_y, max_y = EXCLUDED.max_y, sum_y = EXCLUDED.sum_y, '
+            f'first_x = EXCLUDED.first_x, first_y = EXCLUDED.first_y, first_q = EXCLUDED.first_q, '
+            f'last_x = EXCLUDED.last_x, last_y = EXCLUDED.last_y, last_q = EXCLUDED.last_q',
+            tag_id
+        )
+
+    async def _rebuild_rollups(
+            self, tag_id: str, ds_id: str, store: dict, value_type: int) -> None:
+        """Полный пересчёт всех агрегатов тега по исходным данным.
+
+        Args:
+            tag_id (str): id тега
+            ds_id (str): id хранилища
+            store (dict): prsStore тега
+            value_type (int): код типа значений тега
+        """
+        async with self._connection_pools[ds_id].acquire() as conn:
+            async with conn.transaction():
+                for resolution, rollup_tbl in (store.get("rollups") or {}).items():
+                    await conn.execute(
+                        f'DELETE FROM public."{rollup_tbl}" WHERE tag_id = $1', tag_id
+                    )
+                    await self._recompute_rollup(
+                        conn, tag_id, store, value_type, int(resolution), rollup_tbl
+                    )
+
+    async def _backfill_rollups(self) -> None:
+        """Построение агрегатов с разрешениями из параметра конфигурации
+        ``rollup_resolutions`` для тегов, у которых их ещё нет (теги,
+        созданные до включения агрегатов или до добавления разрешения).
+        Выполняется при старте сервиса, если установлен параметр
+        конфигурации ``rollup_backfill``\\.
+
+        Сначала в prsStore тега добавляются новые таблицы агрегатов, чтобы
+        последующие записи данных обновляли агрегаты, затем агрегаты
+        рассчитываются по уже записанным данным. До окончания расчёта
+        чтение данных тега по агрегатам не выполняется.
+        """
+        for ds_id in self._connection_pools.keys():
+            payload = {
+                "base": ds_id,
+                "filter": {"objectClass": ["prsDatastorageTagData"]},
+                "deref": False,
+                "attributes": ["cn", "prsStore"]
+            }
+            links = await self._hierarchy.search(payload=payload)
+            for link in links:
+                tag_id = link[2]["cn"][0]
+                try:
+                    store = json.loads(link[2]["prsStore"][0])
+                    rollups = store.get("rollups") or {}
+                    missing = [
+                        res for res in self._config.rollup_resolutions
+                        if str(res) not in rollups
+                    ]
+                    if not missing or not store.get("table"):
+                        continue
+                    tag_data = await self._hierarchy.search(
+                        payload={"id": tag_id, "attributes": ["prsValueTypeCode"]}
+                    )
+                    if not tag_data:
+                        continue
+                    value_type = int(tag_data[0][2]["prsValueTypeCode"][0])
+
+                    self._rollup_backfill.add(tag_id)
+                    await self._write_cache_data([tag_id])
+                    async with self._connection_pools[ds_id].acquire() as conn:
+                        new_rollups = await self._create_rollup_tables(
+                            conn, value_type, missing
+                        )
+                    store["rollups"] = {**rollups, **new_rollups}
+                    await self._hierarchy.modify(link[0], {"prsStore": store})
+                    await self._delete_tag_cache(tag_id)
+
+                    async with self._connection_pools[ds_id].acquire() as conn:
+                        for resolution, rollup_tbl in new_rollups.items():
+                            async with conn.transaction():
+                                await self._recompute_rollup(
+                                    conn, tag_id, store, value_type,
+                                    int(resolution), rollup_tbl
+                                )
+                    self._logger.info(f"{self._config.svc_name} :: Построены агрегаты {list(new_rollups.keys())} тега '{tag_id}' в '{ds_id}'.")
+
+                except Exception as ex:
+                    self._logger.error(f"{self._config.svc_name} :: Ошибка построения агрегатов тега '{tag_id}' в '{ds_id}': {ex}")
+                finally:
+                    self._rollup_backfill.discard(tag_id)
+
+    def _partition_start(self, x: int) -> int:
+        """Начало временной секции, в которую попадает метка времени.
+        """
+        interval = self._config.partition_interval * t.microsec
+        return x - x % interval
+
+    def _ahead_partition_starts(self) -> set:
+        """Начала текущей временной секции и секций, создаваемых заранее.
+        """
+        interval = self._config.partition_interval * t.microsec
+        first = self._partition_start(t.now_int())
+        return {
+            first + i * interval
+            for i in range(self._config.partition_ahead + 1)
+        }
+
+    async def _ensure_partitions(
+            self, conn: apg.Connection, ds_id: str, tbl_name: str,
+            starts: set) -> None:
+        """Создание временных секций таблицы, если их ещё нет.
+        Секции общих таблиц дополнительно разбиваются по хэшу id тега.
+
+        Команды выполняются вне транзакции записи данных, чтобы
+        блокировка родительской таблицы не удерживалась на время записи.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            ds_id (str): id хранилища
+            tbl_name (str): имя секционированной таблицы
+            starts (set): начала нужных секций, микросекунды
+        """
+        known = self._partitions.setdefault((ds_id, tbl_name), set())
+        interval = self._config.partition_interval * t.microsec
+        hashed = tbl_name.startswith(CN_NARROW_PREFIX)
+
+        for start in sorted(starts - known):
+            part_name = f"{tbl_name}_p{start // t.microsec}"
+            query = (f'CREATE TABLE IF NOT EXISTS public."{part_name}" '
+                     f'PARTITION OF public."{tbl_name}" '
+                     f'FOR VALUES FROM ({start}) TO ({start + interval})')
+            if hashed:
+                modulus = self._config.narrow_hash_partitions
+                query += ' PARTITION BY HASH ("tag_id");'
+                for i in range(modulus):
+                    query += (f'CREATE TABLE IF NOT EXISTS public."{part_name}_h{i}" '
+                              f'PARTITION OF public."{part_name}" '
+                              f'FOR VALUES WITH (MODULUS {modulus}, REMAINDER {i});')
+            try:
+                async with conn.transaction():
+                    await conn.execute(query)
+                known.add(start)
+            except PostgresError as ex:
+                self._logger.error(f"{self._config.svc_name} :: Ошибка создания секции {part_name} в {ds_id}: {ex}")
+
+    async def _partition_scheduler(self) -> None:
+        """Периодическое обслуживание секционированных таблиц обслуживаемых
+        хранилищ: создание временных секций заранее и удаление секций
+        с устаревшими данными.
+        """
+        while True:
+            await asyncio.sleep(self._config.partition_check_period)
+            for ds_id, pool in self._connection_pools.items():
+                if pool is None:
+                    continue
+                try:
+                    retentions = await self._get_retentions(ds_id)
+                    async with pool.acquire() as conn:
+                        tables = await conn.fetch(
+                            'SELECT c.relname FROM pg_partitioned_table p '
+                            'JOIN pg_class c ON c.oid = p.partrelid '
+                            'JOIN pg_namespace n ON n.oid = c.relnamespace '
+                            "WHERE n.nspname = 'public' AND NOT c.relispartition"
+                        )
+                        starts = self._ahead_partition_starts()
+                        for r in tables:
+                            tbl_name = r["relname"]
+                            await self._ensure_partitions(
+                                conn, ds_id, tbl_name, starts
+                            )
+                            if tbl_name in retentions:
+                                retention, tags = retentions[tbl_name]
+                                await self._drop_expired_partitions(
+                                    conn, ds_id, tbl_name, retention, tags
+                                )
+                except Exception as ex:
+                    self._logger.error(f"{self._config.svc_name} :: Ошибка обслуживания секций в {ds_id}: {ex}")
+
+    async def _get_retentions(self, ds_id: str) -> dict:
+        """Сроки хранения данных для секционированных таблиц хранилища.
+
+        Срок хранения задаётся ключом ``retention`` (секунды):
+
+        * в prsJsonConfigString хранилища - для всех таблиц хранилища;
+        * в prsStore тега - для отдельной таблицы тега (перекрывает срок
+          хранилища).
+
+        Общие таблицы содержат данные многих тегов, поэтому для них
+        действует только срок хранения хранилища.
+
+        Args:
+            ds_id (str): id хранилища
+
+        Returns:
+            dict: {"<таблица>": (<срок хранения, секунды>,
+            {"<tag_id>": <таблицы агрегатов тега>})}
+        """
+        ds_data = await self._hierarchy.search(
+            payload={"id": ds_id, "attributes": ["prsJsonConfigString"]}
+        )
+        ds_retention = None
+        if ds_data and ds_data[0][2].get("prsJsonConfigString"):
+            ds_retention = json.loads(ds_data[0][2]["prsJsonConfigString"][0]).get("retention")
+
+        retentions = {}
+        if ds_retention:
+            for value_type in (TVT.CN_INT, TVT.CN_DOUBLE, TVT.CN_STR, TVT.CN_JSON):
+                for unique in (False, True):
+                    retentions[self._narrow_table_name(value_type, unique)] = (ds_retention, {})
+
+        links = await self._hierarchy.search(payload={
+            "base": ds_id,
+            "filter": {"objectClass": ["prsDatastorageTagData"]},
+            "deref": False,
+            "attributes": ["cn", "prsStore"]
+        })
+        for link in links:
+            store = json.loads(link[2]["prsStore"][0])
+            tag_id = link[2]["cn"][0]
+            if store.get("layout") == CN_LAYOUT_NARROW:
+                if store.get("table") in retentions:
+                    retentions[store["table"]][1][tag_id] = store.get("rollups") or {}
+                continue
+            if not store.get("partitioned"):
+                continue
+            retention = store.get("retention", ds_retention)
+            if retention:
+                retentions[store["table"]] = (
+                    retention, {tag_id: store.get("rollups") or {}}
+                )
+
+        return retentions
+
+    async def _drop_expired_partitions(
+            self, conn: apg.Connection, ds_id: str, tbl_name: str,
+            retention: int, tags: dict) -> None:
+        """Удаление временных секций таблицы, все данные которых старше
+        срока хранения, и агрегатов тегов таблицы за интервалы, целиком
+        попадающие в удалённые секции.
+
+        Args:
+            conn (apg.Connection): соединение с базой
+            ds_id (str): id хранилища
+            tbl_name (str): имя секционированной таблицы
+            retention (int): срок хранения, секунды
+            tags (dict): {"<tag_id>": <таблицы агрегатов тега>} - теги,
+                данные которых хранятся в таблице
+        """
+        border = t.now_int() - retention * t.microsec
+        parts = await conn.fetch(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound '
+            'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = $1::text::regclass',
+            f'public."{tbl_name}"'
+        )
+        known = self._partitions.get((ds_id, tbl_name), set())
+        # конец удалённых данных
+        cutoff = None
+        for part in parts:
+            bound = RE_PARTITION_BOUND.search(part["bound"] or "")
+            if not bound:
+                continue
+            start, end = int(bound.group(1)), int(bound.group(2))
+            if end > border:
+                continue
+            await conn.execute(f'DROP TABLE IF EXISTS public."{part["relname"]}"')
+            known.discard(start)
+            cutoff = max(cutoff or end, end)
+            # в таблице могут быть данные многих тегов
+            self._result_cache.invalidate()
+            self._current_values.invalidate()
+            self._logger.info(f"{self._config.svc_name} :: Удалена секция {part['relname']} в {ds_id}.")
+
+        if cutoff is None:
+            return
+        # {("<таблица агрегатов>", <разрешение>): [<tag_id>]}
+        rollups = {}
+        for tag_id, tag_rollups in tags.items():
+            for resolution, rollup_tbl in tag_rollups.items():
+                rollups.setdefault((rollup_tbl, int(resolution)), []).append(tag_id)
+        for (rollup_tbl, resolution), tag_ids in rollups.items():
+            await conn.execute(
+                f'DELETE FROM public."{rollup_tbl}" '
+                f'WHERE tag_id = ANY($1::text[]) AND x <= $2',
+                tag_ids, cutoff - resolution * t.microsec
+            )
+        self._logger.info(f"{self._config.svc_name} :: Удалены агрегаты тегов таблицы {tbl_name} в {ds_id} до {cutoff}.")
+
+    def _sql_value_type(self, value_type: int) -> str | None:
+        """Тип столбца ``y`` для кода типа значений тега.
+        """
+        match value_type:
+            case TVT.CN_INT:
+                return "bigint"
+            case TVT.CN_DOUBLE:
+                return "double precision"
+            case TVT.CN_STR:
+                return "text"
+            case TVT.CN_JSON:
+                return "jsonb"
+        return None
+
+    async def _migrate_store_x_index(
+            self, tag_id: str, ds_id: str, store: dict, unique: bool) -> dict:
+        """Перевод существующей таблицы тега на уникальный индекс по метке
+        времени (для тегов с ``prsUpdate`` = true) или обратно.
+
+        При переходе на уникальный индекс из таблицы удаляются дубли
+        меток времени: остаётся значение, записанное последним.
+
+        Args:
+            tag_id (str): id тега
+            ds_id (str): id хранилища
+            store (dict): prsStore тега в хранилище
+            unique (bool): True - уникальный индекс, False - обычный
+
+        Returns:
+            dict: новый prsStore тега
+        """
+        if store.get("layout") == CN_LAYOUT_NARROW:
+            return await self._migrate_narrow_store(tag_id, ds_id, store, unique)
+
+        tbl_name = store["table"]
+        async with self._connection_pools[ds_id].acquire() as conn:
+            async with conn.transaction():
+                if unique:
+                    await conn.execute(
+                        f'DELETE FROM public."{tbl_name}" a USING public."{tbl_name}" b '
+                        f'WHERE a.x = b.x AND a.id < b.id;'
+                        f'CREATE UNIQUE INDEX IF NOT EXISTS "{tbl_name}_x_uidx" '
+                        f'ON public."{tbl_name}" USING btree ("x");'
+                        f'DROP INDEX IF EXISTS "{tbl_name}_idx";'
+                    )
+                else:
+                    await conn.execute(
+                        f'CREATE INDEX IF NOT EXISTS "{tbl_name}_idx" '
+                        f'ON public."{tbl_name}" USING btree ("x");'
+                        f'DROP INDEX IF EXISTS "{tbl_name}_x_uidx";'
+                    )
+
+        new_store = copy.deepcopy(store)
+        new_store["uniqueX"] = unique
+        self._logger.info(f"{self._config.svc_name} :: Индекс таблицы тега '{tag_id}' в '{ds_id}' изменён, uniqueX = {unique}.")
+        return new_store
+
+    async def _migrate_narrow_store(
+            self, tag_id: str, ds_id: str, store: dict, unique: bool) -> dict:
+        """Перенос данных тега между общими таблицами с уникальным
+        индексом (tag_id, x) и без него.
+
+        Args:
+            tag_id (str): id тега
+            ds_id (str): id хранилища
+            store (dict): prsStore тега в хранилище
+            unique (bool): True - перенос в таблицу с уникальным индексом
+
+        Returns:
+            dict: новый prsStore тега
+        """
+        old_tbl = store["table"]
+        value_type = {
+            self._narrow_table_name(vt, not unique): vt
+            for vt in (TVT.CN_INT, TVT.CN_DOUBLE, TVT.CN_STR, TVT.CN_JSON)
+        }[old_tbl]
+        new_tbl = self._narrow_table_name(value_type, unique)
+
+        async with self._connection_pools[ds_id].acquire() as conn:
+            await self._create_narrow_table(conn, ds_id, new_tbl, value_type, unique)
+            xs = await conn.fetch(
+                f'SELECT DISTINCT x - x % $2 AS start FROM "{old_tbl}" WHERE tag_id = $1',
+                tag_id, self._config.partition_interval * t.microsec
+            )
+            await self._ensure_partitions(
+                conn, ds_id, new_tbl, {r["start"] for r in xs}
+            )
+
+            async with conn.transaction():
+                if unique:
+                    await conn.execute(
+                        f'INSERT INTO "{new_tbl}" (tag_id, x, y, q) '
+                        f'SELECT DISTINCT ON (x) tag_id, x, y, q FROM "{old_tbl}" '
+                        f'WHERE tag_id = $1 ORDER BY x, id DESC '
+                        f'ON CONFLICT (tag_id, x) DO UPDATE SET y = EXCLUDED.y, q = EXCLUDED.q',
+                        tag_id
+                    )
+                else:
+                    await conn.execute(
+                        f'INSERT INTO "{new_tbl}" (tag_id, x, y, q) '
+                        f'SELECT tag_id, x, y, q FROM "{old_tbl}" WHERE tag_id = $1',
+                        tag_id
+                    )
+                await conn.execute(
+                    f'DELETE FROM "{old_tbl}" WHERE tag_id = $1', tag_id
+                )
+
+        new_store = copy.deepcopy(store)
+        new_store["table"] = new_tbl
+        new_store["uniqueX"] = unique
+        self._logger.info(f"{self._config.svc_name} :: Данные тега '{tag_id}' в '{ds_id}' перенесены в {new_tbl}.")
+        return new_store
+
+    async def _migrate_update_stores(self) -> None:
+        """Перевод таблиц всех тегов с ``prsUpdate`` = true в обслуживаемых
+        хранилищах на уникальный индекс по метке времени.
+        Выполняется при старте сервиса, если установлен параметр
+        конфигурации ``migrate_update_stores``\.
+        """
+        for ds_id in self._connection_pools.keys():
+            payload = {
+                "base": ds_id,
+                "filter": {"objectClass": ["prsDatastorageTagData"]},
+                "deref": False,
+                "attributes": ["cn", "prsStore"]
+            }
+            links = await self._hierarchy.search(payload=payload)
+            for link in links:
+                tag_id = link[2]["cn"][0]
+                try:
+                    store = json.loads(link[2]["prsStore"][0])
+                    if store.get("uniqueX"):
+                        continue
+                    tag_data = await self._hierarchy.search(
+                        payload={"id": tag_id, "attributes": ["prsUpdate", "prsValueTypeCode"]}
+                    )
+                    if not tag_data or tag_data[0][2]["prsUpdate"][0] != "TRUE":
+                        continue
+
+                    await self._write_cache_data([tag_id])
+                    store = await self._migrate_store_x_index(tag_id, ds_id, store, True)
+                    await self._rebuild_rollups(
+                        tag_id, ds_id, store, int(tag_data[0][2]["prsValueTypeCode"][0])
+                    )
+                    await self._hierarchy.modify(link[0], {"prsStore": store})
+                    await self._delete_tag_cache(tag_id)
+
+                except Exception as ex:
+                    self._logger.error(f"{self._config.svc_name} :: Ошибка перевода таблицы тега '{tag_id}' в '{ds_id}' на уникальный индекс: {ex}")
+
+    async def on_startup(self) -> None:
+        await super().on_startup()
+
+        if not _ORJSON:
+            self._logger.warning(f"{self._config.svc_name} :: Модуль orjson не установлен, значения jsonb кодируются модулем json.")
+
+        if self._config.migrate_update_stores:
+            await self._migrate_update_stores()
+
+        if self._config.rollup_backfill and self._config.rollup_resolutions:
+            await self._backfill_rollups()
+
+        self._partition_task = asyncio.create_task(self._partition_scheduler())
+
+    async def on_shutdown(self) -> None:
+        if self._partition_task:
+            self._partition_task.cancel()
+
+        await super().on_shutdown()
+
     async def _create_store_name_for_new_alert(self,
             ds_id: str, alert_id: str) -> dict | None:
         """Метод, создающий имя для нового места хранения данных тега.
@@ -161,11 +1028,12 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
             "table": f"a_{alert_id}"
         }
 
-    async def _check_store_name_for_new_tag(self, store: dict) -> bool:
+    async def _check_store_name_for_new_alert(self, ds_id: str, store: dict) -> bool:
         """Метод проверяет на корректность имя хранилища для новой тревоги,
         переданное клиентом.
 
         Args:
+            ds_id (str): id хранилища
             store (dict): новое хранилище для тревоги
 
         Returns:
@@ -219,15 +1087,14 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
             alert_tbl = prsStore["table"]
 
             try:
-                records = []
                 async with connection_pool.acquire() as conn:
                     async with conn.transaction():
-                        q = [f'select * from \"{alert_tbl}\" order by x desc limit 1;']
-                        async for r in conn.cursor(*q):
-                            records.append((r.get('id'), r.get('x'), r.get('cx'), r.get('e')))
+                        last = await conn.fetchrow(
+                            f'select id, x, cx, e from "{alert_tbl}" order by x desc limit 1'
+                        )
 
                         # если алярмов у тревоги вообще нет или закончились...
-                        if not records or records[0][0] is None or records[0][3]:
+                        if last is None or last["e"]:
                             await conn.copy_records_to_table(
                                 alert_tbl,
                                 records=[(mes["x"], None, None)],
@@ -262,20 +1129,21 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
             alert_tbl = prsStore["table"]
 
             try:
-                records = []
                 async with connection_pool.acquire() as conn:
                     async with conn.transaction():
-                        q = [f'select * from \"{alert_tbl}\" order by x desc limit 1;']
-                        async for r in conn.cursor(*q):
-                            records.append((r.get('id'), r.get('x'), r.get('cx'), r.get('e')))
+                        last = await conn.fetchrow(
+                            f'select id, x, cx, e from "{alert_tbl}" order by x desc limit 1'
+                        )
 
                         # если алярмов у тревоги вообще нет или уже квитирована...
-                        if records[0][0] is None or records[0][2]:
+                        if last is None or last["cx"]:
                             self._logger.debug(f"Тревоги {alert_id} нет, либо уже квитирована.")
                             return
 
-                        q = f"update \"{alert_tbl}\" set cx = {mes['x']}"
-                        await conn.execute(q)
+                        await conn.execute(
+                            f'update "{alert_tbl}" set cx = $1::bigint where id = $2',
+                            mes['x'], last["id"]
+                        )
 
                         self._logger.debug(f"Тревога {alert_id} квитирована.")
 
@@ -292,13 +1160,15 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
         self._logger.debug(f"Обработка пропадания тревоги: {mes}")
         alert_id = mes["alertId"]
 
-        alert_params = await self._cache.get(f"{alert_id}.{self._config.svc_name}")
-        if not alert_params:
-            alert_params = await self._create_alert_cache(alert_id)
-            if not alert_params:
+        alert_params = await self._cache.get(f"{alert_id}.{self._config.svc_name}").exec()
+        if not alert_params[0]:
+            await self._create_alert_cache(alert_id)
+            alert_params = await self._cache.get(f"{alert_id}.{self._config.svc_name}").exec()
+            if not alert_params[0]:
                 self._logger.error(f"{self._config.svc_name} :: Ошибка построения кэша тревоги {alert_id}")
                 return
 
+        alert_params = alert_params[0]
         for ds_id, prsStore in alert_params["dss"].items():
             connection_pool = self._connection_pools.get(ds_id)
             if connection_pool is None:
@@ -307,20 +1177,21 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
             alert_tbl = prsStore["table"]
 
             try:
-                records = []
                 async with connection_pool.acquire() as conn:
                     async with conn.transaction():
-                        q = [f'select * from \"{alert_tbl}\" order by x desc limit 1;']
-                        async for r in conn.cursor(*q):
-                            records.append((r.get('id'), r.get('x'), r.get('cx'), r.get('e')))
+                        last = await conn.fetchrow(
+                            f'select id, x, cx, e from "{alert_tbl}" order by x desc limit 1'
+                        )
 
                         # если алярмов у тревоги вообще нет или закончились...
-                        if records[0][0] is None or records[0][3]:
+                        if last is None or last["e"]:
                             self._logger.debug(f"Нет активной тревоги {alert_id}.")
                             return
 
-                        q = f"update \"{alert_tbl}\" set e = {mes['data']['x']}"
-                        await conn.execute(q)
+                        await conn.execute(
+                            f'update "{alert_tbl}" set e = $1::bigint where id = $2',
+                            mes['x'], last["id"]
+                        )
 
                         self._logger.debug(f"Тревога {alert_id} закончена.")
 
@@ -332,13 +1203,14 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
         
         payload = {
             "id": tag_id,
-            "attributes": ["prsValueTypeCode"]
+            "attributes": ["prsValueTypeCode", "prsUpdate"]
         }
         tag_data = await self._hierarchy.search(payload=payload)
         if not tag_data:
             self._logger.error(f"{self._config.svc_name} :: В модели нет данных по тегу {tag_id}")
             return
         new_type = int(tag_data[0][2]["prsValueTypeCode"][0])
+        update = tag_data[0][2]["prsUpdate"][0] == "TRUE"
 
         # тег может быть привязан к нескольким хранилищам
         for ds_id in self._connection_pools.keys():
@@ -358,13 +1230,14 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
                 self._logger.error(f"{self._config.svc_name} :: Ошибка определения старого типа данных для тега '{tag_id}', хранилище '{ds_id}'.")
                 continue
 
+            store = json.loads(tag_link_data[0][2]["prsStore"][0])
             if new_type != old_type:
-                store = json.loads(tag_link_data[0][2]["prsStore"][0])
                 await self._create_store_for_tag(tag_id=tag_id, ds_id=ds_id, store=store)
                 await self._hierarchy.modify(
                     tag_link_data[0][0], 
                     {
-                        "prsJsonConfigString": {"prsValueTypeCode": new_type}
+                        "prsJsonConfigString": {"prsValueTypeCode": new_type},
+                        "prsStore": store
                     }
                 )
                 await self._delete_tag_cache(tag_id)
@@ -372,6 +1245,18 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
                 
                 self._logger.info(f"{self._config.svc_name} :: Хранилище тега '{tag_id}' в '{ds_id}' изменено.")        
 
+            elif bool(store.get("uniqueX")) != update:
+                # изменился признак prsUpdate: перед сменой индекса
+                # запишем накопленные в кэше данные тега
+                await self._write_cache_data([tag_id])
+                store = await self._migrate_store_x_index(tag_id, ds_id, store, update)
+                # при переходе на уникальный индекс удаляются дубли
+                # меток времени, агрегаты пересчитываются
+                await self._rebuild_rollups(tag_id, ds_id, store, new_type)
+                await self._hierarchy.modify(tag_link_data[0][0], {"prsStore": store})
+                await self._delete_tag_cache(tag_id)
+                await self._create_tag_cache(tag_id)
+
     async def _alert_deleted(self, mes: dict, routing_key: str = None):
         alert_id = mes['id']
         
@@ -391,64 +1276,173 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
     async def _reject_message(self, mes: dict) -> bool:
         return False
 
-    async def _write_tag_data_to_db(
-            self, tag_id: str) -> None :
-
-        # метод, переопределяемый в классах-потомках
-        # записывает данные одного тега в хранилище
-        self._logger.debug(f"Запись данных тега '{tag_id}' из кэша в хранилища...")
-
-        try:
-            tag_cache = await self._cache.get(
-                f"{tag_id}.{self._config.svc_name}", "$"
-            ).set(
-                f"{tag_id}.{self._config.svc_name}", "$.data", []
-            ).exec()
-
-            if not tag_cache[0][0]["data"]:
-                self._logger.debug(f"Кэш данных тега {tag_id} пустой.")
-                return
+    async def _write_ds_data_to_db(
+            self, ds_id: str, tags: dict) -> List[str]:
+        """Запись данных группы тегов в хранилище.
+        Данные всех тегов записываются в одной транзакции через одно
+        соединение: по одной команде COPY на тег с отдельной таблицей и
+        по одной команде COPY на каждую общую таблицу. Запись каждой таблицы
+        выполняется в своей точке сохранения, поэтому ошибка записи
+        одного тега не отменяет запись остальных.
+        Агрегаты всех записанных тегов обновляются после записи данных
+        в той же транзакции, по одной записи в каждую таблицу агрегатов
+        (см. :meth:`_update_rollups`); ошибка обновления агрегатов отменяет
+        запись всей группы.
 
-            for ds_id in tag_cache[0][0]["dss"].keys():
-                active = await self._cache.get(
-                    f"{ds_id}.{self._config.svc_name}", "prsActive"
-                ).exec()
-                if active[0] is None:
-                    self._logger.error(
-                        f"{self._config.svc_name} :: Несоответствие кэша тега {tag_id} c кэшем хранилища {ds_id}")
-                    continue
+        Args:
+            ds_id (str): id хранилища
+            tags (dict): {"<tag_id>": <кэш тега вместе с данными>}
 
-                # если хранилище неактивно, данные в него не записываем
-                if not active[0]:
-                    self._logger.error(
-                        f"{self._config.svc_name} :: Хранилище {ds_id} неактивно.")
-                    continue
+        Returns:
+            List[str]: id тегов, данные которых не записаны
+        """
+        self._logger.debug(f"Запись данных {len(tags)} тегов из кэша в хранилище {ds_id}...")
+
+        # данные тегов, хранящихся в общих таблицах:
+        # {"<table>": {"valueType": ..., "unique": ...,
+        #              "tags": {"<tag_id>": (<prsStore>, [(y, x, q)])}, "records": [...]}}
+        narrow = {}
+        # теги с отдельными таблицами
+        tables = {}
+        for tag_id, tag_cache in tags.items():
+            store = tag_cache["dss"][ds_id]
+            data = tag_cache["data"]
+
+            if store.get("layout") != CN_LAYOUT_NARROW:
+                tables[tag_id] = (tag_cache, data)
+                continue
 
-                async with self._connection_pools[ds_id].acquire() as conn:
-                    tag_tbl = tag_cache[0][0]["dss"][ds_id]["table"]
-
-                    data = tag_cache[0][0]["data"]
-                    async with conn.transaction(isolation='read_committed'):
-                        if tag_cache[0][0]["prsUpdate"]:
-                            xs = [str(x) for _, x, _ in data]
-                            q = f'delete from "{tag_tbl}" where x in ({",".join(xs)}); '
-                            await conn.execute(q)
-                        if tag_cache[0][0]["prsValueTypeCode"] == 4:
-                            new_data = []
-                            for item in data:
-                                new_data.append(
-                                    (json.dumps(item[0], ensure_ascii=False), item[1], item[2])
+            group = narrow.setdefault(store["table"], {
+                "valueType": tag_cache["prsValueTypeCode"],
+                "unique": bool(store.get("uniqueX")),
+                "tags": {},
+                "records": []
+            })
+            group["tags"][tag_id] = (store, data)
+            group["records"].extend((tag_id, x, y, q) for y, x, q in data)
+
+        failed = []
+        # записанные теги для обновления агрегатов:
+        # {(<тип значений>, <prsUpdate>): {"<tag_id>": (<prsStore>, [(y, x, q)])}}
+        rollups = {}
+        async with self._connection_pools[ds_id].acquire() as conn:
+            for tbl_name, group in narrow.items():
+                await self._ensure_partitions(
+                    conn, ds_id, tbl_name,
+                    {self._partition_start(r[1]) for r in group["records"]}
+                )
+            for tag_cache, data in tables.values():
+                if tag_cache["dss"][ds_id].get("partitioned"):
+                    await self._ensure_partitions(
+                        conn, ds_id, tag_cache["dss"][ds_id]["table"],
+                        {self._partition_start(x) for _, x, _ in data}
+                    )
+
+            async with conn.transaction(isolation='read_committed'):
+                for tag_id, (tag_cache, data) in tables.items():
+                    tag_tbl = tag_cache["dss"][ds_id]["table"]
+                    try:
+                        async with conn.transaction():
+                            if tag_cache["prsUpdate"] and tag_cache["dss"][ds_id].get("uniqueX"):
+                                await self._upsert_tag_data(
+                                    conn, tag_tbl, tag_cache["prsValueTypeCode"], data
                                 )
-                            data = new_data
-
-                        await conn.copy_records_to_table(
-                            tag_tbl,
-                            records=data,
-                            columns=('y', 'x', 'q'))
-                    self._logger.debug(f"В базу {ds_id} для тега {tag_id} записано {len(data)} точек.")
+                            else:
+                                if tag_cache["prsUpdate"]:
+                                    # таблица, созданная до перехода на уникальный
+                                    # индекс по метке времени
+                                    await conn.execute(
+                                        f'delete from "{tag_tbl}" where x = any($1::bigint[])',
+                                        [x for _, x, _ in data]
+                                    )
+                                await conn.copy_records_to_table(
+                                    tag_tbl,
+                                    records=data,
+                                    columns=('y', 'x', 'q'))
+                        rollups.setdefault(
+                            (tag_cache["prsValueTypeCode"], bool(tag_cache["prsUpdate"])), {}
+                        )[tag_id] = (tag_cache["dss"][ds_id], data)
+                        self._logger.debug(f"В базу {ds_id} для тега {tag_id} записано {len(data)} точек.")
+
+                    except PostgresError as ex:
+                        self._logger.error(f"{self._config.svc_name} :: Ошибка записи данных тега {tag_id} в базу {ds_id}: {ex}")
+                        failed.append(tag_id)
+
+                for tbl_name, group in narrow.items():
+                    try:
+                        async with conn.transaction():
+                            if group["unique"]:
+                                await self._upsert_tag_data(
+                                    conn, tbl_name, group["valueType"],
+                                    group["records"], narrow=True
+                                )
+                            else:
+                                await conn.copy_records_to_table(
+                                    tbl_name,
+                                    records=group["records"],
+                                    columns=('tag_id', 'x', 'y', 'q'))
+                        # в общих таблицах с уникальным индексом
+                        # хранятся теги с prsUpdate = true
+                        rollups.setdefault(
+                            (group["valueType"], group["unique"]), {}
+                        ).update(group["tags"])
+                        self._logger.debug(f"В базу {ds_id} в таблицу {tbl_name} для {len(group['tags'])} тегов записано {len(group['records'])} точек.")
+
+                    except PostgresError as ex:
+                        self._logger.error(f"{self._config.svc_name} :: Ошибка записи данных тегов {list(group['tags'])} в таблицу {tbl_name} базы {ds_id}: {ex}")
+                        failed.extend(group["tags"].keys())
+
+                for (value_type, update), rollup_tags in rollups.items():
+                    await self._update_rollups(conn, value_type, update, rollup_tags)
+
+        return failed
+
+    async def _upsert_tag_data(
+            self, conn: apg.Connection, tag_tbl: str, value_type: int,
+            data: List[tuple], narrow: bool = False) -> None:
+        """Запись данных тегов с ``prsUpdate`` = true в таблицу с уникальным
+        индексом по метке времени: COPY во временную таблицу и
+        INSERT ... ON CONFLICT DO UPDATE.
+        Выполняется внутри транзакции.
 
-        except Exception as ex:
-            self._logger.error(f"{self._config.svc_name} :: Ошибка записи данных в базу {ds_id}: {ex}")
+        Args:
+            conn (apg.Connection): соединение с базой
+            tag_tbl (str): таблица тега или общая таблица
+            value_type (int): код типа значений тега
+            data (List[tuple]): данные тега [(y, x, q)] либо, для общей
+                таблицы, данные тегов [(tag_id, x, y, q)]
+            narrow (bool): запись в общую таблицу
+        """
+        # из нескольких значений с одной меткой времени в пачке
+        # остаётся записанное последним
+        unique = {}
+        if narrow:
+            for item in data:
+                unique[(item[0], item[1])] = item
+            columns = ('tag_id', 'x', 'y', 'q')
+            key = 'tag_id, x'
+        else:
+            for item in data:
+                unique[item[1]] = item
+            columns = ('y', 'x', 'q')
+            key = 'x'
+        data = list(unique.values())
+
+        tmp_tbl = f"_prs_upsert_{('', 'n_')[narrow]}{value_type}"
+        tag_column = ('', '"tag_id" text, ')[narrow]
+        await conn.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS "{tmp_tbl}" ('
+            f'{tag_column}"x" bigint, "y" {self._sql_value_type(value_type)}, "q" int) '
+            f'ON COMMIT DELETE ROWS'
+        )
+        await conn.copy_records_to_table(
+            tmp_tbl, records=data, columns=columns
+        )
+        await conn.execute(
+            f'INSERT INTO "{tag_tbl}" ({key}, y, q) SELECT {key}, y, q FROM "{tmp_tbl}" '
+            f'ON CONFLICT ({key}) DO UPDATE SET y = EXCLUDED.y, q = EXCLUDED.q;'
+            f'TRUNCATE "{tmp_tbl}";'
+        )
 
     async def _prepare_alert_data(self, alert_id: str, ds_id: str) -> dict | None:
         get_alert_data = {
@@ -494,7 +1488,26 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
         Args:
             config (dict): _description_
         """
-        return await apg.create_pool(dsn=config["dsn"])
+        return await apg.create_pool(
+            dsn=config["dsn"], init=self._init_connection,
+            min_size=min(10, self._config.db_pool_size),
+            max_size=self._config.db_pool_size,
+            statement_cache_size=self._config.statement_cache_size
+        )
+
+    async def _init_connection(self, conn: apg.Connection) -> None:
+        """Настройка нового соединения пула: значения jsonb передаются
+        в бинарном формате и кодируются/декодируются сразу в объекты Python,
+        поэтому при записи и чтении данных json-тегов не требуется
+        преобразование каждого значения.
+        """
+        await conn.set_type_codec(
+            'jsonb',
+            encoder=_jsonb_encoder,
+            decoder=_jsonb_decoder,
+            schema='pg_catalog',
+            format='binary'
+        )
 
     async def _unlink_alert(self, mes: dict, routing_key: str = None) -> None:
         """_summary_
@@ -561,11 +1574,9 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
             self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} не привязан к хранилищу {ds_id}")
             return
 
-        table_name = json.loads(res[0][2]["prsStore"][0])["table"]
+        store = json.loads(res[0][2]["prsStore"][0])
         async with self._connection_pools[ds_id].acquire() as conn:
-            await conn.execute(
-                f'drop table if exists "{table_name}"'
-            )
+            await self._drop_tag_data(conn, ds_id, tag_id, store)
 
         await self._bind_tag(tag_id, False)
         index = await self._cache.index(f"{ds_id}.{self._config.svc_name}", "tags", tag_id).exec()
@@ -573,83 +1584,413 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
 
         self._logger.info(f"{self._config.svc_name} :: Тег {tag_id} отвязан от хранилища {ds_id}.")
 
-    async def _read_data(self, tag_id: str, start: int, finish: int,
-        order: int, count: int, one_before: bool, one_after: bool, value: Any = None):
+    async def _get_read_store(self, tag_id: str) -> Tuple[str | None, dict | None]:
+        """Хранилище, из которого читаются данные тега, и prsStore тега в нём.
 
-        actual_ds = None
-        tag_data = await self._cache.get(
-            f"{tag_id}.{self._config.svc_name}",
-            "prsActive", "dss", "prsValueTypeCode"
-        ).exec()
-
-        if not tag_data[0]:
-            self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} отсутствует в кэше.")
-            
-            return []
-        if not tag_data[0]["prsActive"]:
-            self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} неактивен.")
-            
-            return []
-
-        # если тег привязан к нескольким хранилищам, пока непонятна логика
-        # из какого хранилища брать данные.
-        # пока будем брать из первого активного
-        for ds_id in tag_data[0]["dss"].keys():
-            ds_res = await self._cache.get(
-                f"{ds_id}.{self._config.svc_name}",
-                "prsActive"
-            ).exec()
-            if ds_res[0] is None:
+        Args:
+            tag_id (str): id тега
+
+        Returns:
+            Tuple[str | None, dict | None]: (id хранилища, prsStore) или
+            (None, None), если данные тега прочитать нельзя
+        """
+        stores = await self._get_read_stores([tag_id])
+        ds_id, store, _ = stores.get(tag_id, (None, None, None))
+        return ds_id, store
+
+    async def _get_read_stores(self, tag_ids: List[str]) -> dict:
+        """Хранилища, из которых читаются данные тегов.
+        Кэш тегов и кэш их хранилищ читаются по одному запросу.
+
+        Args:
+            tag_ids (List[str]): id тегов
+
+        Returns:
+            dict: {"<tag_id>": (<id хранилища>, <prsStore>, <prsValueTypeCode>)};
+            теги, данные которых прочитать нельзя, в словарь не входят
+        """
+        pipe = self._cache
+        for tag_id in tag_ids:
+            pipe = pipe.get(
+                f"{tag_id}.{self._config.svc_name}",
+                "prsActive", "dss", "prsValueTypeCode"
+            )
+        tags_data = await pipe.exec()
+
+        ds_ids = []
+        for tag_id, tag_data in zip(tag_ids, tags_data):
+            if not tag_data:
+                self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} отсутствует в кэше.")
+                continue
+            if not tag_data["prsActive"]:
+                self._logger.error(f"{self._config.svc_name} :: Тег {tag_id} неактивен.")
+                continue
+            ds_ids += [ds_id for ds_id in tag_data["dss"].keys() if ds_id not in ds_ids]
+
+        ds_active = {}
+        if ds_ids:
+            pipe = self._cache
+            for ds_id in ds_ids:
+                pipe = pipe.get(f"{ds_id}.{self._config.svc_name}", "prsActive")
+            for ds_id, ds_res in zip(ds_ids, await pipe.exec()):
+                if ds_res is None:
+                    self._logger.error(
+                        f"{self._config.svc_name} :: Хранилище {ds_id} отсутствует в кэше."
+                    )
+                ds_active[ds_id] = bool(ds_res)
+
+        stores = {}
+        for tag_id, tag_data in zip(tag_ids, tags_data):
+            if not tag_data or not tag_data["prsActive"]:
+                continue
+            # если тег привязан к нескольким хранилищам, пока непонятна логика
+            # из какого хранилища брать данные.
+            # пока будем брать из первого активного
+            actual_ds = next(
+                (ds_id for ds_id in tag_data["dss"].keys() if ds_active.get(ds_id)), None
+            )
+            if not actual_ds:
                 self._logger.error(
-                    f"{self._config.svc_name} :: Хранилище {ds_id} отсутствует в кэше."
+                    f"{self._config.svc_name} :: Не найдено актуальное хранилище для тега {tag_id}"
                 )
-            if ds_res[0]:
-                actual_ds = ds_id
-                break
-        
-        if not actual_ds:
-            self._logger.error(
-                f"{self._config.svc_name} :: Не найдено актуальное хранилище для тега {tag_id}"
+                continue
+            stores[tag_id] = (
+                actual_ds, tag_data["dss"][actual_ds], tag_data["prsValueTypeCode"]
             )
-            return []
+        return stores
 
-        conditions = ['TRUE']
-        sql_select = f"SELECT id, x, y, q FROM \"{tag_data[0]['dss'][actual_ds]['table']}\""
+    async def _read_rollup_data(self, tag_id: str, start: int, finish: int,
+        one_before: bool, one_after: bool, resolution: int) -> List[tuple] | None:
+        """Чтение данных тега по агрегатам.
 
-        if start is not None:
-            conditions.append(f'x >= {start}')
-        if finish is not None:
-            conditions.append(f'x <= {finish}')
+        Для интервалов агрегата внутри диапазона возвращаются первая и
+        последняя точки интервала, в качестве точки "перед start" -
+        последняя точка предыдущего непустого интервала. Интервал, в который
+        попадает ``finish``\, и точка "после finish" читаются из исходных
+        данных, поэтому ``finish`` может быть не кратен разрешению.
 
-        value_filter, adapted_value = self._get_values_filter(value)
+        Если в интервалах есть значения null, агрегаты не используются:
+        null разрывает интерполяцию, а его положение внутри интервала
+        агрегаты не сохраняют.
+        """
+        if start is None or finish is None or tag_id in self._rollup_backfill:
+            return None
+
+        ds_id, store = await self._get_read_store(tag_id)
+        if store is None:
+            return None
+        rollup_tbl = (store.get("rollups") or {}).get(str(resolution))
+        if rollup_tbl is None:
+            return None
+
+        res_us = resolution * t.microsec
+        # начало интервала, в который попадает finish
+        tail = finish - finish % res_us
 
+        sql_select = (f'SELECT x, cnt, nulls, first_x, first_y, first_q, last_x, last_y, last_q '
+                      f'FROM "{rollup_tbl}" WHERE tag_id = $1')
         queries = []
-        if one_before and start:
-            queries.append(f'({sql_select} WHERE x < {start} {value_filter} ORDER BY x DESC, id DESC LIMIT 1)')
+        if one_before:
+            queries.append(f'({sql_select} AND x < $2::bigint ORDER BY x DESC LIMIT 1)')
+        queries.append(f'({sql_select} AND x >= $2::bigint AND x < $3::bigint)')
+        query = f'SELECT * FROM ({" UNION ALL ".join(queries)}) as sub ORDER BY sub.x'
 
-        limit_str = ('', f'LIMIT {count}')[isinstance(count, int)]
-        order = ('ASC', 'DESC')[order == Order.CN_DESC]
-        conditions = ' AND '.join(conditions)
+        async with self._connection_pools[ds_id].acquire() as conn:
+            buckets = await conn.fetch(query, tag_id, start, tail)
+
+        tag_data = []
+        for bucket in buckets:
+            if bucket["nulls"]:
+                return None
+            if bucket["x"] >= start:
+                tag_data.append((bucket["first_y"], bucket["first_x"], bucket["first_q"]))
+            if bucket["cnt"] > 1 or bucket["x"] < start:
+                tag_data.append((bucket["last_y"], bucket["last_x"], bucket["last_q"]))
+
+        tail_data = await self._read_data(
+            tag_id, tail, finish, Order.CN_ASC, None, False, one_after
+        )
+        if any(y is None for y, _, _ in tail_data):
+            return None
+
+        return tag_data + tail_data
 
-        queries.append(f'({sql_select} WHERE {conditions} {value_filter} ORDER BY x {order}, id DESC {limit_str})')
+    async def _read_data(self, tag_id: str, start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool, value: Any = None):
 
-        if one_after and finish:
-            queries.append(f'({sql_select} WHERE x > {finish} {value_filter} ORDER BY x ASC, id DESC LIMIT 1)')
+        res = await self._read_data_many(
+            [tag_id], start, finish, order, count, one_before, one_after, value
+        )
+        return res.get(tag_id, [])
+
+    async def _read_data_many(self, tag_ids: List[str], start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool,
+        value: Any = None) -> dict:
+        """Чтение данных нескольких тегов.
+
+        Для тегов одного хранилища с одним типом значений строится один
+        запрос: объединение (UNION ALL) подзапросов по таблицам тегов,
+        для тегов в общей таблице - один просмотр таблицы по списку id
+        тегов. Если таблиц больше ``read_chunk_tables``\, запрос
+        разбивается на несколько запросов (см. :meth:`_read_queries`).
+        Точки "перед start" и "после finish" выбираются для каждого тега
+        отдельно (в общей таблице - через LATERAL). Запросы одного
+        хранилища выполняются через одно соединение, строки результата
+        распределяются по тегам.
 
-        subquery = ' UNION '.join(queries)
-        query_args = [f'SELECT x, y, q FROM ({subquery}) as sub ORDER BY sub.x ASC, id ASC']
-        if adapted_value is not None:
-            query_args += adapted_value
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]} - данные каждого тега
+            упорядочены по возрастанию метки времени
+        """
+        stores = await self._get_read_stores(tag_ids)
 
-        records = []
-        async with self._connection_pools[actual_ds].acquire() as conn:
-            async with conn.transaction():
-                async for r in conn.cursor(*query_args):
-                    val = r.get('y')
-                    if tag_data[0]["prsValueTypeCode"] == 4:
-                        val = json.loads(val)
-                    records.append((val, r.get('x'), r.get('q')))
-        return records
+        # {"<ds_id>": {<код типа значений>: [(tag_id, prsStore)]}}
+        groups = {}
+        for tag_id, (ds_id, store, value_type) in stores.items():
+            groups.setdefault(ds_id, {}).setdefault(value_type, []).append((tag_id, store))
+
+        res = {tag_id: [] for tag_id in tag_ids}
+        for ds_id, ds_groups in groups.items():
+            async with self._connection_pools[ds_id].acquire() as conn:
+                for tags in ds_groups.values():
+                    for query_args in self._read_queries(
+                        tags, start, finish, order, count, one_before, one_after, value
+                    ):
+                        for r in await conn.fetch(*query_args):
+                            res[r["tag_id"]].append((r["y"], r["x"], r["q"]))
+        return res
+
+    async def _read_grid_data_many(self, tag_ids: List[str], start: int,
+        finish: int, time_step: int) -> dict:
+        """Чтение точек, окружающих метки временного ряда.
+
+        Ряд строится в запросе функцией generate_series, для каждой
+        метки две точки выбираются по индексу (LATERAL). Используется, если
+        длина ряда не больше ``resample_max_points``\.
+
+        Returns:
+            dict: {"<tag_id>": [(y, x, q)]}
+        """
+        max_points = self._config.resample_max_points
+        if not max_points or (finish - start) // time_step + 1 > max_points:
+            return {}
+
+        stores = await self._get_read_stores(tag_ids)
+
+        groups = {}
+        for tag_id, (ds_id, store, value_type) in stores.items():
+            groups.setdefault(ds_id, {}).setdefault(value_type, []).append((tag_id, store))
+
+        res = {tag_id: [] for tag_id in stores.keys()}
+        for ds_id, ds_groups in groups.items():
+            async with self._connection_pools[ds_id].acquire() as conn:
+                for tags in ds_groups.values():
+                    for query_args in self._grid_queries(tags, start, finish, time_step):
+                        for r in await conn.fetch(*query_args):
+                            res[r["tag_id"]].append((r["y"], r["x"], r["q"]))
+        return res
+
+    def _chunk_queries(self, units: List[tuple], args: list) -> List[list]:
+        """Объединение подзапросов по таблицам в запросы, в каждом из
+        которых не больше ``read_chunk_tables`` таблиц.
+
+        Таблицы упорядочиваются по имени, поэтому одинаковый набор таблиц
+        всегда разбивается на одинаковые запросы, а текст запроса зависит
+        только от таблиц части и вида запроса: id тегов передаются
+        параметрами, список id тегов общей таблицы - одним параметром-массивом.
+
+        Args:
+            units (List[tuple]): [(<имя таблицы>, <id тега или список id>,
+                <функция построения подзапросов по номеру параметра id>)]
+            args (list): общие параметры запросов
+
+        Returns:
+            List[list]: [[<список подзапросов части>] + <параметры>]
+        """
+        units = sorted(units, key=lambda unit: unit[0])
+        size = self._config.read_chunk_tables or len(units) or 1
+        res = []
+        for i in range(0, len(units), size):
+            chunk_args = list(args)
+            queries = []
+            for _, tags_arg, subqueries in units[i:i + size]:
+                chunk_args.append(tags_arg)
+                queries += subqueries(f'${len(chunk_args)}')
+            res.append([queries] + chunk_args)
+        return res
+
+    def _grid_queries(self, tags: List[Tuple[str, dict]], start: int, finish: int,
+        time_step: int) -> List[list]:
+        """Запросы чтения точек, окружающих метки временного ряда, для тегов
+        с одним типом значений: для каждой метки ряда и для ``finish`` -
+        последняя точка не позже метки и первая точка после неё.
+        Из нескольких точек с одной меткой времени выбирается записанная
+        последней. Точка, окружающая несколько меток ряда, выбирается один раз.
+        Таблицы тегов объединяются в запросы по :meth:`_chunk_queries`\.
+
+        Args:
+            tags (List[Tuple[str, dict]]): [(tag_id, prsStore)]
+
+        Returns:
+            List[list]: тексты запросов с параметрами
+        """
+        # параметры $1-$3 - границы и шаг ряда
+        grid = ('SELECT generate_series($1::bigint, $2::bigint, $3::bigint) AS t '
+                'UNION SELECT $2::bigint')
+
+        def table_queries(tbl_name: str, unique_x: bool):
+            id_order = ('', ', id DESC')[not unique_x]
+            sql_select = (f'SELECT x, y, q, {("id", "0")[unique_x]}::bigint AS ord '
+                          f'FROM "{tbl_name}"')
+            return lambda tags_p: [
+                f'(SELECT {tags_p}::text AS tag_id, d.x, d.y, d.q, d.ord '
+                f'FROM grid CROSS JOIN LATERAL ('
+                f'({sql_select} WHERE x <= grid.t ORDER BY x DESC{id_order} LIMIT 1) UNION ALL '
+                f'({sql_select} WHERE x > grid.t ORDER BY x ASC{id_order} LIMIT 1)) d)'
+            ]
+
+        def narrow_queries(tbl_name: str, unique_x: bool):
+            id_order = ('', ', id DESC')[not unique_x]
+            sql_select = (f'SELECT x, y, q, {("id", "0")[unique_x]}::bigint AS ord '
+                          f'FROM "{tbl_name}" WHERE tag_id = tg.tag_id')
+            return lambda tags_p: [
+                f'(SELECT tg.tag_id, d.x, d.y, d.q, d.ord '
+                f'FROM unnest({tags_p}::text[]) AS tg(tag_id) CROSS JOIN grid '
+                f'CROSS JOIN LATERAL ('
+                f'({sql_select} AND x <= grid.t ORDER BY x DESC{id_order} LIMIT 1) UNION ALL '
+                f'({sql_select} AND x > grid.t ORDER BY x ASC{id_order} LIMIT 1)) d)'
+            ]
+
+        units = []
+        narrow = {}
+        for tag_id, store in tags:
+            if store.get("layout") == CN_LAYOUT_NARROW:
+                narrow.setdefault(
+                    store["table"], (bool(store.get("uniqueX")), [])
+                )[1].append(tag_id)
+                continue
+            units.append((
+                store["table"], tag_id,
+                table_queries(store["table"], bool(store.get("uniqueX")))
+            ))
+        for tbl_name, (unique_x, tbl_tags) in narrow.items():
+            units.append((tbl_name, tbl_tags, narrow_queries(tbl_name, unique_x)))
+
+        res = []
+        for queries, *args in self._chunk_queries(units, [start, finish, time_step]):
+            subquery = ' UNION ALL '.join(queries)
+            res.append([
+                f'WITH grid AS ({grid}) '
+                f'SELECT DISTINCT tag_id, y, x, q, ord FROM ({subquery}) as sub '
+                f'ORDER BY tag_id, x ASC, ord ASC'
+            ] + args)
+        return res
+
+    def _read_queries(self, tags: List[Tuple[str, dict]], start: int, finish: int,
+        order: int, count: int, one_before: bool, one_after: bool,
+        value: Any = None) -> List[list]:
+        """Запросы чтения данных тегов с одним типом значений: объединение
+        (UNION ALL) подзапросов по таблицам тегов и общим таблицам,
+        не больше ``read_chunk_tables`` таблиц в запросе
+        (см. :meth:`_chunk_queries`).
+
+        Id тегов, метки времени и количество точек передаются параметрами,
+        поэтому при повторном чтении тех же тегов подготовленные операторы
+        берутся из кэша соединения.
+
+        Args:
+            tags (List[Tuple[str, dict]]): [(tag_id, prsStore)]
+
+        Returns:
+            List[list]: тексты запросов с параметрами; строки результата
+            каждого запроса упорядочены по тегу и метке времени
+        """
+        # параметры границ диапазона и id тегов следуют за параметрами
+        # фильтра значений
+        value_filter, adapted_value = self._get_values_filter(value)
+        args = list(adapted_value or [])
+
+        def param(val: Any) -> str:
+            args.append(val)
+            return f'${len(args)}::bigint'
+
+        # секции вне диапазона исключаются при выполнении запроса
+        start_p = None if start is None else param(start)
+        finish_p = None if finish is None else param(finish)
+        conditions = ['TRUE']
+        if start is not None:
+            conditions.append(f'x >= {start_p}')
+        if finish is not None:
+            conditions.append(f'x <= {finish_p}')
+        conditions = ' AND '.join(conditions)
+
+        limit_str = f'LIMIT {param(count)}' if isinstance(count, int) else ''
+        order = ('ASC', 'DESC')[order == Order.CN_DESC]
+
+        def table_queries(tbl_name: str, unique_x: bool):
+            # в таблицах с уникальным индексом по метке времени не может быть
+            # нескольких значений на одну метку, сортировка по id не нужна
+            id_order = ('', ', id DESC')[not unique_x]
+
+            def build(tags_p: str) -> List[str]:
+                sql_select = (f'SELECT {tags_p}::text AS tag_id, x, y, q, '
+                              f'{("id", "0")[unique_x]}::bigint AS ord '
+                              f'FROM "{tbl_name}"')
+                queries = []
+                if one_before and start:
+                    queries.append(f'({sql_select} WHERE x < {start_p} {value_filter} ORDER BY x DESC{id_order} LIMIT 1)')
+                queries.append(f'({sql_select} WHERE {conditions} {value_filter} ORDER BY x {order}{id_order} {limit_str})')
+                if one_after and finish:
+                    queries.append(f'({sql_select} WHERE x > {finish_p} {value_filter} ORDER BY x ASC{id_order} LIMIT 1)')
+                return queries
+            return build
+
+        def narrow_queries(tbl_name: str, unique_x: bool):
+            id_order = ('', ', id DESC')[not unique_x]
+            ord_col = f'{("id", "0")[unique_x]}::bigint AS ord'
+
+            def build(tags_p: str) -> List[str]:
+                sql_lateral = (f'SELECT t.tag_id, d.x, d.y, d.q, d.ord '
+                               f'FROM unnest({tags_p}::text[]) AS t(tag_id) CROSS JOIN LATERAL '
+                               f'(SELECT x, y, q, {ord_col} FROM "{tbl_name}" WHERE tag_id = t.tag_id')
+                queries = []
+                if one_before and start:
+                    queries.append(f'({sql_lateral} AND x < {start_p} {value_filter} ORDER BY x DESC{id_order} LIMIT 1) d)')
+                if limit_str:
+                    # ограничение количества точек - для каждого тега отдельно
+                    queries.append(f'({sql_lateral} AND {conditions} {value_filter} ORDER BY x {order}{id_order} {limit_str}) d)')
+                else:
+                    queries.append(f'(SELECT tag_id, x, y, q, {ord_col} FROM "{tbl_name}" '
+                                   f'WHERE tag_id = ANY({tags_p}::text[]) AND {conditions} {value_filter})')
+                if one_after and finish:
+                    queries.append(f'({sql_lateral} AND x > {finish_p} {value_filter} ORDER BY x ASC{id_order} LIMIT 1) d)')
+                return queries
+            return build
+
+        units = []
+        narrow = {}
+        for tag_id, store in tags:
+            if store.get("layout") == CN_LAYOUT_NARROW:
+                narrow.setdefault(
+                    store["table"], (bool(store.get("uniqueX")), [])
+                )[1].append(tag_id)
+                continue
+            units.append((
+                store["table"], tag_id,
+                table_queries(store["table"], bool(store.get("uniqueX")))
+            ))
+        for tbl_name, (unique_x, tbl_tags) in narrow.items():
+            units.append((tbl_name, tbl_tags, narrow_queries(tbl_name, unique_x)))
+
+        res = []
+        for queries, *chunk_args in self._chunk_queries(units, args):
+            # подзапросы выбирают непересекающиеся диапазоны меток времени,
+            # поэтому объединяются без устранения дублей
+            subquery = ' UNION ALL '.join(queries)
+            res.append([
+                f'SELECT tag_id, y, x, q FROM ({subquery}) as sub ORDER BY tag_id, x ASC, ord ASC'
+            ] + chunk_args)
+        return res
 
     def _get_values_filter(self, value: Any) -> tuple:
         """ Сериализация значения в SQL-фильтр
@@ -666,7 +2007,7 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
         adapted = []
         if isinstance(value, dict):
             condition = 'AND "y" @> $1'
-            adapted.append(json.dumps(value))
+            adapted.append(value)
         elif not isinstance(value, (list, tuple)):
             condition = 'AND "y" = $1'
             adapted.append(value)
@@ -680,7 +2021,7 @@ class DataStoragesAppPostgreSQL(DataStoragesAppBase):
                     i = 1
                     for val in value:
                         condition = f'{condition} OR "y" @> ${i}'
-                        adapted.append(json.dumps(val))
+                        adapted.append(val)
                         i += 1
                 else:
                     condition = f'{condition} OR "y" = ANY($1)'
@@ -723,5 +2064,15 @@ settings = DataStoragesAppPostgreSQLSettings()
 
 app = DataStoragesAppPostgreSQL(settings=settings, title="DataStoragesAppPostgreSQL")
 
+router = APIRouter(prefix="/metrics")
+
+@router.get(f"/{settings.svc_name}", response_model=dict, status_code=200)
+async def metrics_get():
+    """Метрики работы сервиса: сброс кэша данных в базу и т.д.
+    """
+    return app._metrics_get()
+
+app.include_router(router, tags=["metrics"])
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,145 @@
+"""Модуль содержит класс кэша результатов чтения данных тегов за периоды
+в прошлом.
+
+Результат чтения данных тега за период, закончившийся до момента
+чтения, не меняется, пока в тег не записаны новые данные. Кэш хранит
+такие результаты с вытеснением давно не использованных (LRU) при
+превышении суммарного количества точек.
+
+Результат зависит от точек до окончания периода и от первой точки
+после него. Если при сохранении результата известна точка тега после
+окончания периода (метка последней записанной точки), результат
+удаляется только записью точек не позже этой метки; иначе - любой
+записью в тег.
+
+Кэш учитывает только записи данных через свой экземпляр сервиса,
+поэтому включается (параметр ``result_cache_points`` сервиса хранилища),
+только если данные тегов хранилища записывает и читает один экземпляр
+сервиса.
+"""
+from collections import OrderedDict
+from typing import Hashable, List
+
+class ResultCache:
+    """Кэш результатов чтения данных тегов.
+
+    Args:
+        max_points (int): максимальное суммарное количество точек
+            в кэше; 0 - кэш не используется
+    """
+
+    def __init__(self, max_points: int):
+        self._max_points = max_points
+        # {(tag_id, ключ запроса): (данные, граница)}, где граница - метка
+        # времени, запись точек не позже которой меняет результат;
+        # None - результат меняет любая запись
+        self._entries = OrderedDict()
+        # ключи запросов тегов: {"<tag_id>": {ключ запроса, ...}}
+        self._tag_keys = {}
+        # номер изменения данных тега, см. version/put
+        self._versions = {}
+        # метка времени последней записанной точки тега
+        self._last_x = {}
+        self._points = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_points > 0
+
+    @property
+    def points(self) -> int:
+        return self._points
+
+    @property
+    def entries(self) -> int:
+        return len(self._entries)
+
+    def get(self, tag_id: str, key: Hashable) -> List[tuple] | None:
+        """Результат чтения из кэша.
+
+        Returns:
+            List[tuple] | None: данные тега или None, если результата нет
+        """
+        entry = self._entries.get((tag_id, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((tag_id, key))
+        self.hits += 1
+        return entry[0]
+
+    def version(self, tag_id: str) -> int:
+        """Номер изменения данных тега; запрашивается перед чтением данных
+        из базы и передаётся в :meth:`put`.
+        """
+        return self._versions.get(tag_id, 0)
+
+    def put(self, tag_id: str, key: Hashable, data: List[tuple],
+            finish: int, version: int) -> None:
+        """Сохранение результата чтения.
+        Результат не сохраняется, если во время чтения в тег были записаны
+        данные или результат больше размера кэша.
+
+        Args:
+            tag_id (str): id тега
+            key (Hashable): ключ запроса
+            data (List[tuple]): данные тега
+            finish (int): окончание периода запроса
+            version (int): номер изменения данных тега перед чтением
+        """
+        if version != self.version(tag_id) or len(data) > self._max_points:
+            return
+
+        self._remove(tag_id, key)
+        bound = self._last_x.get(tag_id)
+        if bound is not None and bound <= finish:
+            bound = None
+        self._entries[(tag_id, key)] = (data, bound)
+        self._tag_keys.setdefault(tag_id, set()).add(key)
+        self._points += len(data)
+
+        while self._points > self._max_points:
+            old_tag, old_key = next(iter(self._entries))
+            self._remove(old_tag, old_key)
+
+    def written(self, tag_id: str, first_x: int, last_x: int) -> None:
+        """Учёт записи данных в тег: удаление результатов, которые могли
+        измениться.
+
+        Args:
+            tag_id (str): id тега
+            first_x (int): наименьшая метка времени записанных точек
+            last_x (int): наибольшая метка времени записанных точек
+        """
+        self._versions[tag_id] = self.version(tag_id) + 1
+        self._last_x[tag_id] = max(self._last_x.get(tag_id, last_x), last_x)
+
+        for key in list(self._tag_keys.get(tag_id, ())):
+            bound = self._entries[(tag_id, key)][1]
+            if bound is None or first_x <= bound:
+                self._remove(tag_id, key)
+
+    def invalidate(self, tag_id: str = None) -> None:
+        """Удаление всех результатов тега (``tag_id`` = None - всех тегов).
+        """
+        if tag_id is None:
+            for tag in list(self._versions.keys() | self._tag_keys.keys()):
+                self.invalidate(tag)
+            return
+
+        self._versions[tag_id] = self.version(tag_id) + 1
+        self._last_x.pop(tag_id, None)
+        for key in list(self._tag_keys.get(tag_id, ())):
+            self._remove(tag_id, key)
+
+    def _remove(self, tag_id: str, key: Hashable) -> None:
+        entry = self._entries.pop((tag_id, key), None)
+        if entry is None:
+            return
+        self._points -= len(entry[0])
+        keys = self._tag_keys[tag_id]
+        keys.discard(key)
+        if not keys:
+            self._tag_keys.pop(tag_id)
@@ -62,3 +62,26 @@ class DataStoragesAppVictoriametricsSettings(SvcSettings):
     # данный сервис
     # если коды не указаны, то будут обслуживаться все хранилища заданного типа
     datastorages_id: List[str] = []
+
+    # формат записи данных: "jsonl" - JSON lines (/api/v1/import),
+    # "prometheus" - формат Prometheus (/api/v1/import/prometheus);
+    # адрес импорта можно явно указать в ключе "importUrl"
+    # конфигурации хранилища
+    write_format: str = "jsonl"
+    # количество точек в буфере записи, при достижении которого
+    # буфер отправляется немедленно (и максимальный размер одного запроса)
+    write_batch_size: int = 10000
+    # максимальное время нахождения точек в буфере записи, секунды
+    write_flush_interval: float = 1
+    # количество одновременных запросов записи в одно хранилище
+    write_concurrency: int = 4
+    # количество повторных попыток записи пачки
+    write_retries: int = 3
+    # задержка перед первой повторной попыткой записи, секунды
+    write_retry_delay: float = 0.5
+    # сжимать запросы записи gzip
+    write_gzip: bool = True
+    # количество соединений для чтения данных
+    read_connections: int = 10
+    # время жизни неиспользуемого соединения, секунды
+    keepalive_timeout: float = 30
@@ -4,9 +4,6 @@ import aiohttp
 import numbers
 import copy
 from typing import Any, List, Tuple
-import pandas as pd
-from pandas.api.types import is_numeric_dtype
-import numpy as np
 import time
 
 sys.path.append(".")
@@ -18,6 +15,10 @@ from src.common.consts import (
     Order
 )
 from src.services.dataStorages.app.victoriametrics.dataStorages_app_victoriametrics_settings import DataStoragesAppVictoriametricsSettings
+from src.services.dataStorages.app.victoriametrics.vm_writer import VMWriter, import_url
+from src.services.dataStorages.app.interpolation import interpolate
+from src.services.dataStorages.app.filtering import filter_data
+from src.services.dataStorages.app.formats import to_columns
 
 def linear_interpolated(start_point: Tuple[int, Any],
                         end_point: Tuple[int, Any],
@@ -165,38 +166,17 @@ class DataStoragesAppVictoriametrics(svc.Svc):
                 }
             }
         """
-        async def set_tag_data(payload: dict) -> None:
-            self._logger.info(f"{self._config.svc_name} :: Запись данных тега {payload['tagId']}")
-
+        # точки всех тегов накапливаются в буферах хранилищ и
+        # отправляются пачками (см. VMWriter)
+        for payload in mes["data"]["data"]:
             tag_params = self._tags.get(payload["tagId"])
             if not tag_params:
                 self._logger.error(
                     f"{self._config.svc_name} :: Тег {payload['tagId']} не привязан к хранилищу."
                 )
-                return
-
-            connection = tag_params["ds"]
-            metric = tag_params["metric"]
-            tag_value_type = tag_params["value_type"]
-            update = tag_params["update"]
-            data_items = payload["data"]
-
-            formatted_data = []
-            for item in data_items:
-                y, x, _ = item
-                vm_data_item = {
-                    'metric': metric,
-                    'value': (y, json.dumps(y, ensure_ascii=False))[tag_value_type == 4],
-                    'timestamp': round(x / 1000)
-                }
-                formatted_data.append(vm_data_item)
-
-            resp = await connection["conn"].post(connection["putUrl"], json=formatted_data)
-
-            self._logger.debug(f"Set data status: {resp.status}")
+                continue
 
-        for tag_data in mes["data"]["data"]:
-            await set_tag_data(tag_data)
+            tag_params["ds"]["writer"].add(tag_params["metric"], payload["data"])
 
     # fixed
     async def _prepare_tag_data(self, tag_id: str, ds_id: str) -> dict | None:
@@ -273,10 +253,29 @@ class DataStoragesAppVictoriametrics(svc.Svc):
 
             urls = json.loads(ds[2]["prsJsonConfigString"][0])
 
-            conn = aiohttp.TCPConnector()
+            # общий пул постоянных соединений для чтения и записи
+            conn = aiohttp.TCPConnector(
+                limit=self._config.write_concurrency + self._config.read_connections,
+                keepalive_timeout=self._config.keepalive_timeout
+            )
+            session = aiohttp.ClientSession(connector=conn)
+            writer = VMWriter(
+                session,
+                import_url(urls, self._config.write_format),
+                self._logger,
+                fmt=self._config.write_format,
+                batch_size=self._config.write_batch_size,
+                flush_interval=self._config.write_flush_interval,
+                concurrency=self._config.write_concurrency,
+                retries=self._config.write_retries,
+                retry_delay=self._config.write_retry_delay,
+                compress=self._config.write_gzip
+            )
+            writer.start()
             self._connection_pools[ds[0]] = {
-                "conn": aiohttp.ClientSession(connector=conn),
-                "putUrl": urls["putUrl"],
+                "conn": session,
+                "writer": writer,
+                "putUrl": urls.get("putUrl"),
                 "getUrl": urls["getUrl"]
             }
             self._logger.info(f"{self._config.svc_name} :: Связь с базой данных {ds[0]} установлена.")
@@ -381,6 +380,13 @@ class DataStoragesAppVictoriametrics(svc.Svc):
         except Exception as ex:
             self._logger.error(f"{self._config.svc_name} :: Ошибка связи с базой данных: {ex}")
 
+    async def on_shutdown(self) -> None:
+        for connection in self._connection_pools.values():
+            await connection["writer"].close()
+            await connection["conn"].close()
+
+        await super().on_shutdown()
+
     # fixed
     async def _tag_get(self, mes: dict) -> dict:
         """_summary_
@@ -467,6 +473,8 @@ class DataStoragesAppVictoriametrics(svc.Svc):
                             ]
                             tag_item["data"].append(data_item)
 
+                        if mes["data"].get("columnar"):
+                            tag_item["data"] = to_columns(tag_item["data"])
                         res_data["data"].append(tag_item)
                 else:
                     self._logger.error(f"{self._config.svc_name} :: Ошибка получения данных: {res_json}")
@@ -479,51 +487,14 @@ class DataStoragesAppVictoriametrics(svc.Svc):
     def _filter_data(
             self, tag_data: List[tuple], value: List[Any], tag_type_code: int,
             tag_step: bool) -> List[tuple]:
-        def estimate(x1: int, y1: int | float, x2: int, y2: int | float, y: int | float) -> int:
-            '''
-            Функция принимает на вход две точки прямой и значение, координату X которого возвращает.
-            '''
-            k = (y2 - y1)/(x2 - x1)
-            b = y2 - k * x2
-
-            x = round((y - b) / k)
-
-            return x
-
-
-        res = []
-        if tag_step or tag_type_code not in [0, 1]:
-            for item in tag_data:
-                if tag_type_code == 4:
-                    y = json.loads(item[0])
-                else:
-                    y = item[0]
-                if y in value:
-                    res.append(item)
-        else:
-            for i in range(1, len(tag_data)):
-                y1 = tag_data[i - 1][0]
-                y2 = tag_data[i][0]
-                x1 = tag_data[i - 1][1]
-                x2 = tag_data[i][1]
-                if x1 == x2:
-                    continue
-                if y1 in value:
-                    res.append(tag_data[i - 1])
-                else:
-                    if y1 is None or y2 is None:
-                        continue
-                    for val in value:
-                        if val is None:
-                            continue
-                        if tag_type_code == 0 and isinstance(val, float):
-                            continue
-                        if ((y1 > val and y2 < val) or (y1 < val and y2 > val)):
-                            x = estimate(x1, y1, x2, y2, val)
-                            res.append((val, x, None))
-            if tag_data[-1][0] in value:
-                res.append(tag_data[-1])
-        return res
+        """Фильтрация данных тега по значениям ``value``\.
+        См. :func:`src.services.dataStorages.app.filtering.filter_data`.
+        Значения json-тегов в выборке - строки.
+        """
+        return filter_data(
+            tag_data, value, tag_type_code, tag_step,
+            json_values=tag_type_code == 4
+        )
 
     # fixed
     async def _data_get_interpolated(self,
@@ -544,76 +515,24 @@ class DataStoragesAppVictoriametrics(svc.Svc):
         if not tag_data:
             return [(None, x, None) for x in time_row]
 
-        return self._interpolate(tag_data, time_row)
+        return self._interpolate(tag_data, time_row, tag_cache["step"])
 
     # fixed
-    def _interpolate(self, raw_data: List[tuple], time_row: List[int]) -> List[tuple]:
-        """ Получение линейно интерполированных значений для ряда ``time_row`` по
-        действительным значениям из БД (``raw_data``\)
-
-        :param raw_data: Реальные значения из БД
-        :type raw_data: List[Dict]
+    def _interpolate(self, raw_data: List[tuple], time_row: List[int],
+                     step: bool = False) -> List[tuple]:
+        """ Получение значений для ряда ``time_row`` по
+        действительным значениям из БД (``raw_data``\).
+        См. :func:`src.services.dataStorages.app.interpolation.interpolate`.
 
-        :param time_row: Временной ряд, для которого надо рассчитать значения
-        :type time_row: List[int]
+        Args:
+            raw_data (List[tuple]): реальные значения из БД
+            time_row (List[int]): временной ряд, для которого надо рассчитать значения
+            step (bool): ступенчатый тег
 
-        :return:
-        :rtype: List[Dict]
+        Returns:
+            List[tuple]: точки ``(y, x, q)``
         """
-
-        # Разбиение списка ``raw_data`` на подсписки по значению None
-        # Если ``raw_data`` не имеет None, получается список [raw_data]
-        none_indexes = [idx for idx, val in enumerate(raw_data) if val[0] is None]
-        size = len(raw_data)
-        if none_indexes:
-            splitted_by_none = [raw_data[i: j+1] for i, j in
-                zip([0] + none_indexes, none_indexes +
-                ([size] if none_indexes[-1] != size else []))]
-        else:
-            splitted_by_none = [raw_data]
-
-        data = []  # Результирующий список
-        for period in splitted_by_none:
-            if len(period) == 1:
-                continue
-
-            key_x = lambda d: d[1]
-            min_ts = min(period, key=key_x)[1]
-            max_ts = max(period, key=key_x)[1]
-            is_last_period = period == splitted_by_none[-1]
-
-            # В каждый подсписок добавляются значения из ряда ``time_row``
-            period = [(None , ts, None) \
-                      for ts in time_row if min_ts <= ts < max_ts] + period
-            period.sort(key=key_x)
-
-            if not is_last_period:
-                period.pop()
-
-            # Расширенный подсписок заворачивается в DataFrame и индексируется по 'x'
-            df = pd.DataFrame(
-                period,
-                index=[r[1] for r in period]
-            ).drop_duplicates(subset=1, keep='last')
-
-            # линейная интерполяция значений 'y' в датафрейме для числовых тэгов
-            # заполнение NaN полей ближайшими не-NaN для нечисловых тэгов
-            df[[1, 0]] = df[[1, 0]].interpolate(
-                method=('pad', 'index')[is_numeric_dtype(df[0])]
-            )
-
-            # None-значения 'q' заполняются ближайшим не-None значением сверху
-            df[2].fillna(method='ffill', inplace=True)
-
-            # Удаление из датафрейма всех элементов, чьи 'x' не принадлежат ``time_row``
-            df = df.loc[df[1].isin(time_row)]
-            df[[0, 2]] = df[[0, 2]].replace({np.nan: None})
-
-            # Преобразование получившегося датафрейма и добавление значений к
-            # результирующему списку
-            data += list(df.to_dict('index').values())
-
-        return data
+        return interpolate(raw_data, time_row, step)
 
     # fixed
     def _timestep_row(self,
@@ -0,0 +1,231 @@
+"""Модуль содержит класс буферизованной записи данных в VictoriaMetrics.
+
+Точки всех тегов накапливаются в буфере и отправляются пачками
+в формате импорта VictoriaMetrics (JSON lines - ``/api/v1/import`` или
+формат Prometheus - ``/api/v1/import/prometheus``), сжатыми gzip.
+Пачки отправляются через общую сессию aiohttp с пулом постоянных
+соединений, количество одновременных запросов ограничено.
+"""
+import gzip
+import json
+import asyncio
+import numbers
+from typing import Any, List, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# форматы импорта данных
+CN_FORMAT_JSONL = "jsonl"
+CN_FORMAT_PROMETHEUS = "prometheus"
+
+_IMPORT_PATHS = {
+    CN_FORMAT_JSONL: "/api/v1/import",
+    CN_FORMAT_PROMETHEUS: "/api/v1/import/prometheus"
+}
+
+def import_url(config: dict, fmt: str) -> str:
+    """Адрес импорта данных хранилища.
+    Берётся из ключа ``importUrl`` конфигурации хранилища, иначе
+    строится по адресу чтения данных (``getUrl``).
+
+    Args:
+        config (dict): prsJsonConfigString хранилища
+        fmt (str): формат импорта
+
+    Returns:
+        str: адрес импорта
+    """
+    if config.get("importUrl"):
+        return config["importUrl"]
+    url = urlsplit(config["getUrl"])
+    return f"{url.scheme}://{url.netloc}{_IMPORT_PATHS[fmt]}"
+
+class VMWriter:
+    """Буферизованная запись данных в VictoriaMetrics.
+
+    Args:
+        session (aiohttp.ClientSession): сессия с пулом соединений к хранилищу
+        url (str): адрес импорта данных
+        logger: логгер сервиса
+        fmt (str): формат импорта: "jsonl" или "prometheus"
+        batch_size (int): количество точек в буфере, при достижении
+            которого буфер отправляется немедленно; также максимальное
+            количество точек в одном запросе
+        flush_interval (float): максимальное время нахождения точек
+            в буфере, секунды
+        concurrency (int): количество одновременных запросов
+        retries (int): количество повторных попыток отправки пачки
+        retry_delay (float): задержка перед первой повторной попыткой,
+            секунды; каждая следующая задержка вдвое больше
+        compress (bool): сжимать ли тело запроса gzip
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, logger,
+                 fmt: str = CN_FORMAT_JSONL, batch_size: int = 10000,
+                 flush_interval: float = 1., concurrency: int = 4,
+                 retries: int = 3, retry_delay: float = 0.5,
+                 compress: bool = True):
+        self._session = session
+        self._url = url
+        self._logger = logger
+        self._fmt = fmt
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._compress = compress
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # буфер: {"<метрика>": ([<метки времени, мс>], [<значения>])}
+        self._buffer = {}
+        self._buffered = 0
+        self._flush_event = asyncio.Event()
+        self._task = None
+        # признак остановки периодической отправки
+        self._closing = False
+
+    def add(self, metric: str, data: List[Tuple[Any, int, Any]]) -> None:
+        """Добавление точек тега в буфер.
+        VictoriaMetrics хранит только числовые значения, точки с
+        нечисловыми значениями (строки, json, null) отбрасываются
+        с записью в лог.
+
+        Args:
+            metric (str): имя метрики
+            data (List[Tuple[Any, int, Any]]): точки [(y, x, q)], x - микросекунды
+        """
+        timestamps, values = self._buffer.setdefault(metric, ([], []))
+        added = len(values)
+        for y, x, _ in data:
+            if isinstance(y, bool) or not isinstance(y, numbers.Number):
+                continue
+            timestamps.append(round(x / 1000))
+            values.append(y)
+        added = len(values) - added
+        if added < len(data):
+            self._logger.warning(
+                f"Метрика {metric}: отброшено {len(data) - added} точек "
+                f"с нечисловыми значениями."
+            )
+        if not values:
+            self._buffer.pop(metric)
+        self._buffered += added
+        if self._buffered >= self._batch_size:
+            self._flush_event.set()
+
+    def start(self) -> None:
+        """Запуск периодической отправки буфера.
+        """
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Остановка периодической отправки и отправка остатка буфера.
+        Цикл отправки завершается после отправки текущих пачек, поэтому
+        отправляемые в момент остановки данные не теряются.
+        """
+        if self._task is not None:
+            self._closing = True
+            self._flush_event.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Отправка всех накопленных точек.
+        """
+        if not self._buffer:
+            return
+        buffer, self._buffer, self._buffered = self._buffer, {}, 0
+        await asyncio.gather(*[
+            self._send(batch) for batch in self._split(buffer)
+        ])
+
+    async def _flush_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            if self._closing:
+                return
+            try:
+                await self.flush()
+            except Exception as ex:
+                self._logger.error(f"Ошибка записи данных в {self._url}: {ex}")
+
+    def _split(self, buffer: dict) -> List[dict]:
+        """Разбиение буфера на пачки не более ``batch_size`` точек.
+        """
+        batches = []
+        batch, size = {}, 0
+        for metric, (timestamps, values) in buffer.items():
+            pos = 0
+            while pos < len(values):
+                part = min(len(values) - pos, self._batch_size - size)
+                batch[metric] = (timestamps[pos:pos + part], values[pos:pos + part])
+                size += part
+                pos += part
+                if size >= self._batch_size:
+                    batches.append(batch)
+                    batch, size = {}, 0
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _encode(self, batch: dict) -> bytes:
+        """Кодирование пачки в формат импорта и сжатие.
+        """
+        if self._fmt == CN_FORMAT_PROMETHEUS:
+            lines = [
+                f"{metric} {y} {x}"
+                for metric, (timestamps, values) in batch.items()
+                for x, y in zip(timestamps, values)
+            ]
+        else:
+            lines = [
+                json.dumps({
+                    "metric": {"__name__": metric},
+                    "values": values,
+                    "timestamps": timestamps
+                })
+                for metric, (timestamps, values) in batch.items()
+            ]
+        body = "\n".join(lines).encode() + b"\n"
+        if self._compress:
+            body = gzip.compress(body, compresslevel=1)
+        return body
+
+    async def _send(self, batch: dict) -> None:
+        """Отправка пачки с повторными попытками при сетевых ошибках
+        и ответах 429/5xx.
+        """
+        body = await asyncio.get_running_loop().run_in_executor(
+            None, self._encode, batch
+        )
+        headers = {}
+        if self._compress:
+            headers["Content-Encoding"] = "gzip"
+
+        delay = self._retry_delay
+        async with self._semaphore:
+            for attempt in range(self._retries + 1):
+                try:
+                    async with self._session.post(self._url, data=body, headers=headers) as resp:
+                        if resp.status < 300:
+                            return
+                        text = await resp.text()
+                        if resp.status != 429 and resp.status < 500:
+                            self._logger.error(f"Ошибка записи данных в {self._url}: {resp.status} {text}")
+                            return
+                        error = f"{resp.status} {text}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                    error = str(ex)
+
+                if attempt < self._retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+
+        points = sum(len(values) for _, values in batch.values())
+        self._logger.error(f"Не удалось записать {points} точек в {self._url}: {error}")
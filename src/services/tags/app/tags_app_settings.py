@@ -8,3 +8,7 @@ class TagsAppSettings(AppSvcSettings):
         #: класс экзмепляров сущности в иерархии
         "class": "prsTag"
     }
+
+    #: время хранения списков тегов, подчинённых объектам (запрос
+    #: агрегата данных объекта), секунды; 0 - списки не кэшируются
+    object_tags_ttl: int = 60
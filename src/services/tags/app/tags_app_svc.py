@@ -4,6 +4,11 @@
 """
 import sys
 import copy
+import json
+import time
+import asyncio
+import numbers
+from typing import Any, List
 
 try:
     import uvicorn
@@ -13,6 +18,7 @@ except ModuleNotFoundError as _:
 sys.path.append(".")
 
 from src.common.app_svc import AppSvc
+from src.common.hierarchy import CN_SCOPE_SUBTREE
 from src.services.tags.app.tags_app_settings import TagsAppSettings
 
 class TagsApp(AppSvc):
@@ -25,19 +31,196 @@ class TagsApp(AppSvc):
     def __init__(self, settings: TagsAppSettings, *args, **kwargs):
         super().__init__(settings, *args, **kwargs)
 
+        # теги, подчинённые объектам:
+        # {(<id объекта>, <фильтр>): (<момент устаревания>, [tag_id, ...])}
+        self._object_tags_cache = {}
+
     def _add_app_handlers(self):
         self._handlers[f"{self._config.hierarchy['class']}.app_api.data_get.*"] = self.data_get
         self._handlers[f"{self._config.hierarchy['class']}.app_api.data_set.*"] = self.data_set
+        self._handlers[f"{self._config.hierarchy['class']}.app_api.data_aggregate.*"] = self.data_aggregate
+        self._handlers[f"{self._config.hierarchy['class']}.app_api.data_snapshot.*"] = self.data_snapshot
+        self._handlers[f"{self._config.hierarchy['class']}.app_api.data_object_aggregate.*"] = self.data_object_aggregate
 
     async def data_get(self, mes: dict, routing_key: str = None) -> dict:
+        """Чтение данных тегов.
+        Теги группируются по хранилищам, к которым они привязаны: данные
+        тегов одного хранилища запрашиваются одним сообщением, чтобы
+        сервис хранилища прочитал их одним обращением к базе.
+        Сообщения разным хранилищам отправляются одновременно.
+        """
         
         self._logger.debug(f"{self._config.svc_name} :: Data get mes: {mes}")
 
         new_payload = copy.deepcopy(mes)
-        tag_ids = new_payload.pop("tagId")
-        final_res = {
-            "data": []
+        groups = await self._group_tags(new_payload.pop("tagId"))
+
+        if new_payload.get("stream"):
+            return await self._data_get_stream(new_payload, groups)
+
+        return await self._request_groups("data_get", new_payload, groups)
+
+    async def data_aggregate(self, mes: dict, routing_key: str = None) -> dict:
+        """Расчёт агрегатов данных тегов по интервалам.
+        Агрегаты рассчитываются сервисами хранилищ; теги группируются
+        по хранилищам так же, как при чтении данных (см. :meth:`data_get`).
+        """
+        self._logger.debug(f"{self._config.svc_name} :: Data aggregate mes: {mes}")
+
+        new_payload = copy.deepcopy(mes)
+        groups = await self._group_tags(new_payload.pop("tagId"))
+
+        return await self._request_groups("data_aggregate", new_payload, groups)
+
+    async def data_snapshot(self, mes: dict, routing_key: str = None) -> dict:
+        """Значения тегов на одну метку времени (срез).
+        Каждое хранилище получает одно сообщение со всеми своими тегами
+        (см. :meth:`data_get`).
+        """
+        self._logger.debug(f"{self._config.svc_name} :: Data snapshot mes: {mes}")
+
+        new_payload = copy.deepcopy(mes)
+        groups = await self._group_tags(new_payload.pop("tagId"))
+
+        return await self._request_groups("data_snapshot", new_payload, groups)
+
+    async def data_object_aggregate(self, mes: dict, routing_key: str = None) -> dict:
+        """Агрегат данных тегов, подчинённых объекту.
+
+        Теги объекта находятся одним поиском по поддереву объекта
+        (см. :meth:`_object_tags`). Если ``start`` не задан, для каждого тега
+        берётся значение на метку ``finish`` (см. :meth:`data_snapshot`),
+        иначе - агрегат ``tagFunction`` за период (см. :meth:`data_aggregate`);
+        в обоих случаях каждое хранилище получает одно сообщение со всеми
+        своими тегами. Значения тегов объединяются функцией ``function``\.
+
+        Args:
+            mes (dict): {
+                "objectId": str,
+                "filter": dict,
+                "start": int | None,
+                "finish": int,
+                "tagFunction": str,
+                "function": str
+            }
+
+        Returns:
+            dict: {"objectId": str, "value": Any, "count": int}; ``count`` -
+            количество тегов, значения которых вошли в результат; теги,
+            значения которых не получены из-за ошибки, перечисляются
+            в ключе ``errors``: [{"tagId": str, "error": str}]
+        """
+        self._logger.debug(f"{self._config.svc_name} :: Data object aggregate mes: {mes}")
+
+        tag_ids = await self._object_tags(mes["objectId"], mes["filter"])
+        groups = await self._group_tags(tag_ids)
+
+        if mes["start"] is None:
+            res = await self._request_groups(
+                "data_snapshot", {"x": mes["finish"]}, groups
+            )
+            values = [item["data"][0][0] for item in res["data"] if item["data"]]
+        else:
+            res = await self._request_groups(
+                "data_aggregate",
+                {
+                    "start": mes["start"],
+                    "finish": mes["finish"],
+                    # один интервал на весь период
+                    "interval": max(1, mes["finish"] - mes["start"]),
+                    "functions": [mes["tagFunction"]]
+                },
+                groups
+            )
+            values = [
+                item["data"][0][0][mes["tagFunction"]]
+                for item in res["data"] if item["data"]
+            ]
+
+        values = [
+            val for val in values
+            if isinstance(val, numbers.Number) and not isinstance(val, bool)
+        ]
+        result = {
+            "objectId": mes["objectId"],
+            "value": self._combine(values, mes["function"]),
+            "count": len(values)
         }
+        errors = [
+            {"tagId": item["tagId"], "error": item["error"]}
+            for item in res["data"] if "error" in item
+        ]
+        if errors:
+            result["errors"] = errors
+        return result
+
+    def _combine(self, values: List[float], function: str) -> Any:
+        """Объединение значений тегов объекта.
+
+        Args:
+            values (List[float]): числовые значения тегов
+            function (str): "sum", "avg", "min", "max", "count"
+
+        Returns:
+            Any: результат; None, если значений нет
+        """
+        if function == "count":
+            return len(values)
+        if not values:
+            return None
+        match function:
+            case "sum":
+                return sum(values)
+            case "avg":
+                return sum(values) / len(values)
+            case "min":
+                return min(values)
+            case "max":
+                return max(values)
+
+    async def _object_tags(self, object_id: str, tags_filter: dict) -> List[str]:
+        """Теги в поддереве объекта, удовлетворяющие фильтру атрибутов.
+        Результат поиска хранится ``object_tags_ttl`` секунд и сбрасывается
+        при любом изменении тегов.
+
+        Args:
+            object_id (str): id объекта
+            tags_filter (dict): фильтр атрибутов тегов в формате ключа
+                ``filter`` поиска в иерархии
+
+        Returns:
+            List[str]: id тегов
+        """
+        key = (object_id, json.dumps(tags_filter, sort_keys=True))
+        cached = self._object_tags_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        search_filter = copy.deepcopy(tags_filter)
+        search_filter["objectClass"] = [self._config.hierarchy["class"]]
+        res = await self._hierarchy.search({
+            "base": object_id,
+            "filter": search_filter,
+            "scope": CN_SCOPE_SUBTREE,
+            "deref": False,
+            "attributes": ["cn"]
+        })
+        tag_ids = [item[0] for item in res]
+
+        if self._config.object_tags_ttl > 0:
+            self._object_tags_cache[key] = (
+                time.monotonic() + self._config.object_tags_ttl, tag_ids
+            )
+        return tag_ids
+
+    async def _group_tags(self, tag_ids: List[str]) -> List[list]:
+        """Группировка активных тегов по хранилищам, к которым они привязаны.
+
+        Returns:
+            List[list]: группы id тегов
+        """
+        # {"<хранилище>": [tag_id, ...]}
+        groups = {}
         for tag_id in tag_ids:
 
             res = await self._get_tag_cache_key_value(tag_id, "prsActive")
@@ -48,16 +231,114 @@ class TagsApp(AppSvc):
                 self._logger.warning(f"{self._config.svc_name} :: Тег '{tag_id}' неактивен.")
                 continue
 
-            new_payload["tagId"] = [tag_id]
+            res = await self._get_tag_cache_key_value(tag_id, "dataStorage")
+            # тег без привязки к хранилищу запрашивается отдельно
+            ds = (res and res[0]) or tag_id
+            group = groups.setdefault(ds, [])
+            if tag_id not in group:
+                group.append(tag_id)
+
+        return list(groups.values())
 
-            res = await self._post_message(new_payload, reply=True, routing_key=f"{self._config.hierarchy['class']}.app.data_get.{tag_id}")
+    async def _request_groups(self, command: str, payload: dict, groups: List[list]) -> dict:
+        """Отправка запроса ``command`` сервисам хранилищ по группам тегов
+        и объединение ответов.
+
+        Args:
+            command (str): команда сервисам хранилищ (``data_get``\, ``data_aggregate``\,
+                ``data_snapshot``\)
+            payload (dict): запрос без ключа ``tagId``
+            groups (List[list]): группы тегов (см. :meth:`_group_tags`)
+
+        Returns:
+            dict: {"data": [...]} и общий ряд меток времени ``x``\, если он
+            есть в ответах хранилищ; для тегов, хранилища которых не
+            обрабатывают команду (например, VictoriaMetrics не поддерживает
+            ``data_aggregate`` и ``data_snapshot``\), в ``data`` передаётся
+            элемент ``{"tagId": str, "data": [], "error": str}``
+        """
+        final_res = {
+            "data": []
+        }
+
+        async def get_group(group: list) -> dict | None:
+            req = copy.deepcopy(payload)
+            req["tagId"] = group
+            # сообщение получает сервис, обслуживающий хранилище
+            # первого тега группы
+            res = await self._post_message(req, reply=True, routing_key=f"{self._config.hierarchy['class']}.app.{command}.{group[0]}")
             if res is None:
-                self._logger.error(f"{self._config.svc_name} :: Нет обработчика для получения данных тега '{tag_id}'.")
-            else:
-                final_res["data"] += res["data"]
+                self._logger.error(f"{self._config.svc_name} :: Нет обработчика для команды {command} тегов {group}.")
+                error = f"Хранилище тега не поддерживает команду {command}."
+                res = {
+                    "data": [
+                        {"tagId": tag_id, "data": [], "error": error}
+                        for tag_id in group
+                    ]
+                }
+            return res
+
+        results = await asyncio.gather(*[get_group(group) for group in groups])
+
+        # теги, которые сервис хранилища не обслуживает (привязка тега
+        # изменилась), запрашиваются по одному
+        rejected = []
+        for res in results:
+            final_res["data"] += res["data"]
+            rejected += res.get("rejected", [])
+            # общий ряд меток времени (ключ matrix запроса данных)
+            # одинаков в ответах всех хранилищ
+            if "x" in res:
+                final_res["x"] = res["x"]
+        for tag_id in rejected:
+            await self._delete_tag_cache(tag_id)
+        results = await asyncio.gather(*[get_group([tag_id]) for tag_id in rejected])
+        for res in results:
+            final_res["data"] += res["data"]
+            if "x" in res:
+                final_res["x"] = res["x"]
 
         return final_res
 
+    async def _data_get_stream(self, payload: dict, groups: List[list]) -> dict:
+        """Чтение данных тегов с отправкой ответа частями (ключ ``stream``
+        запроса). Части ответов сервисов хранилищ пересылаются отправителю
+        запроса по мере поступления; группы тегов запрашиваются по очереди.
+        """
+        async def stream_group(group: list) -> list | None:
+            req = copy.deepcopy(payload)
+            req["tagId"] = group
+            rejected = []
+            received = False
+            async for chunk in self._post_message_stream(
+                req, routing_key=f"{self._config.hierarchy['class']}.app.data_get.{group[0]}"
+            ):
+                received = True
+                if chunk.get("data"):
+                    if not await self._post_chunk({"data": chunk["data"]}):
+                        # получатель не принимает части ответа: запрос
+                        # к хранилищу прерывается, хранилище прекращает
+                        # отправку частей по истечении stream_chunk_timeout
+                        return None
+                rejected += chunk.get("rejected", [])
+            if not received:
+                self._logger.error(f"{self._config.svc_name} :: Нет обработчика для получения данных тегов {group}.")
+            return rejected
+
+        rejected = []
+        for group in groups:
+            group_rejected = await stream_group(group)
+            if group_rejected is None:
+                return {"data": []}
+            rejected += group_rejected
+        # теги, которые сервис хранилища не обслуживает, запрашиваются по одному
+        for tag_id in rejected:
+            await self._delete_tag_cache(tag_id)
+            if await stream_group([tag_id]) is None:
+                break
+
+        return {"data": []}
+
     async def _get_tag_cache_key_value(self, tag_id: str, key: str):
         # результат возврщаем в виде массива
         # если возвращаем False, это означает, что такого тега нет
@@ -115,16 +396,42 @@ class TagsApp(AppSvc):
             return False
         
         active = res[0][2]["prsActive"][0] == 'TRUE'
-        res = await self._cache.set(name=f"{tag_id}.{self._config.svc_name}", obj={"prsActive": active}).exec()
+
+        # хранилище, к которому привязан тег: узел привязки
+        # "cn=<tag_id>,cn=tags,cn=system,<хранилище>"; по нему теги
+        # группируются при чтении данных
+        links = await self._hierarchy.search({
+            "filter": {
+                "cn": [tag_id],
+                "objectClass": ["prsDatastorageTagData"]
+            },
+            "scope": CN_SCOPE_SUBTREE,
+            "deref": False,
+            "attributes": ["cn"]
+        })
+        data_storage = None
+        if links:
+            data_storage = sorted(link[1].split(",", 1)[1] for link in links)[0]
+
+        res = await self._cache.set(
+            name=f"{tag_id}.{self._config.svc_name}",
+            obj={"prsActive": active, "dataStorage": data_storage}
+        ).exec()
         return res[0]
 
+    async def _created(self, mes: dict, routing_key: str = None):
+        # новый тег может входить в поддерево любого объекта
+        self._object_tags_cache.clear()
+
     async def _updated(self, mes: dict, routing_key: str = None):
         # просто удалим кэш тега
         # при попытке чтения/записи данных кэш будет создан
         await self._delete_tag_cache(mes["id"])
+        self._object_tags_cache.clear()
     
     async def _deleted(self, mes: dict, routing_key: str = None):
         await self._delete_tag_cache(mes["id"])
+        self._object_tags_cache.clear()
 
 settings = TagsAppSettings()
 
@@ -4,6 +4,10 @@ class TagsAppAPISettings(APICRUDSettings):
     #: имя сервиса
     svc_name: str = "tags_app_api"
 
+    #: максимальное количество интервалов в запросе агрегатов
+    #: (/v1/data/aggregate/); 0 - без ограничения
+    aggregate_max_intervals: int = 100000
+
     hierarchy: dict = {
         #: класс экземпляров сущности в
         #: пример: prsTag
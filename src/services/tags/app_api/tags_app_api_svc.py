@@ -6,7 +6,7 @@
 """
 import sys
 import json
-from typing import Any, List, NamedTuple
+from typing import Any, AsyncIterator, Dict, List, Literal, NamedTuple
 from typing_extensions import Annotated
 from pydantic import (
     BaseModel, Field,
@@ -14,6 +14,7 @@ from pydantic import (
 )
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 
 sys.path.append(".")
 
@@ -96,6 +97,18 @@ class DataGet(BaseModel):
         None,
         title="Шаг между соседними значениями."
     )
+    downsample: Literal["lttb", "minmax"] = Field(
+        None,
+        title="Метод прореживания данных при превышении maxCount."
+    )
+    columnar: bool = Field(
+        False,
+        title="Флаг передачи данных тега столбцами {\"y\": [...], \"x\": [...], \"q\": [...]}."
+    )
+    matrix: bool = Field(
+        False,
+        title="Флаг передачи общего ряда меток времени timeStep и столбцов значений тегов на нём."
+    )
 
     @validator('tagId')
     @classmethod
@@ -105,6 +118,16 @@ class DataGet(BaseModel):
         else:
             return v
 
+    @validator('matrix')
+    @classmethod
+    def matrix_needs_time_step(cls, v: bool, values: dict) -> bool:
+        # общий ряд меток времени строится только по timeStep
+        if v and (values.get("timeStep") is None or values.get("actual") or values.get("value") is not None):
+            raise ValueError(
+                "Ключ matrix используется только с ключом timeStep, без ключей actual и value."
+            )
+        return v
+
     @validator('finish')
     @classmethod
     def finish_in_iso_format(cls, v: Any) -> int:
@@ -136,6 +159,169 @@ class DataGet(BaseModel):
             )
 
     validate_id = validator('tagId', allow_reuse=True)(valid_uuid)
+class DataAggregate(BaseModel):
+    # https://giters.com/pydantic/pydantic/issues/6322
+    model_config = ConfigDict(protected_namespaces=())
+
+    tagId: str | list[str] = Field(
+        title="Id или список id тегов"
+    )
+    start: int | str = Field(
+        title="Метка времени начала периода."
+    )
+    finish: int | str = Field(
+        default_factory=t.now_int,
+        title="Метка времени окончания периода."
+    )
+    interval: int = Field(
+        gt=0,
+        title="Длина интервала агрегирования, микросекунды."
+    )
+    functions: List[Literal["min", "max", "avg", "sum", "count", "integral"]] = Field(
+        ["avg"],
+        min_length=1,
+        title="Рассчитываемые агрегаты."
+    )
+    format: bool = Field(
+        False,
+        title="Флаг форматирования меток времени в строку формата ISO8601"
+    )
+
+    @validator('tagId')
+    @classmethod
+    def tagId_list(cls, v: str | list[str]) -> list[str]:
+        if isinstance(v, str):
+            return [v]
+        else:
+            return v
+
+    @validator('start', 'finish')
+    @classmethod
+    def ts_in_iso_format(cls, v: Any) -> int:
+        # метка времени в виде строки должна быть в формате ISO8601
+        try:
+            return t.ts(v)
+        except ValueError as ex:
+            raise ValueError(
+                (
+                    "Метка времени должна быть строкой в формате ISO8601 "
+                    "или целым числом."
+                )
+            )
+
+    @validator('finish')
+    @classmethod
+    def finish_after_start(cls, v: int, values: dict) -> int:
+        if values.get("start") is not None and v < values["start"]:
+            raise ValueError("Окончание периода раньше его начала.")
+        return v
+
+    @validator('interval')
+    @classmethod
+    def intervals_limit(cls, v: int, values: dict) -> int:
+        # количество интервалов ограничено настройкой aggregate_max_intervals
+        if values.get("start") is None or values.get("finish") is None:
+            return v
+        count = -(-(values["finish"] - values["start"]) // v)
+        max_intervals = settings.aggregate_max_intervals
+        if max_intervals and count > max_intervals:
+            raise ValueError(
+                f"Количество интервалов ({count}) больше допустимого ({max_intervals})."
+            )
+        return v
+
+    validate_id = validator('tagId', allow_reuse=True)(valid_uuid)
+class DataSnapshot(BaseModel):
+    # https://giters.com/pydantic/pydantic/issues/6322
+    model_config = ConfigDict(protected_namespaces=())
+
+    tagId: str | list[str] = Field(
+        title="Id или список id тегов"
+    )
+    x: int | str = Field(
+        default_factory=t.now_int,
+        title="Метка времени среза."
+    )
+    format: bool = Field(
+        False,
+        title="Флаг форматирования меток времени в строку формата ISO8601"
+    )
+
+    @validator('tagId')
+    @classmethod
+    def tagId_list(cls, v: str | list[str]) -> list[str]:
+        if isinstance(v, str):
+            return [v]
+        else:
+            return v
+
+    @validator('x')
+    @classmethod
+    def x_in_iso_format(cls, v: Any) -> int:
+        # метка времени в виде строки должна быть в формате ISO8601
+        try:
+            return t.ts(v)
+        except ValueError as ex:
+            raise ValueError(
+                (
+                    "Метка времени должна быть строкой в формате ISO8601, "
+                    "целым числом или отсутствовать."
+                )
+            )
+
+    validate_id = validator('tagId', allow_reuse=True)(valid_uuid)
+class DataObjectAggregate(BaseModel):
+    # https://giters.com/pydantic/pydantic/issues/6322
+    model_config = ConfigDict(protected_namespaces=())
+
+    objectId: str = Field(
+        title="Id объекта"
+    )
+    filter: Dict[str, List[Any]] = Field(
+        {},
+        title="Фильтр атрибутов тегов объекта."
+    )
+    start: int | str = Field(
+        None,
+        title="Метка времени начала периода."
+    )
+    finish: int | str = Field(
+        default_factory=t.now_int,
+        title="Метка времени окончания периода."
+    )
+    tagFunction: Literal["min", "max", "avg", "sum", "count", "integral"] = Field(
+        "avg",
+        title="Агрегат данных каждого тега за период."
+    )
+    function: Literal["sum", "avg", "min", "max", "count"] = Field(
+        "sum",
+        title="Функция объединения значений тегов."
+    )
+
+    @validator('start', 'finish')
+    @classmethod
+    def ts_in_iso_format(cls, v: Any) -> int:
+        if v is None:
+            return
+        # метка времени в виде строки должна быть в формате ISO8601
+        try:
+            return t.ts(v)
+        except ValueError as ex:
+            raise ValueError(
+                (
+                    "Метка времени должна быть строкой в формате ISO8601, "
+                    "целым числом или отсутствовать."
+                )
+            )
+
+    @validator('finish')
+    @classmethod
+    def finish_after_start(cls, v: int, values: dict) -> int:
+        if values.get("start") is not None and v < values["start"]:
+            raise ValueError("Окончание периода раньше его начала.")
+        return v
+
+    validate_id = validator('objectId', allow_reuse=True)(valid_uuid)
 class TagsAppAPI(BaseSvc):
     """Сервис работы с тегами в иерархии.
 
@@ -172,6 +358,11 @@ class TagsAppAPI(BaseSvc):
             return res
 
         if new_payload.format:
+            if "x" in res:
+                # общий ряд меток времени (ключ matrix)
+                res["x"] = [t.int_to_local_timestamp(x) for x in res["x"]]
+                return res
+
             final_res = {
                 "data": []
             }
@@ -179,20 +370,105 @@ class TagsAppAPI(BaseSvc):
             for tag_item in res["data"]:
                 new_tag_item = {
                     "tagId": tag_item["tagId"],
-                    "data": []
+                    "data": self._format_timestamps(tag_item["data"])
                 }
-                for data_item in tag_item["data"]:
-                    new_tag_item["data"].append((
-                        data_item[0],
-                        t.int_to_local_timestamp(data_item[1]),
-                        data_item[2]
-                    ))
                 final_res["data"].append(new_tag_item)
 
             return final_res
 
         return res
 
+    async def data_aggregate(self, mes: DataAggregate) -> dict:
+        """Расчёт агрегатов данных тегов по интервалам.
+        """
+        body = mes.model_dump()
+
+        res = await self._post_message(
+            mes=body, reply=True, routing_key=f"{self._config.hierarchy['class']}.app_api.data_aggregate.*"
+        )
+        # нет подписчика
+        if res is None:
+            res = {"error": {"code": 424, "message": f"Нет обработчика для команды расчёта агрегатов."}}
+            return res
+
+        if mes.format:
+            for tag_item in res["data"]:
+                tag_item["data"] = self._format_timestamps(tag_item["data"])
+
+        return res
+
+    async def data_snapshot(self, mes: DataSnapshot) -> dict:
+        """Значения тегов на одну метку времени (срез).
+        """
+        body = mes.model_dump()
+
+        res = await self._post_message(
+            mes=body, reply=True, routing_key=f"{self._config.hierarchy['class']}.app_api.data_snapshot.*"
+        )
+        # нет подписчика
+        if res is None:
+            res = {"error": {"code": 424, "message": f"Нет обработчика для команды чтения среза данных."}}
+            return res
+
+        if mes.format:
+            for tag_item in res["data"]:
+                tag_item["data"] = self._format_timestamps(tag_item["data"])
+
+        return res
+
+    async def data_object_aggregate(self, mes: DataObjectAggregate) -> dict:
+        """Агрегат данных тегов, подчинённых объекту.
+        """
+        body = mes.model_dump()
+
+        res = await self._post_message(
+            mes=body, reply=True, routing_key=f"{self._config.hierarchy['class']}.app_api.data_object_aggregate.*"
+        )
+        # нет подписчика
+        if res is None:
+            res = {"error": {"code": 424, "message": f"Нет обработчика для команды расчёта агрегата объекта."}}
+
+        return res
+
+    def _format_timestamps(self, data: list | dict) -> list | dict:
+        """Перевод меток времени данных тега в строки ISO8601.
+        Данные могут быть в виде точек ``[[y, x, q]]`` или столбцов
+        ``{"y": [...], "x": [...], "q": [...]}``\.
+        """
+        if isinstance(data, dict):
+            return {
+                **data,
+                "x": [t.int_to_local_timestamp(x) for x in data["x"]]
+            }
+        return [
+            (data_item[0], t.int_to_local_timestamp(data_item[1]), data_item[2])
+            for data_item in data
+        ]
+
+    async def data_get_stream(self, mes: DataGet) -> AsyncIterator[bytes]:
+        """Чтение данных с получением ответа частями.
+        Каждая часть данных тега возвращается отдельной строкой JSON
+        ``{"tagId": str, "data": [...]}`` (NDJSON); части одного тега идут
+        подряд.
+        """
+        body = mes.model_dump()
+        body["stream"] = True
+
+        received = False
+        async for chunk in self._post_message_stream(
+            body, routing_key=f"{self._config.hierarchy['class']}.app_api.data_get.*"
+        ):
+            received = True
+            for tag_item in chunk.get("data", []):
+                if mes.format:
+                    tag_item["data"] = self._format_timestamps(tag_item["data"])
+                yield (json.dumps(tag_item, ensure_ascii=False) + "\n").encode()
+
+        # нет подписчика
+        if not received:
+            res = {"error": {"code": 424, "message": f"Нет обработчика для команды чтения данных."}}
+            yield (json.dumps(res, ensure_ascii=False) + "\n").encode()
+
     async def data_set(self, mes: dict | AllData, routing_key: str = None, error_handler: ErrorHandler = Depends()) -> None:
         try:
             if isinstance(mes, dict):
@@ -249,6 +525,13 @@ async def data_get(q: str | None = None, payload: DataGet | None = None, error_h
        * **finish** (int | str): окончание запрашиваемого периода;
        * **timeStep** (int): шаг в микросекундах между соседними возвращаемыми значениями тега;
        * **maxCount** (int): максимальное количество значений одного тега в ответе на запрос;
+       * **downsample** (str): метод прореживания данных при превышении ``maxCount``\:
+         "lttb" или "minmax";
+       * **columnar** (bool): флаг передачи данных каждого тега столбцами
+         ``{"y": [...], "x": [...], "q": [...]}`` вместо массива точек;
+       * **matrix** (bool): только вместе с ``timeStep``\: ряд меток времени
+         передаётся один раз в ключе ``x`` ответа, данные каждого тега -
+         столбцами значений и кодов качества на этом ряде ``{"y": [...], "q": [...]}``;
        * **value** (any): фильтр на значения тега.
 
     **Ответ:**
@@ -271,6 +554,155 @@ async def data_get(q: str | None = None, payload: DataGet | None = None, error_h
     await error_handler.handle_error(res)
     return res
 
+@router.get("/stream/", status_code=200)
+async def data_get_stream(q: str | None = None, payload: DataGet | None = None, error_handler: ErrorHandler = Depends()):
+    """
+    Запрос исторических данных с получением ответа частями - для выгрузки
+    данных за большие периоды.
+
+    Параметры запроса те же, что и у запроса ``GET /data/``\.
+
+    **Ответ:**
+
+        Поток строк JSON (``application/x-ndjson``\), каждая строка - часть
+        данных одного тега: ``{"tagId": str, "data": [[y, x, q], ...]}``;
+        части одного тега идут подряд, в порядке возрастания меток времени.
+        Строка может содержать ключ ``excess`` (при указании ``maxCount``\)
+        или ``error`` (ошибка чтения данных тега).
+
+    """
+    if q:
+        try:
+            p = DataGet.model_validate_json(q)
+        except ValueError as ex:
+            res = {"error": {"code": 422, "message": f"Несоответствие входных данных: {ex}"}}
+            await error_handler.handle_error(res)
+    elif payload:
+        p = payload
+    else:
+        return None
+    return StreamingResponse(app.data_get_stream(p), media_type="application/x-ndjson")
+
+@router.get("/aggregate/", response_model=dict | None, status_code=200)
+async def data_aggregate(q: str | None = None, payload: DataAggregate | None = None, error_handler: ErrorHandler = Depends()):
+    """
+    Запрос агрегатов исторических данных по интервалам. Агрегаты
+    рассчитываются в сервисах хранилищ, в ответе передаётся одна точка
+    на каждый интервал.
+
+    **Параметры запроса:**
+
+       * **tagId** (str | [str]): тег или список тегов;
+       * **start** (int | str): начало периода;
+       * **finish** (int | str): окончание периода, по умолчанию - текущий момент;
+       * **interval** (int): длина интервала в микросекундах; период делится
+         на интервалы от ``start``\, последний интервал может быть короче;
+         количество интервалов не больше ``aggregate_max_intervals``
+         (настройка сервиса, по умолчанию 100000);
+       * **functions** ([str]): агрегаты: "min", "max", "avg", "sum", "count",
+         "integral"; по умолчанию - ["avg"];
+       * **format** (bool): флаг перевода меток времени в ответе в формат ISO8601.
+
+    **Ответ:**
+
+        * **data** (list) - данные тегов ``{"tagId": str, "data": [[{"<агрегат>": значение}, x, null]]}``\,
+          где x - начало интервала;
+        * **detail** (str) - пояснение к возникшей ошибке.
+
+    """
+    if q:
+        try:
+            p = DataAggregate.model_validate_json(q)
+        except ValueError as ex:
+            res = {"error": {"code": 422, "message": f"Несоответствие входных данных: {ex}"}}
+            await error_handler.handle_error(res)
+    elif payload:
+        p = payload
+    else:
+        return None
+    res = await app.data_aggregate(p)
+    await error_handler.handle_error(res)
+    return res
+
+@router.get("/snapshot/", response_model=dict | None, status_code=200)
+async def data_snapshot(q: str | None = None, payload: DataSnapshot | None = None, error_handler: ErrorHandler = Depends()):
+    """
+    Запрос значений тегов на одну метку времени (срез) - например, для
+    воспроизведения мнемосхемы по истории. Значения всех тегов одного
+    хранилища читаются одним обращением к базе; значения на текущий
+    момент берутся из памяти сервиса хранилища.
+
+    **Параметры запроса:**
+
+       * **tagId** (str | [str]): тег или список тегов;
+       * **x** (int | str): метка времени среза, по умолчанию - текущий момент;
+       * **format** (bool): флаг перевода меток времени в ответе в формат ISO8601.
+
+    **Ответ:**
+
+        * **data** (list) - значения тегов ``{"tagId": str, "data": [[y, x, q]]}``;
+          значение тега рассчитывается так же, как при запросе данных с одним
+          ключом ``finish``;
+        * **detail** (str) - пояснение к возникшей ошибке.
+
+    """
+    if q:
+        try:
+            p = DataSnapshot.model_validate_json(q)
+        except ValueError as ex:
+            res = {"error": {"code": 422, "message": f"Несоответствие входных данных: {ex}"}}
+            await error_handler.handle_error(res)
+    elif payload:
+        p = payload
+    else:
+        return None
+    res = await app.data_snapshot(p)
+    await error_handler.handle_error(res)
+    return res
+
+@router.get("/object_aggregate/", response_model=dict | None, status_code=200)
+async def data_object_aggregate(q: str | None = None, payload: DataObjectAggregate | None = None, error_handler: ErrorHandler = Depends()):
+    """
+    Запрос агрегата данных тегов, подчинённых объекту, - например,
+    суммарной мощности всех счётчиков объекта. Теги объекта находятся
+    платформой, в ответе передаётся одно значение.
+
+    **Параметры запроса:**
+
+       * **objectId** (str): id объекта; учитываются теги во всём поддереве объекта;
+       * **filter** (dict): фильтр атрибутов тегов, например
+         ``{"prsMeasureUnits": ["кВт"]}``; значения атрибута объединяются
+         операцией ``или``\, атрибуты - операцией ``и``;
+       * **start** (int | str): начало периода; если не задан, берутся
+         значения тегов на метку ``finish``;
+       * **finish** (int | str): окончание периода, по умолчанию - текущий момент;
+       * **tagFunction** (str): агрегат данных каждого тега за период:
+         "min", "max", "avg", "sum", "count", "integral"; по умолчанию - "avg";
+       * **function** (str): функция объединения значений тегов:
+         "sum", "avg", "min", "max", "count"; по умолчанию - "sum".
+
+    **Ответ:**
+
+        * **objectId** (str) - id объекта;
+        * **value** (any) - результат; null, если у тегов нет числовых значений;
+        * **count** (int) - количество тегов, значения которых вошли в результат;
+        * **detail** (str) - пояснение к возникшей ошибке.
+
+    """
+    if q:
+        try:
+            p = DataObjectAggregate.model_validate_json(q)
+        except ValueError as ex:
+            res = {"error": {"code": 422, "message": f"Несоответствие входных данных: {ex}"}}
+            await error_handler.handle_error(res)
+    elif payload:
+        p = payload
+    else:
+        return None
+    res = await app.data_object_aggregate(p)
+    await error_handler.handle_error(res)
+    return res
+
 @router.post("/", status_code=200)
 async def data_set(payload: AllData, error_handler: ErrorHandler = Depends()):
     """Запись исторических данных тега.
@@ -0,0 +1,72 @@
+"""Сравнение формата передачи данных тегов: массив точек ``[[y, x, q]]``
+и столбцы ``{"y": [...], "x": [...], "q": [...]}`` (ключ запроса
+``columnar``\).
+
+Для 10^3 - 10^6 точек float, int и json-тега выводятся размер ответа
+в JSON и время его подготовки: преобразования точек в столбцы
+в сервисе хранилища, сериализации (json.dumps, как при отправке
+сообщения в брокер) и десериализации (json.loads, как при получении
+ответа).
+
+Запуск (из корня репозитория):
+    python tests/benchmarks/columnar_format.py [повторов]
+"""
+import sys
+import json
+import time
+import random
+
+sys.path.append(".")
+
+from src.services.dataStorages.app.formats import to_columns
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+def make_data(count: int, kind: str) -> list:
+    x0 = 1_700_000_000_000_000
+    data = []
+    for i in range(count):
+        if kind == "float":
+            y = random.uniform(-100, 100)
+        elif kind == "int":
+            y = random.randint(-100, 100)
+        else:
+            y = {"first_field": random.randint(-100, 100), "second_field": "on"}
+        data.append((y, x0 + i * 1000000, None))
+    return data
+
+def measure(func, repeats: int, *args) -> tuple:
+    best = float("inf")
+    for _ in range(repeats):
+        t1 = time.perf_counter()
+        res = func(*args)
+        best = min(best, time.perf_counter() - t1)
+    return best, res
+
+def rows_reply(data: list) -> bytes:
+    return json.dumps(
+        {"data": [{"tagId": "tag", "data": data}]}, ensure_ascii=False
+    ).encode()
+
+def columns_reply(data: list) -> bytes:
+    return json.dumps(
+        {"data": [{"tagId": "tag", "data": to_columns(data)}]}, ensure_ascii=False
+    ).encode()
+
+def main():
+    repeats = 3
+    if len(sys.argv) > 1:
+        repeats = int(sys.argv[1])
+
+    for kind in ("float", "int", "json"):
+        for count in SIZES:
+            data = make_data(count, kind)
+            for name, func in (("точки", rows_reply), ("столбцы", columns_reply)):
+                t_dump, body = measure(func, repeats, data)
+                t_load, _ = measure(json.loads, repeats, body)
+                print(f"{kind:<5} точек: {count:>7}; {name:<7} "
+                      f"размер: {len(body) / 1024:10.1f} КБ; "
+                      f"подготовка: {t_dump * 1000:8.1f} мс; "
+                      f"разбор: {t_load * 1000:8.1f} мс")
+
+main()
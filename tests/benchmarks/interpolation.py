@@ -0,0 +1,130 @@
+"""Сравнение скорости расчёта значений тега на ряде меток времени:
+прежняя реализация на pandas (датафрейм на каждый период) и реализация
+на numpy из src/services/dataStorages/app/interpolation.py.
+
+Для 10^3 - 10^6 исходных точек (числовой тег с периодами None, ступенчатый
+тег, строковый тег) выводится время обеих реализаций и признак
+совпадения результатов.
+
+Запуск (из корня репозитория):
+    python tests/benchmarks/interpolation.py [повторов]
+"""
+import sys
+import time
+import random
+from typing import List
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+sys.path.append(".")
+
+from src.services.dataStorages.app.interpolation import interpolate
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+# отношение количества исходных точек к количеству меток ряда
+ROW_RATIO = 10
+
+def interpolate_pandas(raw_data: List[tuple], time_row: List[int]) -> List[tuple]:
+    """Прежняя реализация DataStoragesAppBase._interpolate.
+    """
+    none_indexes = [idx for idx, val in enumerate(raw_data) if val[0] is None]
+    size = len(raw_data)
+    if none_indexes:
+        splitted_by_none = [raw_data[i: j+1] for i, j in
+            zip([0] + none_indexes, none_indexes +
+            ([size] if none_indexes[-1] != size else []))]
+    else:
+        splitted_by_none = [raw_data]
+
+    data = []
+    for period in splitted_by_none:
+        if len(period) == 1:
+            continue
+
+        key_x = lambda d: d[1]
+        min_ts = min(period, key=key_x)[1]
+        max_ts = max(period, key=key_x)[1]
+        is_last_period = period == splitted_by_none[-1]
+
+        period = [(None , ts, None) \
+                  for ts in time_row if min_ts <= ts < max_ts] + period
+        period.sort(key=key_x)
+
+        if not is_last_period:
+            period.pop()
+
+        df = pd.DataFrame(
+            period,
+            index=[r[1] for r in period]
+        ).drop_duplicates(subset=1, keep='last')
+
+        df[[1, 0]] = df[[1, 0]].interpolate(
+            method=('pad', 'index')[is_numeric_dtype(df[0])]
+        )
+        df[2] = df[2].ffill()
+
+        df = df.loc[df[1].isin(time_row)]
+        df[[0, 2]] = df[[0, 2]].replace({np.nan: None})
+
+        data += [(r[0], r[1], r[2]) for r in df.to_dict('index').values()]
+
+    return data
+
+def make_data(count: int, kind: str) -> tuple:
+    x0 = 1_700_000_000_000_000
+    data = []
+    for i in range(count):
+        x = x0 + i * 1000000 + random.randint(0, 999999)
+        if kind == "float":
+            y = None if i and i % 1000 == 0 else random.uniform(-100, 100)
+        elif kind == "step":
+            y = random.randint(0, 10)
+        else:
+            y = random.choice(("on", "off", "fault"))
+        data.append((y, x, 0))
+    finish = data[-1][1]
+    step = 1000000 * ROW_RATIO
+    time_row = list(range(x0, finish + 1, step))
+    return data, time_row
+
+def same(res1: List[tuple], res2: List[tuple]) -> bool:
+    if len(res1) != len(res2):
+        return False
+    for (y1, x1, q1), (y2, x2, q2) in zip(res1, res2):
+        if x1 != x2 or q1 != q2:
+            return False
+        if isinstance(y1, float) or isinstance(y2, float):
+            if y1 is None or y2 is None or abs(y1 - y2) > 1e-9:
+                return False
+        elif y1 != y2:
+            return False
+    return True
+
+def measure(func, repeats: int, *args) -> tuple:
+    best = float("inf")
+    for _ in range(repeats):
+        t1 = time.perf_counter()
+        res = func(*args)
+        best = min(best, time.perf_counter() - t1)
+    return best, res
+
+def main():
+    repeats = 3
+    if len(sys.argv) > 1:
+        repeats = int(sys.argv[1])
+
+    for kind in ("float", "step", "str"):
+        for count in SIZES:
+            data, time_row = make_data(count, kind)
+            step = kind == "step"
+            t_pd, res_pd = measure(interpolate_pandas, repeats, data, time_row)
+            t_np, res_np = measure(interpolate, repeats, data, time_row, step)
+            # прежняя реализация не учитывала ступенчатость тега
+            check = "-" if step else ("да" if same(res_pd, res_np) else "НЕТ")
+            print(f"{kind:<5} точек: {count:>7}; ряд: {len(time_row):>6}; "
+                  f"pandas: {t_pd * 1000:9.1f} мс; numpy: {t_np * 1000:8.1f} мс; "
+                  f"ускорение: {t_pd / t_np:6.1f}; совпадение: {check}")
+
+main()
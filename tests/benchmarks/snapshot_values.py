@@ -0,0 +1,98 @@
+"""Сравнение расчёта значений тегов на одну метку времени (срез):
+прежний способ - по одному тегу, как в DataStoragesAppBase._data_get_one,
+и расчёт сразу для всех тегов функцией values_at из
+src/services/dataStorages/app/interpolation.py.
+
+Для 10^3 - 10^5 тегов (точки "не позже метки" и "после метки" каждого
+тега) выводится время обоих способов и признак совпадения результатов.
+Время чтения точек из базы не учитывается.
+
+Запуск (из корня репозитория):
+    python tests/benchmarks/snapshot_values.py [повторов]
+"""
+import sys
+import time
+import random
+from typing import List
+
+sys.path.append(".")
+
+from src.services.dataStorages.app.interpolation import values_at
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5)
+X = 1_700_000_000_000_000
+
+def linear_interpolated(start_point: tuple, end_point: tuple, x: int):
+    x0, y0 = start_point
+    x1, y1 = end_point
+    if y0 == y1 or x0 == x1:
+        return y0
+    return (x-x0)/(x1-x0)*(y1-y0)+y0
+
+def value_one(tag_data: List[tuple], x: int, step: bool, rounded: bool) -> tuple:
+    """Прежний расчёт значения одного тега (DataStoragesAppBase._data_get_one).
+    """
+    tag_data = list(tag_data)
+    if not tag_data:
+        return (None, x, None)
+    x0, y0 = tag_data[0][1], tag_data[0][0]
+    try:
+        x1 = tag_data[1][1]
+        y1 = list(filter(lambda rec: rec[1] == x1, tag_data))[-1][0]
+        if not step:
+            y = linear_interpolated((x0, y0), (x1, y1), x)
+            if rounded:
+                y = round(y)
+            tag_data[0] = (y, tag_data[0][1], tag_data[0][2])
+        tag_data.pop()
+    except IndexError:
+        if x0 > x:
+            tag_data[0] = (None, tag_data[0][1], None)
+    finally:
+        tag_data[0] = (tag_data[0][0], x, tag_data[0][2])
+    return tag_data[0]
+
+def make_tags(count: int) -> tuple:
+    tags_data = []
+    steps = []
+    rounded = []
+    for _ in range(count):
+        is_int = random.random() < 0.3
+        val = (lambda: random.uniform(-100, 100), lambda: random.randint(-100, 100))[is_int]
+        data = [(val(), X - random.randint(0, 10 ** 8), 0)]
+        if random.random() < 0.9:
+            data.append((val(), X + random.randint(1, 10 ** 8), 0))
+        tags_data.append(data)
+        steps.append(random.random() < 0.2)
+        rounded.append(is_int)
+    return tags_data, steps, rounded
+
+def by_one(tags_data: List[list], steps: List[bool], rounded: List[bool]) -> list:
+    return [
+        value_one(data, X, step, flag)
+        for data, step, flag in zip(tags_data, steps, rounded)
+    ]
+
+def measure(func, repeats: int, *args) -> tuple:
+    best = float("inf")
+    for _ in range(repeats):
+        t1 = time.perf_counter()
+        res = func(*args)
+        best = min(best, time.perf_counter() - t1)
+    return best, res
+
+def main():
+    repeats = 3
+    if len(sys.argv) > 1:
+        repeats = int(sys.argv[1])
+
+    for count in SIZES:
+        tags_data, steps, rounded = make_tags(count)
+        t_one, res_one = measure(by_one, repeats, tags_data, steps, rounded)
+        t_all, res_all = measure(values_at, repeats, tags_data, X, steps, rounded)
+        check = "да" if res_one == res_all else "НЕТ"
+        print(f"тегов: {count:>6}; по одному: {t_one * 1000:8.1f} мс; "
+              f"все сразу: {t_all * 1000:7.1f} мс; ускорение: {t_one / t_all:5.1f}; "
+              f"совпадение: {check}")
+
+main()
@@ -0,0 +1,89 @@
+"""Регрессионный замер чтения данных нескольких тегов одним запросом:
+1, 10 и 100 тегов в запросе к работающей платформе (``/v1/data/``).
+
+Для каждого размера запроса выполняется заданное количество запросов
+подряд и несколько запросов одновременно; выводятся медиана, 95-й
+перцентиль и максимум времени ответа, а также количество тегов с ошибкой
+чтения (ключ ``error`` в ответе).
+
+Теги берутся из файла, созданного скриптами tests/prepare_load_tests
+(по умолчанию - tests/prepare_load_tests/tags_in_postgres_100.json).
+
+Запуск (из корня репозитория):
+    python tests/benchmarks/tag_get_fanout.py [url] [файл тегов] [запросов] [одновременно]
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import statistics
+
+import aiohttp
+
+sys.path.append(".")
+
+import src.common.times as t
+
+SIZES = (1, 10, 100)
+
+async def get_data(session: aiohttp.ClientSession, url: str, payload: dict) -> tuple:
+    t1 = time.perf_counter()
+    async with session.get(url, json=payload) as resp:
+        res = await resp.json()
+    elapsed = time.perf_counter() - t1
+    errors = sum(1 for item in res.get("data", []) if "error" in item)
+    return elapsed, errors
+
+async def run(session: aiohttp.ClientSession, url: str, ids: list, size: int,
+              requests: int, parallel: int) -> None:
+    finish = t.now_int()
+    payload = {
+        "start": finish - 3600 * t.microsec,
+        "finish": finish,
+        "timeStep": 60 * t.microsec
+    }
+
+    latencies = []
+    errors = 0
+    for _ in range(0, requests, parallel):
+        results = await asyncio.gather(*[
+            get_data(session, url, {**payload, "tagId": random.sample(ids, size)})
+            for _ in range(parallel)
+        ])
+        for elapsed, tag_errors in results:
+            latencies.append(elapsed)
+            errors += tag_errors
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"Тегов: {size:>3}; запросов: {len(latencies)}; "
+          f"медиана: {statistics.median(latencies) * 1000:.1f} мс; "
+          f"p95: {p95 * 1000:.1f} мс; максимум: {latencies[-1] * 1000:.1f} мс; "
+          f"ошибок по тегам: {errors}")
+
+async def main():
+    url = "http://localhost/v1/data/"
+    tags_file = "tests/prepare_load_tests/tags_in_postgres_100.json"
+    requests = 50
+    parallel = 5
+    if len(sys.argv) > 1:
+        url = sys.argv[1]
+    if len(sys.argv) > 2:
+        tags_file = sys.argv[2]
+    if len(sys.argv) > 3:
+        requests = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        parallel = int(sys.argv[4])
+
+    with open(tags_file, "r") as f:
+        js = json.load(f)
+    ids = []
+    for value_type in ("0", "1"):
+        ids += js.get(value_type, [])
+
+    async with aiohttp.ClientSession() as session:
+        for size in SIZES:
+            await run(session, url, ids, min(size, len(ids)), requests, parallel)
+
+asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Сравнение скорости фильтрации данных тега по значениям (ключ
+``value`` запроса): прежняя реализация DataStoragesAppBase._filter_data
+(цикл по точкам и искомым значениям) и реализация на numpy из
+src/services/dataStorages/app/filtering.py.
+
+Для 10^3 - 10^6 точек числового тега (10 и 100 искомых значений)
+и строкового тега выводится время обеих реализаций и признак
+совпадения результатов.
+
+Запуск (из корня репозитория):
+    python tests/benchmarks/value_filter.py [повторов]
+"""
+import sys
+import time
+import random
+from typing import Any, List
+
+sys.path.append(".")
+
+from src.services.dataStorages.app.filtering import filter_data
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+def filter_data_loop(tag_data: List[tuple], value: List[Any], tag_type_code: int,
+                     tag_step: bool) -> List[tuple]:
+    """Прежняя реализация DataStoragesAppBase._filter_data.
+    """
+    def estimate(x1, y1, x2, y2, y):
+        k = (y2 - y1)/(x2 - x1)
+        b = y2 - k * x2
+        return round((y - b) / k)
+
+    res = []
+    if tag_step or tag_type_code not in [0, 1]:
+        for item in tag_data:
+            if item[0] in value:
+                res.append(item)
+    else:
+        for i in range(1, len(tag_data)):
+            y1 = tag_data[i - 1][0]
+            y2 = tag_data[i][0]
+            x1 = tag_data[i - 1][1]
+            x2 = tag_data[i][1]
+            if x1 == x2:
+                continue
+            if y1 in value:
+                res.append(tag_data[i - 1])
+            else:
+                if y1 is None or y2 is None:
+                    continue
+                for val in value:
+                    if val is None:
+                        continue
+                    if tag_type_code == 0 and isinstance(val, float):
+                        continue
+                    if ((y1 > val and y2 < val) or (y1 < val and y2 > val)):
+                        res.append((val, estimate(x1, y1, x2, y2, val), None))
+        if tag_data[-1][0] in value:
+            res.append(tag_data[-1])
+    return res
+
+def make_data(count: int, kind: str) -> list:
+    # значения числового тега - случайное блуждание, искомые значения
+    # пересекаются редко, как у реальных измерений
+    x0 = 1_700_000_000_000_000
+    data = []
+    y = 0.
+    for i in range(count):
+        x = x0 + i * 1000000
+        if kind == "str":
+            y = random.choice(("on", "off", "fault", "idle"))
+        else:
+            y = max(-50., min(50., y + random.uniform(-0.5, 0.5)))
+        data.append((y, x, 0))
+    return data
+
+def same(res1: List[tuple], res2: List[tuple]) -> bool:
+    # прежняя реализация выдаёт пересечения одного отрезка в порядке
+    # искомых значений, новая - по времени; метка пересечения прежней
+    # реализацией считается с потерей точности
+    key = lambda item: (item[1], str(item[0]))
+    res1 = sorted(res1, key=key)
+    res2 = sorted(res2, key=key)
+    if len(res1) != len(res2):
+        return False
+    for (y1, x1, q1), (y2, x2, q2) in zip(res1, res2):
+        if y1 != y2 or q1 != q2 or abs(x1 - x2) > 1000:
+            return False
+    return True
+
+def measure(func, repeats: int, *args) -> tuple:
+    best = float("inf")
+    for _ in range(repeats):
+        t1 = time.perf_counter()
+        res = func(*args)
+        best = min(best, time.perf_counter() - t1)
+    return best, res
+
+def main():
+    repeats = 3
+    if len(sys.argv) > 1:
+        repeats = int(sys.argv[1])
+
+    cases = (
+        ("float, 10 значений", "float", list(range(-45, 50, 10)), 1),
+        ("float, 100 значений", "float", [v + 0.5 for v in range(-50, 50)], 1),
+        ("str, 2 значения", "str", ["fault", "idle"], 2),
+    )
+    for name, kind, value, type_code in cases:
+        for count in SIZES:
+            data = make_data(count, kind)
+            t_loop, res_loop = measure(filter_data_loop, repeats, data, value, type_code, False)
+            t_np, res_np = measure(filter_data, repeats, data, value, type_code, False)
+            check = "да" if same(res_loop, res_np) else "НЕТ"
+            print(f"{name:<18} точек: {count:>7}; найдено: {len(res_np):>7}; "
+                  f"цикл: {t_loop * 1000:9.1f} мс; numpy: {t_np * 1000:8.1f} мс; "
+                  f"ускорение: {t_loop / t_np:6.1f}; совпадение: {check}")
+
+main()
@@ -0,0 +1,97 @@
+"""Проверка буферизованной записи в VictoriaMetrics (VMWriter) на локальной
+заглушке HTTP-сервера.
+
+Заглушка принимает запросы импорта (gzip, JSON lines или формат Prometheus),
+считает полученные точки и количество запросов; часть запросов можно
+отклонять с кодом 503 для проверки повторных попыток.
+
+Запуск (из корня репозитория):
+    python tests/benchmarks/vm_writer_stub.py [количество тегов] [точек на тег] [формат]
+"""
+import sys
+import gzip
+import json
+import time
+import random
+import asyncio
+import logging
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(".")
+
+from src.services.dataStorages.app.victoriametrics.vm_writer import (
+    VMWriter, CN_FORMAT_JSONL, CN_FORMAT_PROMETHEUS
+)
+
+PORT = 18428
+# доля запросов, отклоняемых заглушкой
+FAIL_RATE = 0.1
+
+stats = {"requests": 0, "rejected": 0, "points": 0}
+
+async def handle_import(request: web.Request) -> web.Response:
+    stats["requests"] += 1
+    if random.random() < FAIL_RATE:
+        stats["rejected"] += 1
+        return web.Response(status=503, text="stub: try later")
+
+    body = await request.read()
+    if request.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    for line in body.decode().splitlines():
+        if not line:
+            continue
+        if request.path.endswith("/prometheus"):
+            stats["points"] += 1
+        else:
+            stats["points"] += len(json.loads(line)["values"])
+    return web.Response(status=204)
+
+async def main():
+    tags = 1000
+    points = 100
+    fmt = CN_FORMAT_JSONL
+    if len(sys.argv) > 1:
+        tags = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        points = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        fmt = sys.argv[3]
+
+    app = web.Application()
+    app.router.add_post("/api/v1/import", handle_import)
+    app.router.add_post("/api/v1/import/prometheus", handle_import)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    logging.basicConfig(level=logging.ERROR)
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=4))
+    path = ("/api/v1/import", "/api/v1/import/prometheus")[fmt == CN_FORMAT_PROMETHEUS]
+    writer = VMWriter(
+        session, f"http://127.0.0.1:{PORT}{path}", logging.getLogger("vm_writer"),
+        fmt=fmt, retry_delay=0.01
+    )
+    writer.start()
+
+    x0 = int(time.time() * 1000000)
+    t1 = time.perf_counter()
+    for i in range(points):
+        for tag in range(tags):
+            writer.add(f"tag_{tag}", [(random.uniform(-100, 100), x0 + i * 1000000, 0)])
+        # даём поработать циклу событий, как между сообщениями брокера
+        await asyncio.sleep(0)
+    await writer.close()
+    elapsed = time.perf_counter() - t1
+
+    total = tags * points
+    print(f"Формат: {fmt}; отправлено точек: {total}; получено заглушкой: {stats['points']}")
+    print(f"Запросов: {stats['requests']} (отклонено: {stats['rejected']}); "
+          f"время: {elapsed:.3f} с ({total / elapsed:.0f} т/с)")
+
+    await session.close()
+    await runner.cleanup()
+
+asyncio.run(main())